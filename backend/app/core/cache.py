@@ -0,0 +1,227 @@
+import asyncio
+import json
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+from app.core.config import settings
+
+GENERATION_KEY = "cache:generation"
+
+log = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------
+# BACKENDS — get / set with TTL, plus an atomic counter
+# ---------------------------------------------------------
+class MemoryCacheBackend:
+    """
+    Per-process LRU with per-entry expiry. The generation counter is
+    per-process too, so with several workers an upload invalidates the
+    other workers' entries only once their TTL runs out.
+    """
+    blocking = False
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCacheBackend:
+    """
+    Shared across workers / hosts: every process sees the same entries and
+    the same generation. Values are pickled (trusted, internal data only).
+    Calls block on the network, so cached() runs them off the event loop.
+    """
+    blocking = True
+
+    def __init__(self, url: str, prefix: str = "anomaly:"):
+        try:
+            import redis
+        except Exception as e:
+            raise RuntimeError("redis not available. Install with: pip install redis") from e
+        self._client = redis.Redis.from_url(url)
+        self._client.ping()     # fail at startup, not on the first cached request
+        self.prefix = prefix
+
+    def get(self, key: str):
+        raw = self._client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: float):
+        self._client.set(self.prefix + key, pickle.dumps(value), px=int(ttl * 1000))
+
+    def counter(self, key: str) -> int:
+        return int(self._client.get(self.prefix + key) or 0)
+
+    def incr(self, key: str) -> int:
+        return int(self._client.incr(self.prefix + key))
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + "result:*"):
+            self._client.delete(key)
+
+
+def _build_backend():
+    if settings.CACHE_BACKEND == "redis":
+        return RedisCacheBackend(settings.CACHE_URL)
+    return MemoryCacheBackend(settings.CACHE_MAX_ITEMS)
+
+
+_BACKEND = None
+_BACKEND_LOCK = threading.Lock()
+
+
+def get_cache_backend():
+    global _BACKEND
+    if _BACKEND is None:
+        with _BACKEND_LOCK:
+            if _BACKEND is None:
+                _BACKEND = _build_backend()
+    return _BACKEND
+
+
+def set_cache_backend(backend):
+    """
+    Swap in any object with get / set / counter / incr / clear
+    (and `blocking = True` if those do I/O).
+    """
+    global _BACKEND
+    with _BACKEND_LOCK:
+        _BACKEND = backend
+
+
+# ---------------------------------------------------------
+# INGEST GENERATION — part of every key, bumped on new data
+# ---------------------------------------------------------
+def bump_generation() -> int | None:
+    """
+    Called after new data is committed, so a cache outage must not fail
+    the caller: the error is logged and entries live out their TTL.
+    """
+    try:
+        return get_cache_backend().incr(GENERATION_KEY)
+    except Exception:
+        log.warning("could not bump the cache generation", exc_info=True)
+        return None
+
+
+def current_generation() -> int:
+    return get_cache_backend().counter(GENERATION_KEY)
+
+
+# ---------------------------------------------------------
+# RESULT CACHE
+# ---------------------------------------------------------
+_STATS = {"hits": 0, "misses": 0}
+_INFLIGHT: Dict[str, asyncio.Future] = {}
+
+
+def result_key(name: str, params: Dict, generation: int) -> str:
+    return f"result:{name}:{generation}:{json.dumps(params, sort_keys=True, default=str)}"
+
+
+async def _call(backend, method: str, *args) -> Any:
+    fn = getattr(backend, method)
+    if getattr(backend, "blocking", False):
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+    return fn(*args)
+
+
+def _cacheable(value: Any) -> bool:
+    # error payloads ({"error": ...}) are returned but not kept
+    return value is not None and not (isinstance(value, dict) and "error" in value)
+
+
+async def cached(name: str, params: Dict, compute: Callable[[], Awaitable[Any]],
+                 ttl: float | None = None) -> Any:
+    """
+    Return the result of `await compute()` for (name, params), reusing it
+    until the TTL runs out or new logs are ingested. Concurrent misses for
+    the same key in this process share one computation; error payloads
+    are not stored.
+    Cached values are shared between requests — callers must not mutate them.
+    """
+    if not settings.RESULT_CACHE:
+        return await compute()
+
+    backend = get_cache_backend()
+    key = result_key(name, params, await _call(backend, "counter", GENERATION_KEY))
+
+    value = await _call(backend, "get", key)
+    if value is not None:
+        _STATS["hits"] += 1
+        return value
+
+    pending = _INFLIGHT.get(key)
+    if pending is not None:
+        _STATS["hits"] += 1
+        return await asyncio.shield(pending)
+
+    _STATS["misses"] += 1
+    future = asyncio.get_running_loop().create_future()
+    _INFLIGHT[key] = future
+    try:
+        value = await compute()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()      # waiters (if any) re-raise it; silence "never retrieved"
+        raise
+    else:
+        future.set_result(value)
+    finally:
+        _INFLIGHT.pop(key, None)
+
+    if _cacheable(value):
+        await _call(backend, "set", key, value, settings.CACHE_TTL_SECONDS if ttl is None else ttl)
+    return value
+
+
+def cache_stats() -> Dict:
+    return {
+        "enabled": settings.RESULT_CACHE,
+        "backend": settings.CACHE_BACKEND,
+        "ttl_seconds": settings.CACHE_TTL_SECONDS,
+        "generation": current_generation(),
+        **_STATS,
+    }
@@ -1,7 +1,7 @@
-from typing import Generator
+from typing import AsyncGenerator, Generator
 import os
 from dotenv import load_dotenv
-from app.core.database import SessionLocal
+from app.core.database import SessionLocal, get_async_sessionmaker
 
 load_dotenv()
 
@@ -12,8 +12,95 @@ def get_db() -> Generator:
     finally:
         db.close()
 
+
+async def get_async_db() -> AsyncGenerator:
+    """
+    AsyncSession for read endpoints. Existing sync services run on it via
+    `await db.run_sync(fn)`.
+    """
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+
+async def get_async_read_db() -> AsyncGenerator:
+    """
+    Like get_async_db, but on the read replica when DATABASE_REPLICA_URL
+    is set. Only for endpoints that never write (replica lag is acceptable).
+    """
+    async with get_async_sessionmaker(replica=True)() as db:
+        yield db
+
 class Settings:
     OPENROUTER_API_KEY: str = os.getenv("OPENROUTER_API_KEY", "")
     RCA_PROMPT: str = os.getenv("RCA_PROMPT", "")
 
+    # streaming ingest
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+    INGEST_BATCH_SIZE: int = int(os.getenv("INGEST_BATCH_SIZE", "5000"))
+    BULK_COPY_THRESHOLD: int = int(os.getenv("BULK_COPY_THRESHOLD", "10000"))
+
+    # PostgreSQL daily partitioning of `logs` (applied by migration 0003)
+    LOGS_PARTITIONING: bool = os.getenv("LOGS_PARTITIONING", "false").lower() in ("1", "true", "yes")
+    PARTITION_PRECREATE_DAYS: int = int(os.getenv("PARTITION_PRECREATE_DAYS", "7"))
+    LOGS_RETENTION_DAYS: int = int(os.getenv("LOGS_RETENTION_DAYS", "0"))  # 0 = keep forever
+
+    # persistent Markov transition model (sequence anomalies)
+    SEQUENCE_THRESHOLD: float = float(os.getenv("SEQUENCE_THRESHOLD", "0.05"))
+    SEQUENCE_HALF_LIFE_HOURS: float = float(os.getenv("SEQUENCE_HALF_LIFE_HOURS", "24"))  # 0 = no decay
+    SEQUENCE_SESSION_TIMEOUT_MINUTES: int = int(os.getenv("SEQUENCE_SESSION_TIMEOUT_MINUTES", "30"))
+
+    # dedicated pool for CPU-bound ML / analytics endpoints (keeps the event loop free)
+    ML_WORKERS: int = int(os.getenv("ML_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+    # background job queue (post-upload analysis)
+    JOB_WORKER: bool = os.getenv("JOB_WORKER", "true").lower() in ("1", "true", "yes")
+    JOB_POLL_SECONDS: float = float(os.getenv("JOB_POLL_SECONDS", "1"))
+    JOB_DEBOUNCE_SECONDS: int = int(os.getenv("JOB_DEBOUNCE_SECONDS", "5"))
+    JOB_MAX_DELAY_SECONDS: int = int(os.getenv("JOB_MAX_DELAY_SECONDS", "60"))
+    JOB_TIMEOUT_MINUTES: int = int(os.getenv("JOB_TIMEOUT_MINUTES", "60"))
+
+    # streaming detectors evaluated at ingest (in-process sliding windows: per app
+    # process, not shared between workers)
+    STREAM_DETECTION: bool = os.getenv("STREAM_DETECTION", "true").lower() in ("1", "true", "yes")
+    # also count events older than the window (backfills); off = only recent events alert
+    STREAM_REPLAY: bool = os.getenv("STREAM_REPLAY", "false").lower() in ("1", "true", "yes")
+    STREAM_SHARDS: int = int(os.getenv("STREAM_SHARDS", "16"))
+    STREAM_LOGIN_FAILURES: int = int(os.getenv("STREAM_LOGIN_FAILURES", "5"))       # per IP / 10 min
+    STREAM_IP_FLOOD_HITS: int = int(os.getenv("STREAM_IP_FLOOD_HITS", "30"))         # per IP / 10 min
+    STREAM_IP_FLOOD_CRITICAL: int = int(os.getenv("STREAM_IP_FLOOD_CRITICAL", "60"))
+    STREAM_ERROR_MIN_REQUESTS: int = int(os.getenv("STREAM_ERROR_MIN_REQUESTS", "20"))  # per endpoint / 5 min
+
+    # analytics result cache (keyed by endpoint + params + ingest generation)
+    RESULT_CACHE: bool = os.getenv("RESULT_CACHE", "true").lower() in ("1", "true", "yes")
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "memory")  # memory | redis (shared across workers)
+    CACHE_URL: str = os.getenv("CACHE_URL", "redis://localhost:6379/0")
+    CACHE_TTL_SECONDS: float = float(os.getenv("CACHE_TTL_SECONDS", "120"))
+    CACHE_MAX_ITEMS: int = int(os.getenv("CACHE_MAX_ITEMS", "1024"))
+
+    # embedding inference (CPU by default)
+    EMBED_MODEL_NAME: str = os.getenv("EMBED_MODEL_NAME", "all-MiniLM-L6-v2")
+    EMBED_BACKEND: str = os.getenv("EMBED_BACKEND", "torch")  # torch | int8 | onnx
+    EMBED_DEVICE: str = os.getenv("EMBED_DEVICE", "cpu")
+    EMBED_BATCH_SIZE: int = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+    EMBED_TORCH_THREADS: int = int(os.getenv("EMBED_TORCH_THREADS", "0"))  # 0 = torch default
+    EMBED_WARMUP: bool = os.getenv("EMBED_WARMUP", "false").lower() in ("1", "true", "yes")
+
+    # embedding cache
+    EMBED_CACHE_DTYPE: str = os.getenv("EMBED_CACHE_DTYPE", "float16")
+    EMBED_CACHE_MEMORY_ITEMS: int = int(os.getenv("EMBED_CACHE_MEMORY_ITEMS", "50000"))
+    EMBED_CACHE_MAX_ROWS: int = int(os.getenv("EMBED_CACHE_MAX_ROWS", "1000000"))
+    # last_used is only rewritten once it is this old (LRU granularity)
+    EMBED_CACHE_TOUCH_SECONDS: float = float(os.getenv("EMBED_CACHE_TOUCH_SECONDS", "3600"))
+    # re-count the table at least this often (other processes insert too)
+    EMBED_CACHE_COUNT_SECONDS: float = float(os.getenv("EMBED_CACHE_COUNT_SECONDS", "300"))
+
+    # template miner: how often to pick up templates created by other processes
+    TEMPLATE_REFRESH_SECONDS: float = float(os.getenv("TEMPLATE_REFRESH_SECONDS", "30"))
+
+    # semantic clustering: switch to the scalable path above this many items
+    CLUSTER_SCALABLE_MIN_ITEMS: int = int(os.getenv("CLUSTER_SCALABLE_MIN_ITEMS", "10000"))
+    CLUSTER_PCA_COMPONENTS: int = int(os.getenv("CLUSTER_PCA_COMPONENTS", "64"))  # 0 = no reduction
+    # persistent cluster model: full refit interval (new templates are assigned every run)
+    CLUSTER_REFIT_HOURS: int = int(os.getenv("CLUSTER_REFIT_HOURS", "24"))
+
 settings = Settings()
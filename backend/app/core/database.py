@@ -1,19 +1,52 @@
-import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
-from dotenv import load_dotenv
+from app.core.db_settings import db_settings, engine_options
 
-# FORCE LOAD .env
-from dotenv import load_dotenv
-load_dotenv()
-
-DATABASE_URL = os.getenv("DATABASE_URL")
-print("DATABASE_URL LOADED =", DATABASE_URL)  # DEBUG
+DATABASE_URL = db_settings.DATABASE_URL
 
 if DATABASE_URL is None:
     raise Exception("❌ DATABASE_URL is NOT loaded. Check your .env file location!")
 
-engine = create_engine(DATABASE_URL, echo=True)
+engine = create_engine(
+    DATABASE_URL,
+    **engine_options(make_url(DATABASE_URL).get_backend_name(),
+                     statement_timeout_ms=db_settings.DB_STATEMENT_TIMEOUT_MS),
+)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+
+# ---------------------------------------------------------
+# ASYNC ENGINES (read endpoints) — asyncpg / aiosqlite
+# ---------------------------------------------------------
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+_async_sessionmakers = {}
+
+
+def async_database_url(url: str = DATABASE_URL):
+    u = make_url(url)
+    driver = ASYNC_DRIVERS.get(u.get_backend_name())
+    return u.set(drivername=driver) if driver else u
+
+
+def get_async_sessionmaker(replica: bool = False):
+    """
+    Created on first use, so the async driver is only needed once an
+    async endpoint is actually hit. replica=True targets
+    DATABASE_REPLICA_URL when one is configured (read-only analytics).
+    """
+    replica = replica and bool(db_settings.DATABASE_REPLICA_URL)
+    if replica not in _async_sessionmakers:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+        url = db_settings.DATABASE_REPLICA_URL if replica else DATABASE_URL
+        timeout = (db_settings.DB_REPLICA_STATEMENT_TIMEOUT_MS if replica
+                   else db_settings.DB_STATEMENT_TIMEOUT_MS)
+        async_engine = create_async_engine(
+            async_database_url(url),
+            **engine_options(make_url(url).get_backend_name(), is_async=True, statement_timeout_ms=timeout),
+        )
+        _async_sessionmakers[replica] = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return _async_sessionmakers[replica]
@@ -0,0 +1,62 @@
+from typing import Dict
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+class DatabaseSettings:
+    """
+    Engine / pool options, read from the environment. Kept apart from
+    app.core.config because config imports the engine.
+    """
+    DATABASE_URL: str | None = os.getenv("DATABASE_URL")
+    # optional read replica for analytics queries (unset = use the primary)
+    DATABASE_REPLICA_URL: str = os.getenv("DATABASE_REPLICA_URL", "")
+
+    # logs every statement — development only
+    SQL_ECHO: bool = _flag("SQL_ECHO", "false")
+
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # -1 = never
+    DB_POOL_PRE_PING: bool = _flag("DB_POOL_PRE_PING", "true")
+
+    # per-statement limit on PostgreSQL (0 = no limit); the replica gets its own
+    DB_STATEMENT_TIMEOUT_MS: int = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+    DB_REPLICA_STATEMENT_TIMEOUT_MS: int = int(os.getenv("DB_REPLICA_STATEMENT_TIMEOUT_MS", "0"))
+
+
+db_settings = DatabaseSettings()
+
+
+def engine_options(backend: str, *, is_async: bool = False, statement_timeout_ms: int = 0) -> Dict:
+    """
+    create_engine() keyword arguments for a database backend ("postgresql",
+    "sqlite", ...). SQLite keeps SQLAlchemy's own pool choice, since the
+    in-memory pool takes no size arguments.
+    """
+    options: Dict = {"echo": db_settings.SQL_ECHO}
+    if backend == "sqlite":
+        return options
+
+    options.update(
+        pool_size=db_settings.DB_POOL_SIZE,
+        max_overflow=db_settings.DB_MAX_OVERFLOW,
+        pool_timeout=db_settings.DB_POOL_TIMEOUT,
+        pool_recycle=db_settings.DB_POOL_RECYCLE,
+        pool_pre_ping=db_settings.DB_POOL_PRE_PING,
+    )
+
+    if backend == "postgresql" and statement_timeout_ms > 0:
+        if is_async:
+            # asyncpg takes server settings directly
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(statement_timeout_ms)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={statement_timeout_ms}"}
+    return options
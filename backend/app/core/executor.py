@@ -0,0 +1,21 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+
+# CPU-bound endpoints run here instead of Starlette's shared threadpool,
+# so cheap requests never queue behind clustering / model fits
+ML_EXECUTOR = ThreadPoolExecutor(max_workers=settings.ML_WORKERS, thread_name_prefix="ml")
+
+
+async def run_ml(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run fn(db, *args, **kwargs) on the ML executor with a session of its own.
+    """
+    def call():
+        with SessionLocal() as db:
+            return fn(db, *args, **kwargs)
+
+    return await asyncio.get_running_loop().run_in_executor(ML_EXECUTOR, call)
@@ -0,0 +1,17 @@
+import os
+from alembic import command
+from alembic.config import Config
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+def alembic_config() -> Config:
+    cfg = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    cfg.set_main_option("script_location", os.path.join(BACKEND_DIR, "migrations"))
+    # keep the app's own logging config untouched
+    cfg.attributes["configure_logger"] = False
+    return cfg
+
+
+def run_migrations(revision: str = "head"):
+    command.upgrade(alembic_config(), revision)
@@ -0,0 +1,96 @@
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Tuple
+from datetime import datetime
+from itertools import islice
+import base64
+import json
+
+from fastapi import HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.core.database import get_async_sessionmaker
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NDJSON_BATCH = 1000           # rows per chunk written to the response
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# (timestamp, id) of the last row seen; the next page starts strictly below it.
+# Rows without a timestamp sort after all timed rows, so their cursors carry None.
+Cursor = Tuple[datetime | None, int]
+
+
+# ---------------------------------------------------------
+# KEYSET CURSORS — opaque to clients
+# ---------------------------------------------------------
+def encode_cursor(timestamp: str | datetime | None, row_id: int) -> str:
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.isoformat()
+    return base64.urlsafe_b64encode(f"{timestamp or ''}|{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    timestamp, row_id = raw.rsplit("|", 1)
+    return (datetime.fromisoformat(timestamp) if timestamp else None), int(row_id)
+
+
+def row_cursor(row: Dict) -> Cursor:
+    """Cursor of a listed row (timestamp as serialized, possibly None)."""
+    ts = row["timestamp"]
+    return (datetime.fromisoformat(ts) if ts else None), row["id"]
+
+
+def cursor_param(cursor: str | None = Query(None, description="X-Next-Cursor of the previous page")) -> Cursor | None:
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def next_cursor(rows: List[Dict], limit: int) -> str | None:
+    """
+    Cursor for the page after `rows` (dicts with timestamp + id), or None
+    when this was the last page.
+    """
+    if len(rows) < limit:
+        return None
+    return encode_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+
+
+# ---------------------------------------------------------
+# NDJSON STREAMING — one JSON object per line
+# ---------------------------------------------------------
+def ndjson_lines(rows: Iterable[Dict]) -> str:
+    return "".join(json.dumps(r, default=str) + "\n" for r in rows)
+
+
+def iter_ndjson(rows: Iterable[Dict], batch: int = NDJSON_BATCH) -> Iterator[str]:
+    rows = iter(rows)
+    while chunk := list(islice(rows, batch)):
+        yield ndjson_lines(chunk)
+
+
+async def stream_pages(fetch: Callable, *, before: Cursor | None, limit: int | None,
+                       replica: bool = False, page_size: int = NDJSON_BATCH) -> AsyncIterator[str]:
+    """
+    NDJSON chunks of fetch(db, limit=, before=) walked page by page, up to
+    `limit` rows (None = all). Each page uses a short session of its own,
+    so a slow client never holds a connection or transaction open.
+    """
+    remaining = limit
+    while remaining is None or remaining > 0:
+        n = page_size if remaining is None else min(page_size, remaining)
+        async with get_async_sessionmaker(replica=replica)() as db:
+            rows = await db.run_sync(fetch, limit=n, before=before)
+        if rows:
+            yield ndjson_lines(rows)
+        if len(rows) < n:
+            return
+        if remaining is not None:
+            remaining -= n
+        before = row_cursor(rows[-1])
+
+
+def ndjson_response(chunks) -> StreamingResponse:
+    return StreamingResponse(chunks, media_type=NDJSON_MEDIA_TYPE)
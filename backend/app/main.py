@@ -1,4 +1,5 @@
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
 import os
 
 load_dotenv()
@@ -6,10 +7,56 @@ load_dotenv()
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.routers import logs, anomalies, metrics
-from app.core.database import engine, Base
-
-app = FastAPI(title="Log Analyzer API")
+from app.routers import logs, anomalies, metrics, jobs
+from app.core.migrations import run_migrations
+from app.core.database import SessionLocal
+from app.services.partitions import check_partitioning, maintain_partitions
+from app.services.rollup import backfill_rollups_if_empty
+from app.services.ml.embeddings import warm_up
+from app.services.jobs import start_job_worker, stop_job_worker
+from app.core.config import settings
+from app.core.cache import get_cache_backend
+import threading
+
+
+def startup():
+    """
+    One-time process setup. Runs from the lifespan handler, so importing
+    app.main (alembic, scripts, tests) touches neither the DB nor threads.
+    """
+    # bring DB schema up to date (alembic upgrade head)
+    if os.getenv("AUTO_MIGRATE", "true").lower() in ("1", "true", "yes"):
+        run_migrations()
+
+    # result cache backend (CACHE_BACKEND=redis connects here, so a bad URL fails startup)
+    if settings.RESULT_CACHE:
+        get_cache_backend()
+
+    with SessionLocal() as db:
+        # LOGS_PARTITIONING=true on a table migration 0003 left unpartitioned
+        check_partitioning(db)
+        # pre-create upcoming log partitions + apply retention (no-op unless partitioned)
+        maintain_partitions(db)
+        # logs stored before the per-minute rollup existed
+        backfill_rollups_if_empty(db)
+
+    # load the embedding model in the background; first requests wait on the load lock
+    if settings.EMBED_WARMUP:
+        threading.Thread(target=warm_up, name="embed-warmup", daemon=True).start()
+
+    # post-upload analysis worker (DB-backed queue, safe with several app processes)
+    if settings.JOB_WORKER:
+        start_job_worker()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup()
+    yield
+    stop_job_worker()
+
+
+app = FastAPI(title="Log Analyzer API", lifespan=lifespan)
 
 # ✅ CORS MUST COME FIRST
 app.add_middleware(
@@ -21,52 +68,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # ✅ THEN include routers
 app.include_router(logs.router)
 app.include_router(anomalies.router)
 app.include_router(metrics.router)
+app.include_router(jobs.router)
 
 @app.get("/")
 def root():
     return {"message": "Log Analyzer Backend is running 🚀"}
-
-# create DB tables
-Base.metadata.create_all(bind=engine)
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
-
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-
-from app.routers import logs, anomalies, metrics
-from app.core.database import engine, Base
-
-app = FastAPI(title="Log Analyzer API")
-
-# ✅ CORS MUST COME FIRST
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000",
-        "http://127.0.0.1:3000",
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# ✅ THEN include routers
-app.include_router(logs.router)
-app.include_router(anomalies.router)
-app.include_router(metrics.router)
-
-@app.get("/")
-def root():
-    return {"message": "Log Analyzer Backend is running 🚀"}
-
-# create DB tables
-Base.metadata.create_all(bind=engine)
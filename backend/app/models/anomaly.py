@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index
 from datetime import datetime
 from app.core.database import Base
 
@@ -6,10 +6,21 @@ class Anomaly(Base):
     __tablename__ = "anomalies"
 
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     type = Column(String)
     score = Column(Float)
     severity = Column(String)
     message = Column(String)
     log_id = Column(Integer, nullable=True)
 
+    # deduplication: one row per (type, subject, window), see db_service.anomaly_dedup_key
+    dedup_key = Column(String, nullable=True, unique=True, index=True)
+    occurrences = Column(Integer, nullable=False, default=1, server_default="1")
+    last_seen = Column(DateTime, nullable=True)
+    endpoint = Column(String, nullable=True)
+    ip = Column(String, nullable=True)
+
+    # keyset pagination of /anomalies/
+    __table_args__ = (
+        Index("ix_anomalies_timestamp_id", "timestamp", "id"),
+    )
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary
+from datetime import datetime
+from app.core.database import Base
+
+
+class DetectorState(Base):
+    """
+    Persisted state of an incremental detector:
+    high-water-mark log id + pickled model/sample payload.
+    """
+    __tablename__ = "detector_state"
+
+    name = Column(String, primary_key=True)
+    last_log_id = Column(Integer, default=0, nullable=False)
+    fitted_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    payload = Column(LargeBinary, nullable=True)
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary
+from datetime import datetime
+from app.core.database import Base
+
+
+class EmbeddingCache(Base):
+    """
+    Sentence embeddings keyed by sha1 of the normalized message text.
+    Vectors are stored as raw float16/float32 bytes.
+    """
+    __tablename__ = "embedding_cache"
+
+    key = Column(String(40), primary_key=True)
+    dim = Column(Integer, nullable=False)
+    dtype = Column(String(8), nullable=False)
+    vector = Column(LargeBinary, nullable=False)
+    last_used = Column(DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Text, Index, text
+from datetime import datetime
+from app.core.database import Base
+
+
+class Job(Base):
+    """
+    Background work queue (see services/jobs.py).
+    At most one queued job per kind: new requests coalesce into it.
+    """
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued")   # queued | running | done | failed
+    requests = Column(Integer, nullable=False, default=1)       # requests coalesced into this run
+    created_at = Column(DateTime, default=datetime.utcnow)
+    run_after = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    worker = Column(String, nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+        Index(
+            "uq_jobs_queued_kind", "kind", unique=True,
+            postgresql_where=text("status = 'queued'"),
+            sqlite_where=text("status = 'queued'"),
+        ),
+    )
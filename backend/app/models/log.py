@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float
+from sqlalchemy import Column, Integer, String, DateTime, Float, Index
 from datetime import datetime
 from app.core.database import Base
 
@@ -12,3 +12,15 @@ class Log(Base):
     endpoint = Column(String, nullable=True)
     response_time = Column(Float, nullable=True)
     ip = Column(String, nullable=True)
+    template_id = Column(Integer, nullable=True)
+
+    # match the hot query shapes: time windows, optionally narrowed by level / endpoint / ip
+    __table_args__ = (
+        Index("ix_logs_timestamp", "timestamp"),
+        Index("ix_logs_level_timestamp", "level", "timestamp"),
+        Index("ix_logs_endpoint_timestamp", "endpoint", "timestamp"),
+        Index("ix_logs_ip_timestamp", "ip", "timestamp"),
+        Index("ix_logs_template_timestamp", "template_id", "timestamp"),
+        # keyset pagination of /logs/
+        Index("ix_logs_timestamp_id", "timestamp", "id"),
+    )
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float
+from app.core.database import Base
+
+
+class LogRollup(Base):
+    """
+    Per-minute pre-aggregated log counts, keyed by (minute, endpoint, level).
+    Maintained at ingest time by services/rollup.py.
+    """
+    __tablename__ = "log_rollups"
+
+    bucket = Column(DateTime, primary_key=True)        # minute (UTC)
+    endpoint = Column(String, primary_key=True)        # "" when the log had no endpoint
+    level = Column(String, primary_key=True)
+
+    count = Column(Integer, nullable=False, default=0)
+    error_count = Column(Integer, nullable=False, default=0)
+
+    # response time stats (over logs that had one)
+    rt_count = Column(Integer, nullable=False, default=0)
+    rt_sum = Column(Float, nullable=False, default=0.0)
+    rt_m2 = Column(Float, nullable=False, default=0.0)   # sum of squared deviations from the bucket mean
+    rt_min = Column(Float, nullable=True)
+    rt_max = Column(Float, nullable=True)
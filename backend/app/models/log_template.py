@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Float, Boolean, Index
+from datetime import datetime
+from app.core.database import Base
+
+
+class LogTemplate(Base):
+    """
+    Message templates mined at ingest ("user <*> failed").
+    logs.template_id points here; count is the number of lines seen.
+    cluster_id / is_outlier come from the semantic cluster model;
+    assigned_at NULL means "not assigned yet" (new or generalized template).
+    """
+    __tablename__ = "log_templates"
+
+    id = Column(Integer, primary_key=True)
+    template = Column(String, nullable=False)
+    template_hash = Column(String(40), nullable=True)   # sha1(template), see ml/templates.template_hash
+    token_count = Column(Integer, nullable=False)
+    count = Column(BigInteger, nullable=False, default=0)
+    first_seen = Column(DateTime, default=datetime.utcnow)
+    last_seen = Column(DateTime, default=datetime.utcnow)
+
+    cluster_id = Column(Integer, nullable=True)
+    is_outlier = Column(Boolean, nullable=False, default=False)
+    outlier_distance = Column(Float, nullable=True)
+    assigned_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_log_templates_outlier_last_seen", "is_outlier", "last_seen"),
+        Index("ix_log_templates_cluster_id", "cluster_id"),
+        Index("uq_log_templates_template_hash", "template_hash", unique=True),
+    )
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Float, LargeBinary
+from datetime import datetime
+from app.core.database import Base
+
+
+class SemanticCluster(Base):
+    """
+    Persistent semantic cluster model over log templates.
+    centroid: L2-normalized float32 embedding bytes; radius: max cosine
+    distance for a new template to join. Ids are kept stable across refits.
+    """
+    __tablename__ = "semantic_clusters"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    centroid = Column(LargeBinary, nullable=False)
+    dim = Column(Integer, nullable=False)
+    radius = Column(Float, nullable=False)
+    size = Column(BigInteger, nullable=False, default=0)
+    n_templates = Column(Integer, nullable=False, default=0)
+    sample_message = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,12 +1,33 @@
-from fastapi import APIRouter, Depends
+from typing import Literal
+from fastapi import APIRouter, Depends, Query, Response
 from sqlalchemy.orm import Session
-from app.core.config import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import get_db, get_async_db
+from app.core.executor import run_ml
+from app.core.cache import cached
+from app.core.pagination import (
+    Cursor,
+    NEXT_CURSOR_HEADER,
+    cursor_param,
+    iter_ndjson,
+    ndjson_response,
+    next_cursor,
+    stream_pages,
+)
 
 # Module imports
 from app.services.model import run_detection, run_error_spike_detection
 from app.services.security import run_all_security_checks
+from app.services.streaming import get_stream_detector
 from app.services.ml.clustering import run_semantic_clustering
-from app.services.ml.sequences import detect_sequence_anomalies
+from app.services.ml.cluster_model import fit_cluster_model, get_outlier_templates, is_fitted
+from app.services.ml.sequences import (
+    detect_sequence_anomalies,
+    detect_ngram_anomalies,
+    update_transition_model,
+    recent_rare_transitions,
+    transition_model_info,
+)
 from app.services.ml.forecast import predict_error_trend
 from app.services.db_service import get_anomalies
 from app.services.ai.rca import run_root_cause_analysis
@@ -14,21 +35,57 @@ from app.services.ai.rca import run_root_cause_analysis
 
 router = APIRouter(prefix="/anomalies", tags=["Anomalies"])
 
+PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+ResponseFormat = Literal["json", "ndjson"]
+
+
+def _result_lines(res: dict):
+    """
+    A clustering / outlier result as NDJSON records: meta first, then one
+    line per cluster and per outlier.
+    """
+    yield {"kind": "meta", **res.get("meta", {})}
+    for cluster_id, cluster in res.get("clusters", {}).items():
+        yield {"kind": "cluster", "cluster_id": cluster_id, **cluster}
+    for outlier in res.get("outliers", []):
+        yield {"kind": "outlier", **outlier}
+
 
 # ---------------------------
 # GET ALL ANOMALIES
 # ---------------------------
 @router.get("/")
-def list_anomalies(db: Session = Depends(get_db)):
-    return get_anomalies(db)
+async def list_anomalies(
+    response: Response,
+    limit: int | None = Query(None, ge=1),
+    before: Cursor | None = Depends(cursor_param),
+    fmt: ResponseFormat = Query("json", alias="format"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Newest first. json: one page of `limit` rows (default 500), the next
+    page's cursor in the X-Next-Cursor header (absent on the last page).
+    ndjson: streams `limit` rows (default all) from the cursor on.
+    """
+    if fmt == "ndjson":
+        return ndjson_response(stream_pages(get_anomalies, before=before, limit=limit))
+
+    limit = min(limit or PAGE_SIZE, MAX_PAGE_SIZE)
+    rows = await db.run_sync(get_anomalies, limit=limit, before=before)
+    cursor = next_cursor(rows, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    return rows
 
 
 # ---------------------------
 # MODULE 1 - Statistical Detection
 # ---------------------------
 @router.post("/run")
-def trigger_detection(db: Session = Depends(get_db)):
-    res = run_detection(db)
+async def trigger_detection(full: bool = False):
+    res = await run_ml(run_detection, full=full)
     return {"status": "ok", "detected": len(res), "items": res}
 
 
@@ -36,8 +93,8 @@ def trigger_detection(db: Session = Depends(get_db)):
 # MODULE 2 - Error Spike Detection
 # ---------------------------
 @router.post("/error-spike")
-def trigger_error_spike(testing: bool = False, db: Session = Depends(get_db)):
-    res = run_error_spike_detection(db, testing=testing)
+async def trigger_error_spike(testing: bool = False):
+    res = await run_ml(run_error_spike_detection, testing=testing)
     return {"status": "ok", "detected": len(res), "items": res}
 
 
@@ -45,34 +102,59 @@ def trigger_error_spike(testing: bool = False, db: Session = Depends(get_db)):
 # MODULE 3 - Security Checks
 # ---------------------------
 @router.post("/security")
-def run_security_detection(testing: bool = False, db: Session = Depends(get_db)):
-    res = run_all_security_checks(db, testing=testing)
+async def run_security_detection(testing: bool = False):
+    res = await run_ml(run_all_security_checks, testing=testing)
     total = sum(len(v) for v in res.values())
     return {"status": "ok", "total_detected": total, "details": res}
 
 
+# ---------------------------
+# MODULE 3b - Streaming detectors (fed by ingest)
+# ---------------------------
+@router.get("/stream")
+def streaming_status():
+    """
+    Tracked keys and the most recent alerts fired at ingest time.
+    """
+    return {"status": "ok", "data": get_stream_detector().stats()}
+
+
 # ---------------------------
 # MODULE 4 - Semantic Clustering (DBSCAN + KMeans fallback)
 # ---------------------------
 @router.post("/semantic-clusters")
-def semantic_clusters(
+async def semantic_clusters(
     testing: bool = False,
     eps: float = 0.6,
     min_samples: int = 4,
-    db: Session = Depends(get_db)
+    by_template: bool = False,
+    mode: Literal["auto", "exact", "scalable"] = "auto",
+    cosine_eps: float = 0.15,
+    limit: int | None = 2000,
+    include_members: bool = True,
+    fmt: ResponseFormat = Query("json", alias="format")
 ):
-    res = run_semantic_clustering(db, eps=eps, min_samples=min_samples, testing=testing)
+    """
+    by_template=true clusters mined templates (weighted by line count)
+    instead of raw log messages; ids become template_ids.
+    include_members=false drops the per-cluster id lists;
+    format=ndjson streams meta, clusters and outliers one per line.
+    """
+    params = dict(eps=eps, min_samples=min_samples, testing=testing, by_template=by_template,
+                  mode=mode, cosine_eps=cosine_eps, limit=limit, include_members=include_members)
+    res = await cached("anomalies.semantic_clusters", params,
+                       lambda: run_ml(run_semantic_clustering, **params))
+    if fmt == "ndjson":
+        return ndjson_response(iter_ndjson(_result_lines(res)))
     return {"status": "ok", "data": res}
 
 
-@router.post("/outliers")
-def semantic_outliers(
-    testing: bool = False,
-    eps: float = 0.6,
-    min_samples: int = 4,
-    db: Session = Depends(get_db)
-):
-    res = run_semantic_clustering(db, eps=eps, min_samples=min_samples, testing=testing)
+def _outliers(db: Session, *, live: bool, limit: int | None, **clustering):
+    if clustering["by_template"] and not live and is_fitted(db):
+        res = get_outlier_templates(db, limit=limit or 500)
+        return {"status": "ok", **res}
+
+    res = run_semantic_clustering(db, limit=limit, **clustering)
     return {
         "status": "ok",
         "outliers": res.get("outliers", []),
@@ -80,41 +162,110 @@ def semantic_outliers(
     }
 
 
+@router.post("/outliers")
+async def semantic_outliers(
+    testing: bool = False,
+    eps: float = 0.6,
+    min_samples: int = 4,
+    by_template: bool = False,
+    mode: Literal["auto", "exact", "scalable"] = "auto",
+    cosine_eps: float = 0.15,
+    limit: int | None = 2000,
+    live: bool = False,
+    fmt: ResponseFormat = Query("json", alias="format")
+):
+    """
+    Raw log outliers by default, clustered on the spot.
+    by_template=true → template outliers, read from the persistent cluster
+    model (indexed lookup); live=true, or no fitted model yet → embed and
+    cluster the templates on the spot.
+    format=ndjson streams meta, then one outlier per line.
+    """
+    res = await run_ml(
+        _outliers, live=live, limit=limit, eps=eps, min_samples=min_samples, testing=testing,
+        by_template=by_template, mode=mode, cosine_eps=cosine_eps
+    )
+    if fmt == "ndjson":
+        return ndjson_response(iter_ndjson(_result_lines(res)))
+    return res
+
+
+@router.post("/recluster")
+async def recluster(
+    eps: float = 0.6,
+    min_samples: int = 4,
+    mode: Literal["auto", "exact", "scalable"] = "auto",
+    cosine_eps: float = 0.15
+):
+    """
+    Refit the persistent cluster model now (normally every CLUSTER_REFIT_HOURS).
+    """
+    res = await run_ml(fit_cluster_model, eps=eps, min_samples=min_samples, mode=mode, cosine_eps=cosine_eps)
+    return {"status": "ok", "data": res}
+
+
 # ---------------------------
 # MODULE 5 - Sequence-Based ML Anomaly Detection
 # ---------------------------
+def _sequence_ml(db: Session, *, threshold: float, window_hours: int, testing: bool,
+                 full: bool, order: int, hash_buckets: int):
+    if order >= 2:
+        res = detect_ngram_anomalies(
+            db,
+            order=order,
+            window_hours=window_hours,
+            threshold=threshold,
+            testing=testing,
+            hash_buckets=hash_buckets
+        )
+        return {"status": "ok", "items": res}
+
+    if full or testing:
+        res = detect_sequence_anomalies(
+            db,
+            window_hours=window_hours,
+            threshold=threshold,
+            testing=testing
+        )
+        return {"status": "ok", "items": res}
+
+    update_transition_model(db)
+    res = recent_rare_transitions(db, window_hours=window_hours, threshold=threshold)
+    return {"status": "ok", "items": res, "model": transition_model_info(db)}
+
+
 @router.post("/sequence-ml")
-def sequence_ml(
+async def sequence_ml(
     threshold: float = 0.05,
     window_hours: int = 24,
     testing: bool = False,
-    db: Session = Depends(get_db)
+    full: bool = False,
+    order: int = Query(1, ge=1, le=6),
+    hash_buckets: int = Query(0, ge=0)
 ):
-    res = detect_sequence_anomalies(
-        db,
-        window_hours=window_hours,
-        threshold=threshold,
-        testing=testing
+    """
+    Default: fold unprocessed logs into the persistent transition model and
+    list rare transitions it flagged within window_hours.
+    full=true / testing=true → rebuild from the raw window (original behaviour).
+    order >= 2 → order-k n-gram model over the window (multi-step paths).
+    """
+    return await run_ml(
+        _sequence_ml, threshold=threshold, window_hours=window_hours, testing=testing,
+        full=full, order=order, hash_buckets=hash_buckets
     )
-    return {"status": "ok", "items": res}
 
 
 # ---------------------------
 # MODULE 5.5 - Time-Series Forecasting (ARIMA)
 # ---------------------------
 @router.post("/predict")
-def predict_errors(
+async def predict_errors(
     minutes_back: int = 60,
     predict_minutes: int = 60,
-    testing: bool = True,
-    db: Session = Depends(get_db)
+    testing: bool = True
 ):
-    res = predict_error_trend(
-        db,
-        minutes_back=minutes_back,
-        predict_minutes=predict_minutes,
-        testing=testing
-    )
+    params = dict(minutes_back=minutes_back, predict_minutes=predict_minutes, testing=testing)
+    res = await cached("anomalies.predict", params, lambda: run_ml(predict_error_trend, **params))
     return {"status": "ok", **res}
 
 
@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import get_async_db
+from app.services.jobs import get_job
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+@router.get("/{job_id}")
+async def job_status(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    job = await db.run_sync(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
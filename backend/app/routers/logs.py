@@ -1,56 +1,140 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, BackgroundTasks
+from typing import Literal
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 
-from app.core.config import get_db
-from app.services.parser import parse_log_file
-from app.services.db_service import save_parsed_logs
-
-# 🔥 IMPORT PIPELINE
-from app.services.model import run_detection
-from app.services.metrics import aggregate_metrics
-from app.services.ml.forecast import predict_error_trend
+from app.core.config import get_db, get_async_read_db, settings
+from app.core.pagination import (
+    Cursor,
+    NEXT_CURSOR_HEADER,
+    cursor_param,
+    ndjson_response,
+    next_cursor,
+    stream_pages,
+)
+from app.services.parser import (
+    iter_text_lines,
+    iter_log_batches,
+    iter_text_shards,
+    iter_log_batches_parallel,
+    PARALLEL_PARSE_THRESHOLD,
+    PARSE_WORKERS,
+)
+from app.services.db_service import save_log_batches, get_parsed_logs
+from app.services.partitions import maintain_partitions
+from app.services.ml.templates import backfill_templates
+from app.services.jobs import enqueue_job
 
 router = APIRouter(prefix="/logs", tags=["Logs"])
 
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 5000
 
-def run_pipeline(db: Session):
-    """
-    Heavy processing runs AFTER response
-    """
-    run_detection(db)
-    aggregate_metrics(db)
-    predict_error_trend(db, testing=False)
+
+def _upload_size(file: UploadFile) -> int:
+    if file.size is not None:
+        return file.size
+
+    f = file.file
+    f.seek(0, 2)
+    size = f.tell()
+    f.seek(0)
+    return size
 
 
 @router.post("/upload")
-async def upload_logs(
-    background_tasks: BackgroundTasks,
+def upload_logs(
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
+    """
+    Streaming ingest: the body is read in chunks, split into lines,
+    parsed lazily and flushed to the DB in fixed-size batches.
+    Files above PARALLEL_PARSE_THRESHOLD are parsed in a process pool.
+    Analysis is queued as a job; uploads close together share one run.
+    """
     if not file or not file.filename:
         raise HTTPException(status_code=400, detail="No file uploaded")
 
-    content = await file.read()
-    if not content:
+    chunk_size = settings.UPLOAD_CHUNK_SIZE
+    chunks = iter(lambda: file.file.read(chunk_size), b"")
+
+    stats = {"lines_read": 0, "lines_parsed": 0, "lines_rejected": 0}
+
+    if PARSE_WORKERS > 1 and _upload_size(file) >= PARALLEL_PARSE_THRESHOLD:
+        batches = iter_log_batches_parallel(
+            iter_text_shards(chunks),
+            workers=PARSE_WORKERS,
+            stats=stats
+        )
+    else:
+        batches = iter_log_batches(
+            iter_text_lines(chunks),
+            batch_size=settings.INGEST_BATCH_SIZE,
+            stats=stats
+        )
+
+    saved = save_log_batches(db, batches)
+
+    if stats["lines_read"] == 0:
         raise HTTPException(status_code=400, detail="Empty file")
 
-    parsed = parse_log_file(content.decode("utf-8", errors="ignore"))
-    if not parsed:
+    if not saved:
         raise HTTPException(
             status_code=400,
             detail="File parsed but no valid log lines found"
         )
 
-    save_parsed_logs(db, parsed)
-
-    # ✅ RUN PIPELINE AS BACKGROUND TASK
-    background_tasks.add_task(run_pipeline, db)
+    # analysis runs on the job worker with its own session (see GET /jobs/{id})
+    job_id = enqueue_job(db, "analysis")
 
     return {
         "status": "uploaded",
-        "saved": len(parsed),
+        "saved": saved,
+        **stats,
+        "job_id": job_id,
         "message": "Logs uploaded. Analysis in progress.",
         "uploaded_at": datetime.utcnow().isoformat()
     }
+
+
+@router.get("/")
+async def list_logs(
+    response: Response,
+    limit: int | None = Query(None, ge=1),
+    before: Cursor | None = Depends(cursor_param),
+    fmt: Literal["json", "ndjson"] = Query("json", alias="format"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Stored logs, newest first. json: one page of `limit` rows (default
+    100), the next page's cursor in the X-Next-Cursor header.
+    ndjson: streams `limit` rows (default all) from the cursor on.
+    """
+    if fmt == "ndjson":
+        return ndjson_response(stream_pages(get_parsed_logs, before=before, limit=limit, replica=True))
+
+    limit = min(limit or PAGE_SIZE, MAX_PAGE_SIZE)
+    rows = await db.run_sync(get_parsed_logs, limit=limit, before=before)
+    cursor = next_cursor(rows, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    return rows
+
+
+@router.post("/partitions/maintain")
+def run_partition_maintenance(db: Session = Depends(get_db)):
+    """
+    Pre-create upcoming daily partitions and drop those past LOGS_RETENTION_DAYS.
+    No-op when logs is not partitioned (SQLite / default setup).
+    """
+    return maintain_partitions(db)
+
+
+@router.post("/templates/backfill")
+def run_template_backfill(db: Session = Depends(get_db)):
+    """
+    Mine templates for logs stored before template mining was enabled.
+    """
+    return {"status": "ok", "logs_updated": backfill_templates(db)}
@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.core.config import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+from app.core.config import get_async_db, get_async_read_db
+from app.core.executor import run_ml
+from app.core.cache import cached, cache_stats
 from app.services.metrics import (
     aggregate_metrics,
     get_top_errors,
@@ -9,41 +12,73 @@ from app.services.metrics import (
     downtime_indicators,
     error_trend_summary
 )
+from app.services.rollup import rebuild_rollups
+from app.services.ml.embeddings import embedding_stats
 
 router = APIRouter(prefix="/metrics", tags=["Metrics"])
 
 
 @router.get("/daily")
-def daily_metrics(db: Session = Depends(get_db)):
-    return aggregate_metrics(db)
+async def daily_metrics(db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(aggregate_metrics)
 
 
 @router.get("/top-errors")
-def top_errors(
+async def top_errors(
     hours: int | None = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     return {
-        "data": get_top_errors(db, hours=hours)
+        "data": await cached("metrics.top_errors", {"hours": hours},
+                             lambda: db.run_sync(get_top_errors, hours=hours))
     }
 
 
 
 @router.get("/top-anomalies")
-def get_top_anomalies(db: Session = Depends(get_db)):
-    return top_anomaly_endpoints(db)
+async def get_top_anomalies(db: AsyncSession = Depends(get_async_read_db)):
+    return await db.run_sync(top_anomaly_endpoints)
 
 
 @router.get("/slowest")
-def get_slowest(db: Session = Depends(get_db)):
-    return slowest_endpoints(db)
+async def get_slowest(db: AsyncSession = Depends(get_async_read_db)):
+    return await cached("metrics.slowest", {}, lambda: db.run_sync(slowest_endpoints))
 
 
 @router.get("/downtime")
-def get_downtime(db: Session = Depends(get_db)):
-    return downtime_indicators(db)
+async def get_downtime(db: AsyncSession = Depends(get_async_read_db)):
+    return await db.run_sync(downtime_indicators)
 
 
 @router.get("/summary")
-def get_summary(db: Session = Depends(get_db)):
-    return error_trend_summary(db)
+async def get_summary(db: AsyncSession = Depends(get_async_read_db)):
+    return await cached("metrics.summary", {}, lambda: db.run_sync(error_trend_summary))
+
+
+@router.post("/rollup/rebuild")
+async def rebuild_rollup(
+    since_hours: int | None = None
+):
+    """
+    Rebuild / backfill the per-minute rollup from raw logs.
+    since_hours=None → rebuild everything.
+    """
+    since = datetime.utcnow() - timedelta(hours=since_hours) if since_hours is not None else None
+    processed = await run_ml(rebuild_rollups, since=since)
+    return {"status": "ok", "logs_processed": processed}
+
+
+@router.get("/embeddings")
+def embedding_throughput():
+    """
+    Embedding model status and throughput (messages/sec) for this process.
+    """
+    return embedding_stats()
+
+
+@router.get("/cache")
+def result_cache_status():
+    """
+    Analytics result cache: hits / misses and the current ingest generation.
+    """
+    return cache_stats()
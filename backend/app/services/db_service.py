@@ -1,11 +1,25 @@
 from sqlalchemy.orm import Session
-from typing import List, Dict
-from datetime import datetime
+from sqlalchemy import insert, text, func, tuple_, case, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import List, Dict, Iterable, Tuple
+from datetime import datetime, timezone
+import hashlib
+import io
+import logging
 
+from app.core.config import settings
+from app.core.cache import bump_generation
 from app.models.log import Log
+from app.services.parser import LogBatch
+from app.services.rollup import update_rollups
+from app.services.partitions import ensure_partitions_for
+from app.services.ml.templates import assign_templates
+from app.services.streaming import observe_logs
 from app.models.anomaly import Anomaly
 from app.models.metric import Metric
 
+log = logging.getLogger(__name__)
+
 
 # -----------------------------
 # CANONICAL DEFINITIONS
@@ -47,48 +61,222 @@ def normalize_level(raw_level: str | None, testing: bool = False) -> str:
 # -----------------------------
 # LOG PERSISTENCE
 # -----------------------------
+LOG_COLUMNS = ("timestamp", "level", "message", "endpoint", "response_time", "ip", "template_id")
+
+
+def _to_utc_naive(ts: datetime | None) -> datetime:
+    """
+    logs.timestamp is a naive column holding UTC.
+    Aware values are converted so every insert path stores the same thing.
+    """
+    if ts is None:
+        return datetime.utcnow()
+    if ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _executemany_returning(dialect) -> bool:
+    # True when one executemany INSERT can return every row's id in order
+    return getattr(dialect, "insert_executemany_returning", False)
+
+
+def _log_row(p: Dict, testing: bool = False) -> Dict:
+    return {
+        "timestamp": _to_utc_naive(p.get("timestamp")),
+        "level": normalize_level(p.get("level"), testing=testing),
+        "message": p.get("message"),
+        "endpoint": p.get("endpoint"),
+        "response_time": p.get("response_time"),
+        "ip": p.get("ip"),
+    }
+
+
+def _batch_rows(batch: LogBatch, testing: bool = False) -> List[Dict]:
+    return [
+        {
+            "timestamp": _to_utc_naive(ts),
+            "level": normalize_level(level, testing=testing),
+            "message": message,
+            "endpoint": endpoint,
+            "response_time": rt,
+            "ip": ip,
+        }
+        for ts, level, message, endpoint, rt, ip in zip(
+            batch.timestamps, batch.levels, batch.messages,
+            batch.endpoints, batch.response_times, batch.ips
+        )
+    ]
+
+
+def _copy_value(v) -> str:
+    """
+    Encode one value for COPY ... FROM STDIN (text format).
+    """
+    if v is None:
+        return "\\N"
+    if isinstance(v, datetime):
+        return v.isoformat(sep=" ")
+    return (
+        str(v)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _copy_insert_logs(db: Session, rows: List[Dict]) -> List[int] | None:
+    """
+    PostgreSQL COPY FROM STDIN for very large batches.
+    IDs are reserved from the sequence first, so the returned IDs are exactly
+    the ones written, even with concurrent uploads.
+    Returns None when the driver has no COPY support (caller falls back).
+    """
+    raw = db.connection().connection
+    cursor = raw.cursor()
+    if not (hasattr(cursor, "copy_expert") or hasattr(cursor, "copy")):
+        cursor.close()
+        return None
+
+    ids = list(db.scalars(
+        text(
+            "SELECT nextval(pg_get_serial_sequence('logs', 'id')) "
+            "FROM generate_series(1, :n)"
+        ),
+        {"n": len(rows)}
+    ))
+
+    buf = io.StringIO()
+    for log_id, r in zip(ids, rows):
+        buf.write(str(log_id))
+        for col in LOG_COLUMNS:
+            buf.write("\t")
+            buf.write(_copy_value(r[col]))
+        buf.write("\n")
+
+    sql = f"COPY logs (id, {', '.join(LOG_COLUMNS)}) FROM STDIN"
+    if hasattr(cursor, "copy_expert"):
+        # psycopg2
+        buf.seek(0)
+        cursor.copy_expert(sql, buf)
+    else:
+        # psycopg 3
+        with cursor.copy(sql) as copy:
+            copy.write(buf.getvalue())
+
+    cursor.close()
+    return ids
+
+
 def save_parsed_logs(
     db: Session,
-    parsed: List[Dict],
+    parsed: List[Dict] | LogBatch,
     testing: bool = False
 ) -> List[int]:
-    saved_ids = []
-
-    for p in parsed:
-        log = Log(
-            timestamp=p.get("timestamp") or datetime.utcnow(),
-            level=normalize_level(p.get("level"), testing=testing),
-            message=p.get("message"),
-            endpoint=p.get("endpoint"),
-            response_time=p.get("response_time"),
-            ip=p.get("ip")
-        )
-        db.add(log)
+    """
+    Bulk insert parsed logs and return the IDs that were actually inserted,
+    in input order.
+      - PostgreSQL, large batches → COPY FROM STDIN
+      - otherwise → executemany INSERT ... RETURNING id
+    Each message is mapped to a mined template first (see ml/templates.py).
+    The per-minute rollup is updated in the same transaction as the logs.
+    The streaming detectors only see the batch once that commit succeeds,
+    so a failed insert leaves no phantom counts; the alerts they fire are
+    saved in a follow-up transaction. Cached analytics results are
+    invalidated.
+    """
+    if not parsed:
+        return []
 
+    if isinstance(parsed, LogBatch):
+        rows = _batch_rows(parsed, testing=testing)
+    else:
+        rows = [_log_row(p, testing=testing) for p in parsed]
+    dialect = db.get_bind().dialect
+
+    assign_templates(db, rows)
+
+    # partitioned logs table: make sure every day in the batch has a partition
+    ensure_partitions_for(db, (r["timestamp"] for r in rows))
+
+    ids = None
+    if dialect.name == "postgresql" and len(rows) >= settings.BULK_COPY_THRESHOLD:
+        ids = _copy_insert_logs(db, rows)
+
+    if ids is None:
+        if _executemany_returning(dialect):
+            stmt = insert(Log).returning(Log.id, sort_by_parameter_order=True)
+            ids = list(db.scalars(stmt, rows))
+        else:
+            # backends without RETURNING for executemany
+            ids = [
+                db.execute(insert(Log).returning(Log.id), r).scalar_one()
+                for r in rows
+            ]
+
+    update_rollups(db, rows)
     db.commit()
 
-    rows = (
-        db.query(Log)
-        .order_by(Log.id.desc())
-        .limit(len(parsed))
-        .all()
-    )
+    fired = observe_logs(rows, ids)
+    if fired:
+        try:
+            save_anomalies(db, fired)
+        except Exception:
+            # the logs are in; the periodic DB detectors still see them
+            db.rollback()
+            log.exception("could not save %d stream alerts", len(fired))
 
-    return [r.id for r in rows[::-1]]
+    bump_generation()     # cached analytics results are stale now
+    return ids
 
 
-def get_parsed_logs(db: Session, limit: int = 100):
-    rows = (
-        db.query(Log)
-        .order_by(Log.timestamp.desc())
-        .limit(limit)
-        .all()
-    )
+def save_log_batches(
+    db: Session,
+    batches: Iterable[LogBatch],
+    testing: bool = False
+) -> int:
+    """
+    Persist a stream of LogBatch objects, one bulk insert per batch.
+    Only one batch is held in memory at a time. Returns rows saved.
+    """
+    saved = 0
+    for batch in batches:
+        saved += len(save_parsed_logs(db, batch, testing=testing))
+    return saved
+
+
+def _newest_first(query, model, before: Tuple[datetime | None, int] | None, limit: int):
+    """
+    Keyset page shared by the listings: (timestamp, id) descending,
+    strictly below the `before` cursor when given. Rows without a
+    timestamp come after all timed rows, by id descending (their cursor
+    carries timestamp None). Each part is an index range scan on
+    (timestamp, id); the untimed part is only read once the timed rows
+    run out.
+    """
+    rows = []
+    if before is None or before[0] is not None:
+        timed = query.filter(model.timestamp.isnot(None))
+        if before is not None:
+            timed = timed.filter(tuple_(model.timestamp, model.id) < tuple(before))
+        rows = timed.order_by(model.timestamp.desc(), model.id.desc()).limit(limit).all()
+        if len(rows) >= limit:
+            return rows
+
+    untimed = query.filter(model.timestamp.is_(None))
+    if before is not None and before[0] is None:
+        untimed = untimed.filter(model.id < before[1])
+    return rows + untimed.order_by(model.id.desc()).limit(limit - len(rows)).all()
+
+
+def get_parsed_logs(db: Session, limit: int = 100, before: Tuple[datetime | None, int] | None = None):
+    rows = _newest_first(db.query(Log), Log, before, limit)
 
     return [
         {
             "id": r.id,
-            "timestamp": r.timestamp.isoformat(),
+            "timestamp": r.timestamp.isoformat() if r.timestamp else None,
             "level": r.level,
             "endpoint": r.endpoint,
             "message": r.message,
@@ -102,38 +290,182 @@ def get_parsed_logs(db: Session, limit: int = 100):
 # -----------------------------
 # ANOMALIES
 # -----------------------------
-def save_anomalies(db: Session, anomalies: List[Dict]):
+# dedup window per anomaly type (minutes) for endpoint / ip / message keyed anomalies
+DEDUP_WINDOW_MINUTES = {
+    "login_bruteforce": 10,
+    "ip_flood": 10,
+    "error_spike": 5,
+    "api_failure": 5,
+    "repeated_root_cause": 60,
+}
+DEFAULT_DEDUP_WINDOW_MINUTES = 60
+# score is a probability: lower = more anomalous, so a re-detection keeps the minimum
+# (sequences.recent_rare_transitions filters on score < threshold)
+PROBABILITY_TYPES = ("rare_transition",)
+_EPOCH = datetime(1970, 1, 1)
+
+
+def anomaly_dedup_key(a: Dict) -> str:
+    """
+    Identity of an anomaly, so repeated detection runs update one row:
+      ip / endpoint present → (type, ip|endpoint, time window)
+      log_id present        → (type, log_id)
+      otherwise             → (type, template or message, time window)
+    The window comes from the time of the logs that triggered it
+    ("event_time", else "timestamp"), not from when the detector ran, so
+    re-running a detector over the same logs lands on the same key.
+    """
+    kind = a.get("type")
+
+    if a.get("log_id") is not None and not (a.get("ip") or a.get("endpoint")):
+        return f"{kind}|log|{a['log_id']}"
+
+    ts = a.get("event_time") or a.get("timestamp")
+    if ts is None:
+        raise ValueError(f"{kind} anomaly has no event time to window its dedup key")
+    minutes = DEDUP_WINDOW_MINUTES.get(kind, DEFAULT_DEDUP_WINDOW_MINUTES)
+    window = int((ts - _EPOCH).total_seconds() // (minutes * 60))
+
+    if a.get("ip"):
+        return f"{kind}|ip|{a['ip']}|{window}"
+    if a.get("endpoint"):
+        return f"{kind}|endpoint|{a['endpoint']}|{window}"
+    if a.get("template_id") is not None:
+        return f"{kind}|template|{a['template_id']}|{window}"
+    digest = hashlib.sha1((a.get("message") or "").encode("utf-8")).hexdigest()
+    return f"{kind}|message|{digest}|{window}"
+
+
+def _anomaly_params(anomalies: List[Dict]) -> List[Dict]:
+    """
+    One row per dedup key; repeats inside the batch are folded first
+    (ON CONFLICT cannot touch the same row twice in one statement).
+    """
+    now = datetime.utcnow()
+    merged: Dict[str, Dict] = {}
     for a in anomalies:
-        an = Anomaly(
-            timestamp=a.get("timestamp") or datetime.utcnow(),
-            type=a.get("type"),
-            score=a.get("score"),
-            severity=a.get("severity"),
-            message=a.get("message"),
-            log_id=a.get("log_id")
-        )
-        db.add(an)
+        ts = a.get("timestamp") or now
+        key = anomaly_dedup_key(a)
+        row = merged.get(key)
+        if row is None:
+            merged[key] = {
+                "dedup_key": key,
+                "timestamp": ts,
+                "last_seen": ts,
+                "occurrences": 1,
+                "type": a.get("type"),
+                "score": a.get("score"),
+                "severity": a.get("severity"),
+                "message": a.get("message"),
+                "log_id": a.get("log_id"),
+                "endpoint": a.get("endpoint"),
+                "ip": a.get("ip"),
+            }
+            continue
 
-    db.commit()
+        row["occurrences"] += 1
+        row["last_seen"] = max(row["last_seen"], ts)
+        if row["type"] in PROBABILITY_TYPES and a.get("score") is not None \
+                and row["score"] is not None and row["score"] <= a["score"]:
+            continue   # the rarer detection already holds the descriptive fields
+
+        # latest detection wins for the descriptive fields
+        row["score"] = a.get("score")
+        row["severity"] = a.get("severity")
+        row["message"] = a.get("message")
+    return list(merged.values())
 
 
-def get_anomalies(db: Session):
-    rows = (
-        db.query(Anomaly)
-        .order_by(Anomaly.timestamp.desc())
-        .limit(500)
-        .all()
+def _upsert_anomalies_on_conflict(db: Session, insert_fn, greatest, least, params: List[Dict]):
+    # table-level insert: the ORM bulk path would split the batch by which values are None
+    stmt = insert_fn(Anomaly.__table__)
+    t, ex = Anomaly.__table__.c, stmt.excluded
+
+    # probability-scored rows keep the lowest score (and its severity / message).
+    # Plain equalities, not IN: an expanding IN bind cannot run as executemany.
+    is_probability = or_(*(t.type == kind for kind in PROBABILITY_TYPES))
+    keep_stored = is_probability & (t.score <= ex.score)
+
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[t.dedup_key],
+        set_={
+            "occurrences": t.occurrences + ex.occurrences,
+            "last_seen": greatest(t.last_seen, ex.last_seen),
+            "score": case((is_probability, least(t.score, ex.score)), else_=ex.score),
+            "severity": case((keep_stored, t.severity), else_=ex.severity),
+            "message": case((keep_stored, t.message), else_=ex.message),
+        }
     )
+    db.execute(stmt, params)
+
+
+def _upsert_anomalies_generic(db: Session, params: List[Dict]):
+    existing = {
+        r.dedup_key: r
+        for r in db.query(Anomaly).filter(Anomaly.dedup_key.in_([p["dedup_key"] for p in params]))
+    }
+    for p in params:
+        row = existing.get(p["dedup_key"])
+        if row is None:
+            db.add(Anomaly(**p))
+            continue
+
+        row.occurrences += p["occurrences"]
+        row.last_seen = max(row.last_seen or p["last_seen"], p["last_seen"])
+        if row.type in PROBABILITY_TYPES and row.score is not None \
+                and p["score"] is not None and row.score <= p["score"]:
+            continue
+        row.score = p["score"]
+        row.severity = p["severity"]
+        row.message = p["message"]
+
+
+def upsert_anomalies(db: Session, anomalies: List[Dict]):
+    """
+    Upsert a batch of anomalies on their dedup key (see anomaly_dedup_key)
+    in one statement, in the caller's transaction. A re-detected anomaly
+    bumps occurrences / last_seen instead of adding a row.
+    """
+    if not anomalies:
+        return
+
+    params = _anomaly_params(anomalies)
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        _upsert_anomalies_on_conflict(db, postgresql.insert, func.greatest, func.least, params)
+    elif dialect == "sqlite":
+        _upsert_anomalies_on_conflict(db, sqlite.insert, func.max, func.min, params)
+    else:
+        _upsert_anomalies_generic(db, params)
+
+
+def save_anomalies(db: Session, anomalies: List[Dict]):
+    """
+    upsert_anomalies, then commit (detectors persist their state with it).
+    """
+    if not anomalies:
+        return
+    upsert_anomalies(db, anomalies)
+    db.commit()
+
+
+def get_anomalies(db: Session, limit: int = 500, before: Tuple[datetime | None, int] | None = None):
+    rows = _newest_first(db.query(Anomaly), Anomaly, before, limit)
 
     return [
         {
             "id": r.id,
-            "timestamp": r.timestamp.isoformat(),
+            "timestamp": r.timestamp.isoformat() if r.timestamp else None,
             "type": r.type,
             "score": r.score,
             "severity": r.severity,
             "message": r.message,
             "log_id": r.log_id,
+            "endpoint": r.endpoint,
+            "ip": r.ip,
+            "occurrences": r.occurrences,
+            "last_seen": r.last_seen.isoformat() if r.last_seen else None,
         }
         for r in rows
     ]
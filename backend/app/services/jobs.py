@@ -0,0 +1,196 @@
+# app/services/jobs.py
+
+from typing import Any, Callable, Dict
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+import socket
+import threading
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import select, update, exists
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.job import Job
+from app.services.pipeline import run_pipeline
+
+log = logging.getLogger(__name__)
+
+JOB_HANDLERS: Dict[str, Callable[[Session], Any]] = {
+    "analysis": run_pipeline,
+}
+
+
+# ---------------------------------------------------------
+# QUEUE
+# ---------------------------------------------------------
+def enqueue_job(db: Session, kind: str) -> int:
+    """
+    Request a run of `kind`. If one is already queued (not yet started)
+    the request coalesces into it: its start is pushed back by
+    JOB_DEBOUNCE_SECONDS, but never past JOB_MAX_DELAY_SECONDS after it
+    was first queued. Returns the id of the job that will do the work.
+    """
+    debounce = timedelta(seconds=settings.JOB_DEBOUNCE_SECONDS)
+    max_delay = timedelta(seconds=settings.JOB_MAX_DELAY_SECONDS)
+
+    for _ in range(3):
+        now = datetime.utcnow()
+        job = db.scalar(
+            select(Job)
+            .where(Job.kind == kind, Job.status == "queued")
+            .with_for_update()
+        )
+        if job is not None:
+            job.requests += 1
+            job.run_after = min(now + debounce, job.created_at + max_delay)
+            db.commit()
+            return job.id
+
+        job = Job(kind=kind, status="queued", requests=1, created_at=now, run_after=now + debounce)
+        db.add(job)
+        try:
+            db.commit()
+            return job.id
+        except IntegrityError:
+            # another process queued one first (uq_jobs_queued_kind) → join it
+            db.rollback()
+
+    raise RuntimeError(f"could not enqueue job {kind!r}")
+
+
+def claim_next_job(db: Session, worker: str) -> Job | None:
+    """
+    Move the oldest due job to running. A kind never runs twice at once;
+    the conditional UPDATE makes the claim safe across processes.
+    """
+    now = datetime.utcnow()
+    running = aliased(Job)
+    job_id = db.scalar(
+        select(Job.id)
+        .where(
+            Job.status == "queued",
+            Job.run_after <= now,
+            ~exists().where(running.kind == Job.kind, running.status == "running"),
+        )
+        .order_by(Job.run_after, Job.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    if job_id is None:
+        db.rollback()
+        return None
+
+    claimed = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == "queued")
+        .values(status="running", started_at=now, worker=worker)
+    ).rowcount
+    db.commit()
+    return db.get(Job, job_id) if claimed else None
+
+
+def fail_stale_jobs(db: Session):
+    """
+    Jobs left running by a worker that died would block their kind forever.
+    """
+    cutoff = datetime.utcnow() - timedelta(minutes=settings.JOB_TIMEOUT_MINUTES)
+    db.execute(
+        update(Job)
+        .where(Job.status == "running", Job.started_at < cutoff)
+        .values(status="failed", finished_at=datetime.utcnow(), error="timed out (worker lost)")
+    )
+    db.commit()
+
+
+def run_job(db: Session, job: Job):
+    try:
+        result = JOB_HANDLERS[job.kind](db)
+        values = {"status": "done", "result": json.loads(json.dumps(result, default=str))}
+    except Exception as e:
+        db.rollback()
+        log.exception("job %s (%s) failed", job.id, job.kind)
+        values = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+
+    db.execute(update(Job).where(Job.id == job.id).values(finished_at=datetime.utcnow(), **values))
+    db.commit()
+
+
+def get_job(db: Session, job_id: int) -> Dict | None:
+    job = db.get(Job, job_id)
+    if job is None:
+        return None
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "requests": job.requests,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "run_after": job.run_after.isoformat() if job.run_after else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "result": job.result,
+        "error": job.error,
+    }
+
+
+# ---------------------------------------------------------
+# WORKER — one thread per process, owns its sessions
+# ---------------------------------------------------------
+class JobWorker(threading.Thread):
+
+    def __init__(self, poll_seconds: float):
+        super().__init__(name="job-worker", daemon=True)
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop_event = threading.Event()
+
+    def run_once(self) -> bool:
+        with SessionLocal() as db:
+            fail_stale_jobs(db)
+            job = claim_next_job(db, self.worker_id)
+            if job is None:
+                return False
+            run_job(db, job)
+            return True
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                ran = self.run_once()
+            except Exception:
+                log.exception("job worker iteration failed")
+                ran = False
+            if not ran:
+                self._stop_event.wait(self.poll_seconds)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_WORKER: JobWorker | None = None
+_WORKER_LOCK = threading.Lock()
+
+
+def start_job_worker() -> JobWorker:
+    global _WORKER
+    with _WORKER_LOCK:
+        if _WORKER is None or not _WORKER.is_alive():
+            _WORKER = JobWorker(settings.JOB_POLL_SECONDS)
+            _WORKER.start()
+    return _WORKER
+
+
+def stop_job_worker(timeout: float = 10.0):
+    """
+    Signal the worker and wait up to `timeout` for its current iteration.
+    A job still running after that is left to fail_stale_jobs.
+    """
+    global _WORKER
+    with _WORKER_LOCK:
+        worker, _WORKER = _WORKER, None
+    if worker is not None:
+        worker.stop()
+        worker.join(timeout)
@@ -1,26 +1,63 @@
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from collections import Counter, defaultdict
-from statistics import mean, pstdev
-from sqlalchemy import func
+from math import sqrt
+from sqlalchemy import func, case, select
+from typing import Dict, List
 
 from app.models.log import Log
+from app.models.log_rollup import LogRollup
 from app.models.anomaly import Anomaly
 from app.models.metric import Metric
+from app.services.rollup import minute_floor
 
 
 # Normalize severity keys
 SEVERITY_KEYS = ["low", "medium", "high", "critical"]
 
 
+def _log_totals(db: Session, since: datetime):
+    """
+    One aggregate row over the per-minute rollup (window starts at the
+    minute containing `since`): total, errors, response time count/sum and
+    the within-bucket sum of squared deviations.
+    """
+    return db.query(
+        func.sum(LogRollup.count).label("total"),
+        func.sum(LogRollup.error_count).label("errors"),
+        func.sum(LogRollup.rt_count).label("rt_count"),
+        func.sum(LogRollup.rt_sum).label("rt_sum"),
+        func.sum(LogRollup.rt_m2).label("rt_m2"),
+    ).filter(LogRollup.bucket >= minute_floor(since)).one()
+
+
+def _rt_mean_stdev(db: Session, totals, since: datetime):
+    """
+    Mean and population stdev over the window's buckets:
+      M2 = Σ M2_i + Σ n_i (mean_i - mean)²
+    (deviations, never E[x²] - E[x]², so large response times don't cancel out).
+    """
+    n = totals.rt_count or 0
+    if n == 0:
+        return None, 0.0
+
+    avg = float(totals.rt_sum) / n
+    bucket_mean = LogRollup.rt_sum / LogRollup.rt_count
+    between = db.query(
+        func.sum(LogRollup.rt_count * (bucket_mean - avg) * (bucket_mean - avg))
+    ).filter(LogRollup.bucket >= minute_floor(since), LogRollup.rt_count > 0).scalar()
+
+    m2 = float(totals.rt_m2 or 0.0) + float(between or 0.0)
+    return avg, sqrt(max(0.0, m2 / n))
+
+
 # ==========================================================
 # 4.0 — Daily Aggregated Metrics (KPI Card)
 # ==========================================================
 def aggregate_metrics(db: Session, days: int = 7):
     since = datetime.utcnow() - timedelta(days=days)
 
-    logs = db.query(Log).filter(Log.timestamp >= since).all()
-    total = len(logs)
+    totals = _log_totals(db, since)
+    total = int(totals.total or 0)
 
     if total == 0:
         return {
@@ -36,29 +73,28 @@ def aggregate_metrics(db: Session, days: int = 7):
         }
     }
     # classify errors
-    errors = [
-        l for l in logs
-        if l.level and l.level.upper() in ["ERROR", "CRITICAL"]
-    ]
+    error_count = int(totals.errors or 0)
+    avg_resp = float(totals.rt_sum) / totals.rt_count if totals.rt_count else 0.0
 
-    resp_times = [l.response_time for l in logs if l.response_time is not None]
-    avg_resp = mean(resp_times) if resp_times else 0.0
-
-    error_rate = round(len(errors) / total, 4)
+    error_rate = round(error_count / total, 4)
 
     # anomaly severity aggregation
-    anomalies = db.query(Anomaly).filter(Anomaly.timestamp >= since).all()
     severity_count = {k: 0 for k in SEVERITY_KEYS}
 
-    for a in anomalies:
-        sev = str(a.severity).lower()
+    sev_rows = (
+        db.query(func.lower(Anomaly.severity), func.count(Anomaly.id))
+        .filter(Anomaly.timestamp >= since)
+        .group_by(func.lower(Anomaly.severity))
+        .all()
+    )
+    for sev, count in sev_rows:
         if sev in severity_count:
-            severity_count[sev] += 1
+            severity_count[sev] += count
 
     # persist daily metric snapshot
     metric = Metric(
         total_logs=total,
-        error_count=len(errors),
+        error_count=error_count,
         avg_response_time=avg_resp,
         low=severity_count["low"],
         medium=severity_count["medium"],
@@ -71,7 +107,7 @@ def aggregate_metrics(db: Session, days: int = 7):
 
     return {
         "total_logs": total,
-        "error_count": len(errors),
+        "error_count": error_count,
         "avg_response_time": avg_resp,
         "error_rate": error_rate,
         "severity": severity_count
@@ -132,17 +168,29 @@ def get_top_errors(
 # ==========================================================
 def top_anomaly_endpoints(db: Session, days: int = 7):
     since = datetime.utcnow() - timedelta(days=days)
-    anomalies = db.query(Anomaly).filter(Anomaly.timestamp >= since).all()
 
-    if not anomalies:
+    total = (
+        db.query(func.count(Anomaly.id))
+        .filter(Anomaly.timestamp >= since)
+        .scalar()
+    )
+
+    if not total:
         return []
 
-    counter = Counter(a.type.lower() for a in anomalies if a.type)
-    total = len(anomalies)
+    anomaly_type = func.lower(Anomaly.type)
+    rows = (
+        db.query(anomaly_type.label("type"), func.count(Anomaly.id).label("count"))
+        .filter(Anomaly.timestamp >= since, Anomaly.type.isnot(None))
+        .group_by(anomaly_type)
+        .order_by(func.count(Anomaly.id).desc())
+        .limit(5)
+        .all()
+    )
 
     return [
-        {"type": t, "count": c, "percent": round(c / total, 4)}
-        for t, c in counter.most_common(5)
+        {"type": r.type, "count": r.count, "percent": round(r.count / total, 4)}
+        for r in rows
     ]
 
 
@@ -152,30 +200,32 @@ def top_anomaly_endpoints(db: Session, days: int = 7):
 def downtime_indicators(db: Session, hours: int = 24):
     since = datetime.utcnow() - timedelta(hours=hours)
 
-    logs = db.query(Log).filter(
-        Log.timestamp >= since,
-        Log.endpoint.isnot(None),
-        Log.level.isnot(None)
-    ).all()
+    rows = (
+        db.query(
+            LogRollup.endpoint,
+            func.sum(LogRollup.count).label("total"),
+            func.sum(case((LogRollup.level == "ERROR", LogRollup.count), else_=0)).label("errors"),
+            func.sum(case((LogRollup.level == "CRITICAL", LogRollup.count), else_=0)).label("criticals"),
+        )
+        .filter(
+            LogRollup.bucket >= minute_floor(since),
+            LogRollup.endpoint != ""
+        )
+        .group_by(LogRollup.endpoint)
+        .all()
+    )
 
-    if not logs:
+    if not rows:
         return []
 
-    endpoint_stats = defaultdict(lambda: {
-        "total": 0,
-        "errors": 0,
-        "criticals": 0
-    })
-
-    for l in logs:
-        ep = l.endpoint
-        endpoint_stats[ep]["total"] += 1
-
-        lvl = l.level.upper()
-        if lvl == "ERROR":
-            endpoint_stats[ep]["errors"] += 1
-        elif lvl == "CRITICAL":
-            endpoint_stats[ep]["criticals"] += 1
+    endpoint_stats = {
+        r.endpoint: {
+            "total": int(r.total),
+            "errors": int(r.errors or 0),
+            "criticals": int(r.criticals or 0)
+        }
+        for r in rows
+    }
 
     results = []
 
@@ -208,35 +258,79 @@ def downtime_indicators(db: Session, hours: int = 24):
 # ==========================================================
 # 4.4 — Slowest Endpoints (avg + p95)
 # ==========================================================
-def slowest_endpoints(db: Session, days: int = 7):
+def _p95_nearest_rank(db: Session, endpoints: List[str], since: datetime) -> Dict[str, float]:
+    """
+    Portable p95 for several endpoints in one query: the value at rank
+    int(0.95 * n), picked with row_number() over each endpoint's sorted
+    response times.
+    """
+    if not endpoints:
+        return {}
+
+    ranked = (
+        select(
+            Log.endpoint,
+            Log.response_time,
+            func.row_number().over(partition_by=Log.endpoint, order_by=Log.response_time.asc()).label("rn"),
+            func.count().over(partition_by=Log.endpoint).label("n"),
+        )
+        .where(
+            Log.timestamp >= since,
+            Log.endpoint.in_(endpoints),
+            Log.response_time != None
+        )
+        .subquery()
+    )
+    rows = db.execute(
+        select(ranked.c.endpoint, ranked.c.response_time)
+        .where(ranked.c.rn == ranked.c.n * 95 // 100 + 1)
+    ).all()
+    return dict(rows)
+
+
+def slowest_endpoints(db: Session, days: int = 7, limit: int = 5):
     since = datetime.utcnow() - timedelta(days=days)
+    is_postgres = db.get_bind().dialect.name == "postgresql"
 
-    logs = db.query(Log).filter(
-        Log.timestamp >= since,
-        Log.response_time != None
-    ).all()
+    avg_rt = func.avg(Log.response_time)
+    columns = [
+        Log.endpoint,
+        avg_rt.label("avg"),
+        func.count(Log.response_time).label("count"),
+    ]
+    if is_postgres:
+        columns.append(
+            func.percentile_cont(0.95).within_group(Log.response_time.asc()).label("p95")
+        )
+
+    rows = (
+        db.query(*columns)
+        .filter(
+            Log.timestamp >= since,
+            Log.response_time != None,
+            Log.endpoint.isnot(None)
+        )
+        .group_by(Log.endpoint)
+        .order_by(avg_rt.desc())
+        .limit(limit)
+        .all()
+    )
 
-    groups = defaultdict(list)
-    for l in logs:
-        if l.endpoint:
-            groups[l.endpoint].append(l.response_time)
+    if not is_postgres:
+        p95s = _p95_nearest_rank(db, [r.endpoint for r in rows], since)
 
     result = []
-    for ep, vals in groups.items():
-        if not vals:
-            continue
-
-        vals_sorted = sorted(vals)
-        p95 = vals_sorted[int(0.95 * len(vals_sorted))]
+    for r in rows:
+        p95 = r.p95 if is_postgres else p95s[r.endpoint]
 
         result.append({
-            "endpoint": ep,
-            "avg": round(mean(vals), 4),
-            "p95": round(p95, 4),
-            "count": len(vals)
+            "endpoint": r.endpoint,
+            "avg": round(float(r.avg), 4),
+            "p95": round(float(p95), 4),
+            "count": r.count
         })
 
-    return sorted(result, key=lambda x: x["avg"], reverse=True)[:5]
+    return result
 
 
 # ==========================================================
@@ -244,9 +338,9 @@ def slowest_endpoints(db: Session, days: int = 7):
 # ==========================================================
 def error_trend_summary(db: Session, days: int = 7):
     since = datetime.utcnow() - timedelta(days=days)
-    logs = db.query(Log).filter(Log.timestamp >= since).all()
+    totals = _log_totals(db, since)
 
-    total = len(logs)
+    total = int(totals.total or 0)
     if total == 0:
         return {
             "total_logs": 0,
@@ -256,17 +350,13 @@ def error_trend_summary(db: Session, days: int = 7):
             "stdev_response_time": 0
         }
 
-    errors = [
-        l for l in logs
-        if l.level and l.level.upper() in ["ERROR", "CRITICAL"]
-    ]
-
-    resp = [l.response_time for l in logs if l.response_time is not None]
+    error_count = int(totals.errors or 0)
+    avg_rt, stdev = _rt_mean_stdev(db, totals, since)
 
     return {
         "total_logs": total,
-        "error_count": len(errors),
-        "error_rate": round(len(errors) / total, 4),
-        "avg_response_time": round(mean(resp), 4) if resp else 0,
-        "stdev_response_time": round(pstdev(resp), 4) if len(resp) > 1 else 0
+        "error_count": error_count,
+        "error_rate": round(error_count / total, 4),
+        "avg_response_time": round(avg_rt, 4) if avg_rt is not None else 0,
+        "stdev_response_time": round(stdev, 4) if avg_rt is not None else 0
     }
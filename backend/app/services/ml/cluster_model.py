@@ -0,0 +1,289 @@
+# app/services/ml/cluster_model.py
+
+from typing import Dict, Any, List, Tuple
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy import update, delete, insert
+
+from app.core.cache import bump_generation
+from app.core.config import settings
+from app.models.detector_state import DetectorState
+from app.models.log_template import LogTemplate
+from app.models.semantic_cluster import SemanticCluster
+from app.services.ml.clustering import cluster_embeddings, l2_normalize
+from app.services.ml.embeddings import embed_templates_from_db, embed_messages_cached
+
+
+MODEL_NAME = "semantic_clusters"
+RADIUS_QUANTILE = 0.95     # member distance quantile that defines a cluster's reach
+RADIUS_SLACK = 1.25
+MIN_RADIUS = 0.05
+MATCH_DISTANCE = 0.1       # refit: new centroid this close to an old one keeps its id
+ASSIGN_CHUNK = 5000
+NEAREST_CHUNK = 50_000
+
+
+# ---------------------------------------------------------
+# INTERNAL — geometry (cosine on L2-normalized vectors)
+# ---------------------------------------------------------
+def _nearest(X: np.ndarray, C: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Nearest centroid per row → (index, cosine distance). Chunked over rows.
+    """
+    idx = np.empty(X.shape[0], dtype=int)
+    dist = np.empty(X.shape[0], dtype=np.float32)
+    for i in range(0, X.shape[0], NEAREST_CHUNK):
+        sims = X[i:i + NEAREST_CHUNK] @ C.T
+        best = sims.argmax(axis=1)
+        idx[i:i + NEAREST_CHUNK] = best
+        dist[i:i + NEAREST_CHUNK] = 1.0 - sims[np.arange(len(best)), best]
+    return idx, dist
+
+
+def _match_ids(new_centroids: np.ndarray, old: Dict[int, np.ndarray]) -> List[int]:
+    """
+    Greedy closest-first matching so a refit keeps ids of clusters that
+    barely moved; unmatched clusters get fresh ids.
+    """
+    ids: List[int | None] = [None] * len(new_centroids)
+    next_id = max(old, default=-1) + 1
+
+    if old and len(new_centroids):
+        old_ids = list(old)
+        dist = 1.0 - new_centroids @ np.stack([old[i] for i in old_ids]).T
+        taken = set()
+        for flat in np.argsort(dist, axis=None):
+            n, o = np.unravel_index(flat, dist.shape)
+            if dist[n, o] > MATCH_DISTANCE:
+                break
+            if ids[n] is None and o not in taken:
+                ids[n] = old_ids[o]
+                taken.add(o)
+
+    for n in range(len(ids)):
+        if ids[n] is None:
+            ids[n] = next_id
+            next_id += 1
+    return ids
+
+
+def _load_centroids(db: Session) -> Tuple[List[int], np.ndarray, np.ndarray]:
+    rows = db.query(SemanticCluster.id, SemanticCluster.centroid, SemanticCluster.radius) \
+        .order_by(SemanticCluster.id).all()
+    if not rows:
+        return [], np.zeros((0, 0), dtype=np.float32), np.zeros(0)
+    ids = [r.id for r in rows]
+    C = np.stack([np.frombuffer(r.centroid, dtype=np.float32) for r in rows])
+    radii = np.array([r.radius for r in rows])
+    return ids, C, radii
+
+
+# ---------------------------------------------------------
+# FULL REFIT (scheduled)
+# ---------------------------------------------------------
+def fit_cluster_model(
+    db: Session,
+    *,
+    eps: float = 0.6,
+    min_samples: int = 4,
+    mode: str = "auto",
+    cosine_eps: float = 0.15
+) -> Dict[str, Any]:
+    """
+    Cluster all templates, store one centroid + radius per cluster and
+    write cluster_id / is_outlier back to every template.
+    """
+    tids, templates, counts, embs = embed_templates_from_db(db, limit=None)
+    if not tids:
+        return {"status": "skipped", "reason": "no_templates"}
+
+    labels, method, _ = cluster_embeddings(
+        embs, counts, eps=eps, min_samples=min_samples, mode=mode, cosine_eps=cosine_eps
+    )
+    X = l2_normalize(embs)
+
+    found = sorted(set(labels.tolist()) - {-1})
+    centroids, radii, sizes, n_templates, samples = [], [], [], [], []
+    for label in found:
+        members = np.flatnonzero(labels == label)
+        w = counts[members]
+        c = l2_normalize((X[members] * w[:, None]).sum(axis=0, keepdims=True))[0]
+        d = 1.0 - X[members] @ c
+
+        centroids.append(c)
+        radii.append(max(MIN_RADIUS, float(np.quantile(d, RADIUS_QUANTILE)) * RADIUS_SLACK))
+        sizes.append(int(w.sum()))
+        n_templates.append(len(members))
+        samples.append(templates[members[np.argmax(w)]])
+
+    C = np.stack(centroids) if centroids else np.zeros((0, X.shape[1]), dtype=np.float32)
+    old = {cid: np.frombuffer(vec, dtype=np.float32)
+           for cid, vec in db.query(SemanticCluster.id, SemanticCluster.centroid)}
+    cluster_ids = _match_ids(C, old)
+
+    now = datetime.utcnow()
+    db.execute(delete(SemanticCluster))
+    if found:
+        db.execute(insert(SemanticCluster), [
+            {
+                "id": cid,
+                "centroid": C[i].astype(np.float32).tobytes(),
+                "dim": int(C.shape[1]),
+                "radius": radii[i],
+                "size": sizes[i],
+                "n_templates": n_templates[i],
+                "sample_message": samples[i],
+                "created_at": now,
+                "updated_at": now,
+            }
+            for i, cid in enumerate(cluster_ids)
+        ])
+
+    # per template: fitted cluster; noise inside some cluster's radius joins it,
+    # so fitted and incrementally assigned templates follow the same rule
+    label_to_id = dict(zip(found, cluster_ids))
+    member_of = np.array([label_to_id.get(l, -1) for l in labels.tolist()])
+    if found:
+        nearest, dist = _nearest(X, C)
+        join = (member_of == -1) & (dist <= np.array(radii)[nearest])
+        member_of[join] = np.array(cluster_ids)[nearest[join]]
+    else:
+        dist = np.ones(len(tids), dtype=np.float32)
+
+    db.execute(update(LogTemplate), [
+        {
+            "id": tid,
+            "cluster_id": int(cid) if cid != -1 else None,
+            "is_outlier": bool(cid == -1),
+            "outlier_distance": float(d),
+            "assigned_at": now,
+        }
+        for tid, cid, d in zip(tids, member_of, dist)
+    ])
+
+    state = db.get(DetectorState, MODEL_NAME, with_for_update=True)
+    if state is None:
+        state = DetectorState(name=MODEL_NAME, last_log_id=0)
+        db.add(state)
+    state.fitted_at = now
+
+    db.commit()
+    bump_generation()     # cached clustering results are stale now
+    return {
+        "status": "fitted",
+        "method": method,
+        "n_templates": len(tids),
+        "n_clusters": len(found),
+        "n_outliers": int((member_of == -1).sum()),
+    }
+
+
+# ---------------------------------------------------------
+# INCREMENTAL ASSIGNMENT (every pipeline run)
+# ---------------------------------------------------------
+def assign_new_templates(db: Session) -> int:
+    """
+    Assign templates that are new (or were generalized) since the last
+    pass to their nearest stored cluster; beyond its radius → outlier.
+    Only these templates are embedded. Returns templates assigned.
+    """
+    cluster_ids, C, radii = _load_centroids(db)
+    if not cluster_ids:
+        return 0
+
+    assigned = 0
+    while True:
+        pending = (
+            db.query(LogTemplate.id, LogTemplate.template)
+            .filter(LogTemplate.assigned_at.is_(None))
+            .order_by(LogTemplate.id)
+            .limit(ASSIGN_CHUNK)
+            .all()
+        )
+        if not pending:
+            break
+
+        embs, _ = embed_messages_cached(db, [r.template for r in pending])
+        idx, dist = _nearest(l2_normalize(embs), C)
+        inside = dist <= radii[idx]
+
+        now = datetime.utcnow()
+        db.execute(update(LogTemplate), [
+            {
+                "id": r.id,
+                "cluster_id": cluster_ids[i] if ok else None,
+                "is_outlier": not bool(ok),
+                "outlier_distance": float(d),
+                "assigned_at": now,
+            }
+            for r, i, d, ok in zip(pending, idx, dist, inside)
+        ])
+        db.commit()
+        assigned += len(pending)
+
+    return assigned
+
+
+def update_cluster_model(db: Session) -> Dict[str, Any]:
+    """
+    Pipeline hook: full refit when the model is older than
+    CLUSTER_REFIT_HOURS (or missing), otherwise incremental assignment.
+    """
+    state = db.get(DetectorState, MODEL_NAME)
+    due = (
+        state is None
+        or state.fitted_at is None
+        or datetime.utcnow() - state.fitted_at >= timedelta(hours=settings.CLUSTER_REFIT_HOURS)
+    )
+    try:
+        if due:
+            return fit_cluster_model(db)
+        assigned = assign_new_templates(db)
+        if assigned:
+            bump_generation()
+        return {"status": "assigned", "n_assigned": assigned}
+    except RuntimeError as e:
+        # embedding model not installed → skip, the rest of the pipeline still ran
+        db.rollback()
+        return {"status": "skipped", "reason": str(e)}
+
+
+# ---------------------------------------------------------
+# READ
+# ---------------------------------------------------------
+def is_fitted(db: Session) -> bool:
+    state = db.get(DetectorState, MODEL_NAME)
+    return state is not None and state.fitted_at is not None
+
+
+def get_outlier_templates(db: Session, limit: int = 500) -> Dict[str, Any]:
+    """
+    Outliers as recorded by the cluster model (indexed lookup, no embedding).
+    """
+    rows = (
+        db.query(LogTemplate)
+        .filter(LogTemplate.is_outlier.is_(True))
+        .order_by(LogTemplate.last_seen.desc())
+        .limit(limit)
+        .all()
+    )
+    state = db.get(DetectorState, MODEL_NAME)
+
+    return {
+        "outliers": [
+            {
+                "template_id": r.id,
+                "message": r.template,
+                "count": r.count,
+                "distance": r.outlier_distance,
+                "last_seen": r.last_seen.isoformat() if r.last_seen else None,
+            }
+            for r in rows
+        ],
+        "meta": {
+            "source": "cluster_model",
+            "fitted_at": state.fitted_at.isoformat() if state and state.fitted_at else None,
+            "n_clusters": db.query(SemanticCluster).count(),
+        }
+    }
@@ -2,12 +2,14 @@
 
 from typing import Dict, Any, List, Tuple
 import numpy as np
-from sklearn.cluster import DBSCAN, KMeans
+from sklearn.cluster import DBSCAN, KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA
 from sklearn.preprocessing import StandardScaler
 from sqlalchemy.orm import Session
 from collections import defaultdict
 
-from app.services.ml.embeddings import embed_logs_from_db
+from app.core.config import settings
+from app.services.ml.embeddings import embed_logs_from_db, embed_templates_from_db
 
 
 # ---------------------------------------------------------
@@ -16,15 +18,16 @@ from app.services.ml.embeddings import embed_logs_from_db
 def _apply_dbscan(
     embeddings: np.ndarray,
     eps: float = 0.85,
-    min_samples: int = 3
+    min_samples: int = 3,
+    sample_weight: np.ndarray | None = None
 ) -> np.ndarray:
 
     if embeddings.shape[0] == 0:
         return np.array([], dtype=int)
 
-    # Normalize vectors
+    # Normalize vectors (weighted → same scaling as the expanded raw lines)
     scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(embeddings)
+    X_scaled = scaler.fit_transform(embeddings, sample_weight=sample_weight)
 
     db = DBSCAN(
         eps=eps,
@@ -33,13 +36,17 @@ def _apply_dbscan(
         n_jobs=-1
     )
 
-    return db.fit_predict(X_scaled)
+    return db.fit_predict(X_scaled, sample_weight=sample_weight)
 
 
 # ---------------------------------------------------------
 # INTERNAL — KMEANS (Fallback)
 # ---------------------------------------------------------
-def _apply_kmeans(embeddings: np.ndarray, max_clusters: int = 8) -> np.ndarray:
+def _apply_kmeans(
+    embeddings: np.ndarray,
+    max_clusters: int = 8,
+    sample_weight: np.ndarray | None = None
+) -> np.ndarray:
 
     n = embeddings.shape[0]
     if n == 0:
@@ -47,6 +54,7 @@ def _apply_kmeans(embeddings: np.ndarray, max_clusters: int = 8) -> np.ndarray:
 
     # Choose cluster count dynamically
     k = max(2, min(max_clusters, n // 10))  # heuristic
+    k = min(k, n)
 
     km = KMeans(
         n_clusters=k,
@@ -54,7 +62,135 @@ def _apply_kmeans(embeddings: np.ndarray, max_clusters: int = 8) -> np.ndarray:
         n_init=10
     )
 
-    return km.fit_predict(embeddings)
+    return km.fit_predict(embeddings, sample_weight=sample_weight)
+
+
+# ---------------------------------------------------------
+# INTERNAL — SCALABLE (large inputs)
+# ---------------------------------------------------------
+MAX_MICRO_CLUSTERS = 512
+PCA_FIT_SAMPLE = 20_000
+PREPARE_CHUNK = 50_000
+
+
+def l2_normalize(X: np.ndarray) -> np.ndarray:
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+def _prepare_vectors(embeddings: np.ndarray, n_components: int) -> np.ndarray:
+    """
+    L2-normalize, then (optionally) randomized PCA fitted on a sample and
+    re-normalize. Done in chunks so only the reduced matrix is allocated.
+    """
+    n, d = embeddings.shape
+    if not n_components or d <= n_components or n <= n_components:
+        return l2_normalize(embeddings)
+
+    rng = np.random.default_rng(42)
+    sample = embeddings if n <= PCA_FIT_SAMPLE else \
+        embeddings[np.sort(rng.choice(n, PCA_FIT_SAMPLE, replace=False))]
+    pca = PCA(n_components=n_components, svd_solver="randomized", random_state=42)
+    pca.fit(l2_normalize(sample))
+
+    out = np.empty((n, n_components), dtype=np.float32)
+    for i in range(0, n, PREPARE_CHUNK):
+        chunk = l2_normalize(embeddings[i:i + PREPARE_CHUNK])
+        out[i:i + PREPARE_CHUNK] = l2_normalize(pca.transform(chunk))
+    return out
+
+
+def _apply_scalable(
+    embeddings: np.ndarray,
+    cosine_eps: float = 0.15,
+    min_samples: int = 3,
+    sample_weight: np.ndarray | None = None,
+    n_components: int = 64
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Approximate DBSCAN for large n, in cosine space:
+      1. L2-normalize (+ optional PCA)
+      2. MiniBatchKMeans → ~2*sqrt(n) micro-clusters (coarse pass)
+      3. DBSCAN (cosine) on the micro-centroids, weighted by their mass
+      4. points farther than cosine_eps from their micro-centroid → noise
+    Returns (labels, micro_labels); micro_labels serve as the fallback.
+    """
+    n = embeddings.shape[0]
+    if n == 0:
+        return np.array([], dtype=int), np.array([], dtype=int)
+
+    X = _prepare_vectors(embeddings, n_components)
+    w = np.ones(n) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+
+    k = int(min(n, max(8, min(MAX_MICRO_CLUSTERS, 2 * np.sqrt(n)))))
+    mbk = MiniBatchKMeans(n_clusters=k, batch_size=4096, n_init=3, random_state=42)
+    micro = mbk.fit_predict(X, sample_weight=w)
+
+    centroids = l2_normalize(mbk.cluster_centers_)
+    mass = np.bincount(micro, weights=w, minlength=k)
+
+    used = np.flatnonzero(mass > 0)
+    merged = np.full(k, -1)
+    merged[used] = DBSCAN(
+        eps=cosine_eps,
+        min_samples=min_samples,
+        metric="cosine"
+    ).fit_predict(centroids[used], sample_weight=mass[used])
+
+    labels = merged[micro]
+    dist = 1.0 - np.einsum("ij,ij->i", X, centroids[micro])
+    labels[dist > cosine_eps] = -1
+
+    return labels, micro
+
+
+# ---------------------------------------------------------
+# PUBLIC — label assignment (shared with the persistent cluster model)
+# ---------------------------------------------------------
+def cluster_embeddings(
+    embeddings: np.ndarray,
+    weights: np.ndarray | None = None,
+    *,
+    eps: float = 0.85,
+    min_samples: int = 3,
+    kmeans_fallback_max_clusters: int = 8,
+    mode: str = "auto",
+    cosine_eps: float = 0.15
+) -> Tuple[np.ndarray, str, bool]:
+    """
+    Returns (labels, method, scalable); label -1 = outlier.
+    """
+    scalable = mode == "scalable" or (
+        mode == "auto" and embeddings.shape[0] >= settings.CLUSTER_SCALABLE_MIN_ITEMS
+    )
+
+    # Run DBSCAN (exact, or the approximate large-n variant)
+    if scalable:
+        labels, micro = _apply_scalable(
+            embeddings,
+            cosine_eps=cosine_eps,
+            min_samples=min_samples,
+            sample_weight=weights,
+            n_components=settings.CLUSTER_PCA_COMPONENTS,
+        )
+    else:
+        labels = _apply_dbscan(embeddings, eps=eps, min_samples=min_samples, sample_weight=weights)
+
+    unique = set(labels.tolist())
+    non_noise = [c for c in unique if c >= 0]
+
+    # Fallback to KMeans if DBSCAN fails
+    if len(non_noise) < 1:
+        if scalable:
+            return micro, "minibatch_kmeans", True
+        labels = _apply_kmeans(
+            embeddings, max_clusters=kmeans_fallback_max_clusters, sample_weight=weights
+        )
+        return labels, "kmeans", False
+
+    return labels, ("scalable_dbscan" if scalable else "dbscan"), scalable
 
 
 # ---------------------------------------------------------
@@ -67,18 +203,34 @@ def run_semantic_clustering(
     min_samples: int = 3,
     kmeans_fallback_max_clusters: int = 8,
     testing: bool = False,
-    limit: int = 2000
+    limit: int | None = 2000,
+    by_template: bool = False,
+    mode: str = "auto",
+    cosine_eps: float = 0.15,
+    include_members: bool = True
 ) -> Dict[str, Any]:
     """
     Steps:
-      1. Convert log messages to embeddings
+      1. Convert templates (or raw log messages) to embeddings
       2. Try DBSCAN clustering
       3. If DBSCAN yields no clusters → fallback to KMeans
       4. Return clusters + outliers + metadata
+
+    by_template: cluster unique mined templates weighted by their line
+    counts instead of embedding raw log messages (the default).
+    mode: "exact" (DBSCAN, eps on standardized vectors), "scalable"
+    (see _apply_scalable, cosine_eps) or "auto" → scalable from
+    CLUSTER_SCALABLE_MIN_ITEMS items on.
+    include_members: False leaves out each cluster's member id list
+    (count and sample messages stay).
     """
 
     # 1. Fetch embeddings + IDs
-    ids, messages, embeddings = embed_logs_from_db(db, limit=limit, testing=testing)
+    if by_template:
+        ids, messages, weights, embeddings = embed_templates_from_db(db, limit=limit, testing=testing)
+    else:
+        ids, messages, embeddings = embed_logs_from_db(db, limit=limit, testing=testing)
+        weights = None
     n_items = len(ids)
 
     if n_items == 0:
@@ -88,38 +240,42 @@ def run_semantic_clustering(
             "meta": {"method": "none", "n_items": 0, "reason": "no_logs"}
         }
 
-    # 2. Run DBSCAN
-    labels = _apply_dbscan(embeddings, eps=eps, min_samples=min_samples)
-
-    unique = set(labels.tolist())
-    non_noise = [c for c in unique if c >= 0]
-
-    # 3. Fallback to KMeans if DBSCAN fails
-    if len(non_noise) < 1:
-        labels = _apply_kmeans(embeddings, max_clusters=kmeans_fallback_max_clusters)
-        method = "kmeans"
-    else:
-        method = "dbscan"
+    # 2-3. DBSCAN (exact or scalable), with the KMeans fallback
+    labels, method, scalable = cluster_embeddings(
+        embeddings,
+        weights,
+        eps=eps,
+        min_samples=min_samples,
+        kmeans_fallback_max_clusters=kmeans_fallback_max_clusters,
+        mode=mode,
+        cosine_eps=cosine_eps,
+    )
 
     # 4. Build structured cluster response
+    counts = weights.astype(int).tolist() if weights is not None else [1] * n_items
     cluster_map = defaultdict(list)
 
     for idx, label in enumerate(labels):
-        cluster_map[int(label)].append((ids[idx], messages[idx]))
+        cluster_map[int(label)].append((ids[idx], messages[idx], counts[idx]))
 
+    id_key = "template_ids" if by_template else "ids"
     clusters = {}
     outliers = []
 
     for cluster_id, items in cluster_map.items():
         if cluster_id == -1:
             # Noise/outliers
-            for _id, msg in items:
-                outliers.append({"id": _id, "message": msg})
+            for _id, msg, c in items:
+                if by_template:
+                    outliers.append({"template_id": _id, "message": msg, "count": c})
+                else:
+                    outliers.append({"id": _id, "message": msg})
         else:
+            members = {id_key: [i for i, _, _ in items]} if include_members else {}
             clusters[cluster_id] = {
-                "count": len(items),
-                "ids": [i for i, _ in items],
-                "sample_messages": [m for _, m in items[:5]]
+                "count": sum(c for _, _, c in items),
+                **members,
+                "sample_messages": [m for _, m, _ in items[:5]]
             }
 
     return {
@@ -127,9 +283,12 @@ def run_semantic_clustering(
         "outliers": outliers,
         "meta": {
             "method": method,
+            "unit": "template" if by_template else "log",
             "n_items": n_items,
+            "n_logs": sum(counts),
             "n_clusters": len(clusters),
-            "eps": eps,
+            "mode": "scalable" if scalable else "exact",
+            "eps": cosine_eps if scalable else eps,
             "min_samples": min_samples,
         }
     }
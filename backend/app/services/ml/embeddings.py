@@ -1,30 +1,309 @@
 # app/services/ml/embeddings.py
-from typing import List, Tuple
+from typing import Dict, List, Tuple
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import hashlib
+import re
+import threading
+import time
 import numpy as np
 from sqlalchemy.orm import Session
+from sqlalchemy import update, delete, select, func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from app.core.config import settings
 from app.models.log import Log
+from app.models.embedding_cache import EmbeddingCache
+from app.models.log_template import LogTemplate
+
+EMBEDDING_DIM = 384
+_DB_LOOKUP_CHUNK = 500
 
 # lazy import to avoid import-time failure when package not installed
 _MODEL = None
+_MODEL_LOCK = threading.Lock()
+
+# throughput counters (process-wide)
+_STATS = {"calls": 0, "messages": 0, "seconds": 0.0, "last_rate": 0.0, "load_seconds": None}
+_STATS_LOCK = threading.Lock()
+
+
+def _build_model():
+    """
+    Load the sentence-transformer for CPU inference according to settings:
+      EMBED_BACKEND = torch (default) | int8 (dynamic quantized Linear layers)
+                      | onnx (ONNX Runtime, needs sentence-transformers[onnx])
+      EMBED_TORCH_THREADS > 0 caps intra-op threads.
+    """
+    try:
+        from sentence_transformers import SentenceTransformer
+    except Exception as e:
+        raise RuntimeError(
+            "sentence-transformers not available. Install with: pip install sentence-transformers"
+        ) from e
+
+    backend = settings.EMBED_BACKEND
+    device = settings.EMBED_DEVICE or None
+
+    if settings.EMBED_TORCH_THREADS > 0:
+        import torch
+        torch.set_num_threads(settings.EMBED_TORCH_THREADS)
+
+    if backend == "onnx":
+        return SentenceTransformer(settings.EMBED_MODEL_NAME, device=device, backend="onnx")
+
+    model = SentenceTransformer(settings.EMBED_MODEL_NAME, device=device)
+    if backend == "int8":
+        import torch
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
 
 def _load_model():
     global _MODEL
     if _MODEL is None:
-        try:
-            from sentence_transformers import SentenceTransformer
-        except Exception as e:
-            raise RuntimeError(
-                "sentence-transformers not available. Install with: pip install sentence-transformers"
-            ) from e
-        _MODEL = SentenceTransformer("all-MiniLM-L6-v2")
+        with _MODEL_LOCK:
+            # concurrent first requests wait for a single load
+            if _MODEL is None:
+                t0 = time.perf_counter()
+                _MODEL = _build_model()
+                _STATS["load_seconds"] = round(time.perf_counter() - t0, 3)
     return _MODEL
 
+
 def embed_messages(messages: List[str]) -> np.ndarray:
     """
     Embed a list of messages (strings) -> numpy ndarray (n, d).
+    Batches of EMBED_BATCH_SIZE; encode() sorts inputs by length before
+    batching, so each batch pads to similar-length texts.
     """
     model = _load_model()
-    return model.encode(messages, show_progress_bar=False, convert_to_numpy=True)
+    t0 = time.perf_counter()
+    embs = model.encode(
+        messages,
+        batch_size=settings.EMBED_BATCH_SIZE,
+        show_progress_bar=False,
+        convert_to_numpy=True,
+    )
+    elapsed = time.perf_counter() - t0
+
+    with _STATS_LOCK:
+        _STATS["calls"] += 1
+        _STATS["messages"] += len(messages)
+        _STATS["seconds"] += elapsed
+        if elapsed > 0:
+            _STATS["last_rate"] = len(messages) / elapsed
+    return embs
+
+
+def warm_up():
+    """
+    Load the model and run one tiny batch, so the first real request
+    does not pay for the load / lazy init.
+    """
+    embed_messages(["warm up"])
+
+
+def embedding_stats() -> Dict:
+    with _STATS_LOCK:
+        stats = dict(_STATS)
+    stats["loaded"] = _MODEL is not None
+    stats["backend"] = settings.EMBED_BACKEND
+    stats["batch_size"] = settings.EMBED_BATCH_SIZE
+    stats["messages_per_sec"] = (
+        round(stats["messages"] / stats["seconds"], 1) if stats["seconds"] else 0.0
+    )
+    stats["last_rate"] = round(stats["last_rate"], 1)
+    stats["seconds"] = round(stats["seconds"], 3)
+    return stats
+
+
+# ---------------------------------------------------------
+# EMBEDDING CACHE (in-process LRU → DB blob table → model)
+# ---------------------------------------------------------
+_WS = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    return _WS.sub(" ", message).strip()
+
+
+def message_key(normalized: str) -> str:
+    # vectors from different models must not be mixed up in the cache
+    return hashlib.sha1(f"{settings.EMBED_MODEL_NAME}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+class _LRU:
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._data: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            vec = self._data.get(key)
+            if vec is not None:
+                self._data.move_to_end(key)
+            return vec
+
+    def put(self, key: str, vec: np.ndarray):
+        with self._lock:
+            self._data[key] = vec
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+
+_MEMORY = _LRU(settings.EMBED_CACHE_MEMORY_ITEMS)
+
+# cache table size as last counted + rows inserted by this process since then
+_ROWS = {"count": None, "counted_at": 0.0}
+_ROWS_LOCK = threading.Lock()
+
+
+def _load_from_db(db: Session, keys: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Look up vectors by key. last_used is refreshed only for hits whose
+    stamp is older than EMBED_CACHE_TOUCH_SECONDS, in one UPDATE per
+    chunk, so repeat hits don't rewrite rows on every call.
+    """
+    found = {}
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.EMBED_CACHE_TOUCH_SECONDS)
+    touch = []
+    for i in range(0, len(keys), _DB_LOOKUP_CHUNK):
+        chunk = keys[i:i + _DB_LOOKUP_CHUNK]
+        rows = db.execute(
+            select(EmbeddingCache.key, EmbeddingCache.dtype, EmbeddingCache.vector, EmbeddingCache.last_used)
+            .where(EmbeddingCache.key.in_(chunk))
+        ).all()
+        for key, dtype, blob, last_used in rows:
+            found[key] = np.frombuffer(blob, dtype=dtype).astype(np.float32)
+            if last_used is None or last_used < stale_before:
+                touch.append(key)
+
+    now = datetime.utcnow()
+    for i in range(0, len(touch), _DB_LOOKUP_CHUNK):
+        db.execute(
+            update(EmbeddingCache)
+            .where(EmbeddingCache.key.in_(touch[i:i + _DB_LOOKUP_CHUNK]))
+            .values(last_used=now)
+        )
+    return found
+
+
+def _store_in_db(db: Session, vectors: Dict[str, np.ndarray]):
+    dtype = settings.EMBED_CACHE_DTYPE
+    now = datetime.utcnow()
+    params = [
+        {
+            "key": key,
+            "dim": int(vec.shape[0]),
+            "dtype": dtype,
+            "vector": vec.astype(dtype).tobytes(),
+            "last_used": now,
+        }
+        for key, vec in vectors.items()
+    ]
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(EmbeddingCache).on_conflict_do_nothing(index_elements=["key"])
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(EmbeddingCache).on_conflict_do_nothing(index_elements=["key"])
+    else:
+        existing = set(_load_from_db(db, list(vectors)))
+        params = [p for p in params if p["key"] not in existing]
+        stmt = insert(EmbeddingCache)
+
+    if params:
+        db.execute(stmt, params)
+
+
+def _evict_db(db: Session, inserted: int):
+    """
+    Keep the table under EMBED_CACHE_MAX_ROWS by dropping least recently used rows.
+    The size is tracked in-process (last COUNT + rows inserted since), and
+    the table is only re-counted when that estimate crosses the limit or
+    the count is older than EMBED_CACHE_COUNT_SECONDS.
+    """
+    with _ROWS_LOCK:
+        fresh = (
+            _ROWS["count"] is not None
+            and time.monotonic() - _ROWS["counted_at"] < settings.EMBED_CACHE_COUNT_SECONDS
+        )
+        if fresh:
+            _ROWS["count"] += inserted
+            if _ROWS["count"] <= settings.EMBED_CACHE_MAX_ROWS:
+                return
+
+    total = db.scalar(select(func.count()).select_from(EmbeddingCache))
+    excess = total - settings.EMBED_CACHE_MAX_ROWS
+    if excess > 0:
+        oldest = (
+            select(EmbeddingCache.key)
+            .order_by(EmbeddingCache.last_used.asc())
+            .limit(excess)
+            .scalar_subquery()
+        )
+        db.execute(delete(EmbeddingCache).where(EmbeddingCache.key.in_(oldest)))
+        total -= excess
+
+    with _ROWS_LOCK:
+        _ROWS["count"] = total
+        _ROWS["counted_at"] = time.monotonic()
+
+
+def embed_messages_cached(db: Session, messages: List[str]) -> Tuple[np.ndarray, Dict[str, int]]:
+    """
+    Embed messages through the cache. Identical (normalized) messages are
+    embedded once; only never-seen texts reach the model.
+    Returns (embeddings (n, d) float32, stats).
+    """
+    norms = [normalize_message(m) for m in messages]
+    keys = [message_key(n) for n in norms]
+
+    # unique texts, first occurrence order
+    unique: Dict[str, str] = {}
+    for k, n in zip(keys, norms):
+        unique.setdefault(k, n)
+
+    vectors: Dict[str, np.ndarray] = {}
+    for k in unique:
+        vec = _MEMORY.get(k)
+        if vec is not None:
+            vectors[k] = vec
+    memory_hits = len(vectors)
+
+    missing = [k for k in unique if k not in vectors]
+    from_db = _load_from_db(db, missing) if missing else {}
+    vectors.update(from_db)
+
+    missing = [k for k in missing if k not in from_db]
+    if missing:
+        embs = embed_messages([unique[k] for k in missing]).astype(np.float32)
+        fresh = dict(zip(missing, embs))
+        _store_in_db(db, fresh)
+        _evict_db(db, len(fresh))
+        vectors.update(fresh)
+
+    db.commit()
+
+    for k in from_db:
+        _MEMORY.put(k, from_db[k])
+    for k in missing:
+        _MEMORY.put(k, vectors[k])
+
+    stats = {
+        "messages": len(messages),
+        "unique": len(unique),
+        "memory_hits": memory_hits,
+        "db_hits": len(from_db),
+        "encoded": len(missing),
+    }
+
+    if not keys:
+        return np.zeros((0, EMBEDDING_DIM), dtype=np.float32), stats
+    return np.stack([vectors[k] for k in keys]), stats
+
 
 def embed_logs_from_db(db: Session, limit: int = None, testing: bool = False
                        ) -> Tuple[List[int], List[str], np.ndarray]:
@@ -32,8 +311,9 @@ def embed_logs_from_db(db: Session, limit: int = None, testing: bool = False
     Fetch log messages from DB and return (ids, messages, embeddings)
     - limit: number of logs to fetch (None = all)
     - testing: if True, fetch all logs (same as limit=None)
+    Embeddings come from the cache; only unseen messages are encoded.
     """
-    query = db.query(Log).order_by(Log.id.asc())
+    query = db.query(Log.id, Log.message).order_by(Log.id.asc())
     if limit and not testing:
         query = query.limit(limit)
     rows = query.all()
@@ -45,6 +325,32 @@ def embed_logs_from_db(db: Session, limit: int = None, testing: bool = False
             ids.append(r.id)
             messages.append(r.message.strip())
     if not messages:
-        return ids, messages, np.zeros((0, 384))
-    embs = embed_messages(messages)
+        return ids, messages, np.zeros((0, EMBEDDING_DIM))
+    embs, _ = embed_messages_cached(db, messages)
     return ids, messages, embs
+
+
+def embed_templates_from_db(db: Session, limit: int = None, testing: bool = False
+                            ) -> Tuple[List[int], List[str], np.ndarray, np.ndarray]:
+    """
+    Fetch mined templates and return (template_ids, templates, counts, embeddings).
+    One embedding per template instead of per log line; counts carry the
+    number of lines each template stands for.
+    - limit: most frequent templates to fetch (None = all)
+    """
+    query = (
+        db.query(LogTemplate.id, LogTemplate.template, LogTemplate.count)
+        .filter(LogTemplate.count > 0)
+        .order_by(LogTemplate.count.desc(), LogTemplate.id.asc())
+    )
+    if limit and not testing:
+        query = query.limit(limit)
+    rows = query.all()
+
+    ids = [r.id for r in rows]
+    templates = [r.template for r in rows]
+    counts = np.array([r.count for r in rows], dtype=np.float64)
+    if not templates:
+        return ids, templates, counts, np.zeros((0, EMBEDDING_DIM))
+    embs, _ = embed_messages_cached(db, templates)
+    return ids, templates, counts, embs
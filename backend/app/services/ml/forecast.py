@@ -3,7 +3,9 @@
 from typing import Dict, Any, List
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from app.models.log import Log
+from sqlalchemy import func
+from app.models.log_rollup import LogRollup
+from app.services.rollup import minute_floor
 import numpy as np
 from sklearn.linear_model import LinearRegression
 from collections import defaultdict
@@ -12,18 +14,25 @@ from collections import defaultdict
 def _errors_per_minute(db: Session, minutes: int = 60, testing: bool = False):
     """
     Extract error counts per minute + compute rolling averages to avoid flat 0 vectors.
+    Counts come straight from the per-minute rollup.
     """
     since = datetime.utcnow() - timedelta(minutes=minutes)
+
+    query = db.query(LogRollup.bucket, func.sum(LogRollup.error_count))
+    if not testing:
+        query = query.filter(LogRollup.bucket >= minute_floor(since))
+
     rows = (
-        db.query(Log).filter(Log.timestamp >= since).all()
-        if not testing else db.query(Log).all()
+        query
+        .group_by(LogRollup.bucket)
+        .having(func.sum(LogRollup.error_count) > 0)
+        .all()
     )
 
     counts = defaultdict(int)
-    for r in rows:
-        if r.level and r.level.upper() in ("ERROR", "CRITICAL"):
-            minute = int(r.timestamp.replace(second=0, microsecond=0).timestamp() // 60)
-            counts[minute] += 1
+    for bucket, errors in rows:
+        minute = int(bucket.timestamp() // 60)
+        counts[minute] += int(errors)
 
     # Fill missing minutes with 0 → required for rolling
     if counts:
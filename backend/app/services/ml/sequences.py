@@ -1,57 +1,129 @@
 # app/services/ml/sequences.py
 
-from typing import Dict, Any, List
+from typing import Dict, Any, List, NamedTuple, Tuple
+import pickle
+import numpy as np
+import pandas as pd
 from sqlalchemy.orm import Session
-from collections import defaultdict
+from sqlalchemy import select
 from datetime import datetime, timedelta
+from app.core.config import settings
 from app.models.log import Log
+from app.models.anomaly import Anomaly
+from app.models.detector_state import DetectorState
+from app.services.db_service import save_anomalies
 
 
 # -----------------------------------------------------------
-# 5.1 — Build Transition Matrix
+# 5.0 — Window fetch + integer encoding (one query, columns only)
 # -----------------------------------------------------------
-def build_transition_matrix(
+class EncodedWindow(NamedTuple):
+    """
+    Events of a log window ordered by (session, timestamp, id).
+    sessions / endpoints are integer codes into session_names / endpoint_names;
+    timestamps stay datetime objects (only read for reported rows).
+    """
+    ids: np.ndarray
+    timestamps: np.ndarray
+    sessions: np.ndarray
+    endpoints: np.ndarray
+    session_names: np.ndarray
+    endpoint_names: np.ndarray
+
+
+def fetch_encoded_window(
     db: Session,
     *,
     window_hours: int = 24,
     testing: bool = False
-) -> Dict[str, Dict[str, int]]:
+) -> EncodedWindow:
     """
-    Build a transition count matrix of endpoint sequences.
-    Group by IP (session-like behavior).
-    If testing=True → pull all logs.
+    Fetch (id, ip, endpoint, timestamp) for the window, factorize ip /
+    endpoint to int codes and put events in session order.
+    Sorting happens in NumPy: an ORDER BY over millions of rows costs more
+    on the DB side than a lexsort of integer columns.
+    Each IP is a session ("global" when the IP is missing).
+    If testing=True → all logs.
     """
+    query = select(Log.id, Log.ip, Log.endpoint, Log.timestamp) \
+        .where(Log.endpoint.isnot(None), Log.endpoint != "")
+    if not testing:
+        query = query.where(Log.timestamp >= datetime.utcnow() - timedelta(hours=window_hours))
 
-    since = datetime.utcnow() - timedelta(hours=window_hours)
+    return _encode_window(db.execute(query).all())
 
-    rows = (
-        db.query(Log).order_by(Log.timestamp.asc()).all()
-        if testing else
-        db.query(Log)
-            .filter(Log.timestamp >= since)
-            .order_by(Log.timestamp.asc())
-            .all()
+
+def _encode_window(rows) -> EncodedWindow:
+    """
+    Rows of (id, ip, endpoint, timestamp) → EncodedWindow.
+    """
+    if not rows:
+        empty = np.array([], dtype=np.int64)
+        return EncodedWindow(empty, np.array([], dtype=object), empty, empty,
+                             np.array([], dtype=object), np.array([], dtype=object))
+
+    ids, ips, endpoints, timestamps = zip(*rows)
+
+    ids = np.fromiter(ids, dtype=np.int64, count=len(rows))
+    ts_order = pd.DatetimeIndex(timestamps).asi8        # NaT sorts first
+    sessions, session_names = pd.factorize(pd.Series(ips).fillna("global"), sort=False)
+    codes, endpoint_names = pd.factorize(pd.Series(endpoints), sort=False)
+
+    order = np.lexsort((ids, ts_order, sessions))
+    return EncodedWindow(
+        ids[order],
+        np.array(timestamps, dtype=object)[order],
+        sessions.astype(np.int64)[order],
+        codes.astype(np.int64)[order],
+        np.asarray(session_names, dtype=object),
+        np.asarray(endpoint_names, dtype=object),
     )
 
-    # Group logs by IP (acts like a "session")
-    groups = defaultdict(list)
-    for r in rows:
-        if r.endpoint:
-            key = r.ip or "global"
-            groups[key].append((r.timestamp, r.endpoint))
 
-    # Build transition counts
-    transitions = defaultdict(lambda: defaultdict(int))
+def session_transitions(window: EncodedWindow):
+    """
+    Consecutive events inside the same session → (src, dst, position of dst).
+    """
+    same = window.sessions[1:] == window.sessions[:-1]
+    pos = np.flatnonzero(same) + 1
+    return window.endpoints[pos - 1], window.endpoints[pos], pos
+
 
-    for key, events in groups.items():
-        events.sort(key=lambda x: x[0])
-        last = None
+def count_transitions(src: np.ndarray, dst: np.ndarray, n_endpoints: int):
+    """
+    Transition counts keyed by pair code src * n + dst.
+    Returns (pair_codes, pair_counts, row_totals); sparse by construction,
+    so the size does not depend on n_endpoints².
+    """
+    codes = src.astype(np.int64) * n_endpoints + dst
+    pair_codes, pair_counts = np.unique(codes, return_counts=True)
+    row_totals = np.bincount(src, minlength=n_endpoints)
+    return pair_codes, pair_counts, row_totals
 
-        for ts, endpoint in events:
-            if last is not None:
-                transitions[last][endpoint] += 1
-            last = endpoint
 
+# -----------------------------------------------------------
+# 5.1 — Build Transition Matrix
+# -----------------------------------------------------------
+def build_transition_matrix(
+    db: Session,
+    *,
+    window_hours: int = 24,
+    testing: bool = False
+) -> Dict[str, Dict[str, int]]:
+    """
+    Build a transition count matrix of endpoint sequences.
+    Group by IP (session-like behavior).
+    If testing=True → pull all logs.
+    """
+    window = fetch_encoded_window(db, window_hours=window_hours, testing=testing)
+    n = len(window.endpoint_names)
+    src, dst, _ = session_transitions(window)
+    pair_codes, pair_counts, _ = count_transitions(src, dst, n)
+
+    transitions: Dict[str, Dict[str, int]] = {}
+    for code, count in zip(pair_codes.tolist(), pair_counts.tolist()):
+        a, b = divmod(code, n)
+        transitions.setdefault(window.endpoint_names[a], {})[window.endpoint_names[b]] = count
     return transitions
 
 
@@ -96,47 +168,403 @@ def detect_sequence_anomalies(
 ) -> List[Dict[str, Any]]:
     """
     Detect anomalous transitions using Markov probabilities.
-    Uses SAME log window as transition matrix.
+    One fetch feeds both the transition counts and the scoring, and both
+    walk the same per-IP sessions, so every scored transition is one that
+    was counted.
     """
+    window = fetch_encoded_window(db, window_hours=window_hours, testing=testing)
+    n = len(window.endpoint_names)
+    src, dst, pos = session_transitions(window)
+    if len(pos) == 0:
+        return []
 
-    # 1. Build probability map
-    transition_counts = build_transition_matrix(
-        db, window_hours=window_hours, testing=testing
-    )
-    probs = compute_transition_probabilities(transition_counts)
+    # 1. Counts → probability of every observed transition
+    pair_codes, pair_counts, row_totals = count_transitions(src, dst, n)
+    codes = src.astype(np.int64) * n + dst
+    p = pair_counts[np.searchsorted(pair_codes, codes)] / row_totals[src]
 
-    # 2. Use SAME logs as transition window (Fix!)
-    since = datetime.utcnow() - timedelta(hours=window_hours)
+    # 2. Flag rare transitions, reported in timestamp order
+    rare = np.flatnonzero(p < threshold)
+    rare = sorted(rare.tolist(), key=lambda i: (window.timestamps[pos[i]] or datetime.min, window.ids[pos[i]]))
+
+    anomalies = []
+    for i in rare:
+        j = pos[i]
+        frm = window.endpoint_names[src[i]]
+        to = window.endpoint_names[dst[i]]
+        session = window.session_names[window.sessions[j]]
+        anomalies.append({
+            "timestamp": window.timestamps[j],
+            "from": frm,
+            "to": to,
+            "probability": round(float(p[i]), 6),
+            "log_id": int(window.ids[j]),
+            "ip": None if session == "global" else session,
+            "message": f"Rare transition detected: {frm} → {to}"
+        })
+
+    return anomalies
+
+
+# -----------------------------------------------------------
+# 5.3b — Order-k n-gram model (hashed ids, Witten-Bell backoff)
+# -----------------------------------------------------------
+_FNV_OFFSET = np.uint64(0xcbf29ce484222325)
+_FNV_PRIME = np.uint64(0x100000001b3)
+
+
+def _session_offsets(sessions: np.ndarray) -> np.ndarray:
+    """
+    Number of earlier events in the same session, per event.
+    """
+    n = len(sessions)
+    starts = np.flatnonzero(np.r_[True, sessions[1:] != sessions[:-1]])
+    return np.arange(n) - np.repeat(starts, np.diff(np.r_[starts, n]))
+
+
+def _ngram_hashes(codes: np.ndarray, order: int, hash_buckets: int = 0) -> List[np.ndarray]:
+    """
+    hashes[j-1][i] = FNV-1a style uint64 id of the j-gram ending at event i,
+    built as hash(j-1 gram ending at i-1) ⊕ code[i]. Only meaningful where the
+    session offset is >= j-1. hash_buckets > 0 folds ids into that many
+    buckets, bounding the tables whatever the number of endpoints.
+    """
+    c = codes.astype(np.uint64) + np.uint64(1)
+    hashes = []
+    prev = None
+    with np.errstate(over="ignore"):
+        for j in range(1, order + 1):
+            h = np.full(len(c), _FNV_OFFSET, dtype=np.uint64)
+            if prev is not None:
+                h[1:] = prev[:-1]
+            h = (h ^ c) * _FNV_PRIME
+            hashes.append(h)
+            prev = h
+
+    if hash_buckets:
+        hashes = [h % np.uint64(hash_buckets) for h in hashes]
+    return hashes
+
+
+def _lookup(table_ids: np.ndarray, table_counts: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """
+    Counts of ids in a sorted (ids, counts) table; 0 when absent.
+    """
+    if not len(table_ids):
+        return np.zeros(len(ids))
+    idx = np.minimum(np.searchsorted(table_ids, ids), len(table_ids) - 1)
+    return np.where(table_ids[idx] == ids, table_counts[idx], 0).astype(np.float64)
+
+
+def _ngram_probabilities(window: EncodedWindow, order: int, hash_buckets: int = 0):
+    """
+    Interpolated Witten-Bell probability of every event given up to
+    order-1 preceding events of its session:
+      P1(w)      = (c(w) + 1) / (N + V)
+      Pj(w | h)  = (c(h w) + T(h) * Pj-1(w | h')) / (c(h) + T(h))
+    with T(h) = distinct continuations of context h.
+    Returns (p, used_order) per event.
+    """
+    offset = _session_offsets(window.sessions)
+    hashes = _ngram_hashes(window.endpoints, order, hash_buckets)
+
+    # order 1: add-one unigram
+    uni_ids, uni_counts = np.unique(hashes[0], return_counts=True)
+    p = (_lookup(uni_ids, uni_counts, hashes[0]) + 1) / (len(hashes[0]) + len(uni_ids))
+    used = np.ones(len(p), dtype=np.int64)
+
+    for j in range(2, order + 1):
+        valid = np.flatnonzero(offset >= j - 1)
+        if not len(valid):
+            break
+
+        grams = hashes[j - 1][valid]
+        ctx = hashes[j - 2][valid - 1]
+
+        gram_ids, first, gram_counts = np.unique(grams, return_index=True, return_counts=True)
+        ctx_ids, ctx_counts = np.unique(ctx, return_counts=True)
+        types_ids, types_counts = np.unique(ctx[first], return_counts=True)
 
-    recent_logs = (
-        db.query(Log).order_by(Log.timestamp.asc()).all()
-        if testing else
-        db.query(Log)
-            .filter(Log.timestamp >= since)
-            .order_by(Log.timestamp.asc())
-            .all()
+        c_gram = _lookup(gram_ids, gram_counts, grams)
+        c_ctx = _lookup(ctx_ids, ctx_counts, ctx)
+        t_ctx = _lookup(types_ids, types_counts, ctx)
+
+        p[valid] = (c_gram + t_ctx * p[valid]) / (c_ctx + t_ctx)
+        used[valid] = j
+
+    return p, used
+
+
+def detect_ngram_anomalies(
+    db: Session,
+    *,
+    order: int = 3,
+    window_hours: int = 24,
+    threshold: float = 0.01,
+    testing: bool = False,
+    hash_buckets: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Order-k sequence model over the same per-IP sessions as the Markov
+    detector. Flags events whose smoothed probability given the preceding
+    (up to order-1) endpoints is below threshold, e.g. a rare
+    login → profile → delete-account path.
+    """
+    window = fetch_encoded_window(db, window_hours=window_hours, testing=testing)
+    if not len(window.ids):
+        return []
+
+    p, used = _ngram_probabilities(window, max(1, order), hash_buckets)
+
+    # only score events that have at least one predecessor
+    rare = np.flatnonzero((p < threshold) & (used >= 2))
+    rare = sorted(rare.tolist(), key=lambda i: (window.timestamps[i] or datetime.min, window.ids[i]))
+
+    anomalies = []
+    for i in rare:
+        path = [window.endpoint_names[c] for c in window.endpoints[i - used[i] + 1:i + 1]]
+        session = window.session_names[window.sessions[i]]
+        anomalies.append({
+            "timestamp": window.timestamps[i],
+            "path": path,
+            "order": int(used[i]),
+            "probability": round(float(p[i]), 6),
+            "log_id": int(window.ids[i]),
+            "ip": None if session == "global" else session,
+            "message": f"Rare sequence detected: {' → '.join(path)}"
+        })
+
+    return anomalies
+
+
+# -----------------------------------------------------------
+# 5.4 — Persistent incremental Markov model
+# -----------------------------------------------------------
+MODEL_NAME = "markov_transitions"
+UPDATE_CHUNK = 200_000
+PRUNE_WEIGHT = 1e-3          # decayed pair weights below this are dropped
+_PAIR_SHIFT = np.int64(32)   # pair key = src << 32 | dst (stable as the vocab grows)
+
+
+def _empty_markov_payload() -> Dict[str, Any]:
+    return {
+        "endpoints": [],                            # code → endpoint name
+        "keys": np.array([], dtype=np.int64),       # sorted pair keys
+        "weights": np.array([], dtype=np.float64),  # decayed transition counts
+        "last": {},                                 # ip → (endpoint code, ts ns)
+        "decayed_at": None,
+    }
+
+
+def _load_markov_state(db: Session) -> Tuple[DetectorState, Dict[str, Any]]:
+    state = db.get(DetectorState, MODEL_NAME, with_for_update=True)
+    if state is None:
+        state = DetectorState(name=MODEL_NAME, last_log_id=0)
+        db.add(state)
+    payload = pickle.loads(state.payload) if state.payload else _empty_markov_payload()
+    return state, payload
+
+
+def _decay(payload: Dict[str, Any], now: datetime):
+    """
+    Exponential decay with half-life SEQUENCE_HALF_LIFE_HOURS (0 = off),
+    applied lazily for the wall-clock time since the last update.
+    """
+    half_life = settings.SEQUENCE_HALF_LIFE_HOURS
+    last = payload["decayed_at"]
+    payload["decayed_at"] = now
+    if not half_life or last is None or not len(payload["weights"]):
+        return
+
+    hours = (now - last).total_seconds() / 3600
+    payload["weights"] = payload["weights"] * 0.5 ** (hours / half_life)
+
+    keep = payload["weights"] >= PRUNE_WEIGHT
+    payload["keys"] = payload["keys"][keep]
+    payload["weights"] = payload["weights"][keep]
+
+
+def _encode_endpoints(payload: Dict[str, Any], names: np.ndarray) -> np.ndarray:
+    """
+    Batch-local endpoint names → persistent codes (new names are appended).
+    """
+    vocab = payload["endpoints"]
+    index = {name: i for i, name in enumerate(vocab)}
+    codes = np.empty(len(names), dtype=np.int64)
+    for i, name in enumerate(names):
+        if name not in index:
+            index[name] = len(vocab)
+            vocab.append(name)
+        codes[i] = index[name]
+    return codes
+
+
+def _batch_transitions(payload: Dict[str, Any], window: EncodedWindow, timeout_ns: int):
+    """
+    Transitions of one batch, continuing each IP's session from the stored
+    last endpoint. Gaps longer than the session timeout break the session.
+    Returns (src, dst, pos) in persistent codes; pos indexes the batch event.
+    """
+    codes = _encode_endpoints(payload, window.endpoint_names)[window.endpoints]
+    ts = pd.DatetimeIndex(window.timestamps).asi8
+    names = window.session_names[window.sessions]
+
+    # within the batch
+    gap = ts[1:] - ts[:-1]
+    inner = (window.sessions[1:] == window.sessions[:-1]) & (gap >= 0) & (gap <= timeout_ns)
+    pos = np.flatnonzero(inner) + 1
+    src, dst = codes[pos - 1], codes[pos]
+
+    # first event of each session ← stored last endpoint of that IP
+    starts = np.flatnonzero(np.r_[True, window.sessions[1:] != window.sessions[:-1]])
+    ends = np.r_[starts[1:], len(codes)] - 1
+    last = payload["last"]
+    b_src, b_pos = [], []
+    for i in starts.tolist():
+        prev = last.get(names[i])
+        if prev is not None and 0 <= ts[i] - prev[1] <= timeout_ns:
+            b_src.append(prev[0])
+            b_pos.append(i)
+
+    for i in ends.tolist():
+        last[names[i]] = (int(codes[i]), int(ts[i]))
+
+    # forget idle sessions so the state stays bounded
+    horizon = int(ts.max()) - timeout_ns
+    for ip in [ip for ip, (_, t) in last.items() if t < horizon]:
+        del last[ip]
+
+    if b_pos:
+        b_pos = np.array(b_pos, dtype=np.int64)
+        src = np.concatenate([src, np.array(b_src, dtype=np.int64)])
+        dst = np.concatenate([dst, codes[b_pos]])
+        pos = np.concatenate([pos, b_pos])
+    return src, dst, pos
+
+
+def _add_transitions(payload: Dict[str, Any], src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """
+    Merge batch counts into the sorted (keys, weights) arrays.
+    Returns the pair key of every batch transition.
+    """
+    keys = (src << _PAIR_SHIFT) | dst
+    batch_keys, batch_counts = np.unique(keys, return_counts=True)
+
+    merged = np.union1d(payload["keys"], batch_keys)
+    weights = np.zeros(len(merged))
+    weights[np.searchsorted(merged, payload["keys"])] = payload["weights"]
+    weights[np.searchsorted(merged, batch_keys)] += batch_counts
+
+    payload["keys"], payload["weights"] = merged, weights
+    return keys
+
+
+def _probabilities(payload: Dict[str, Any], keys: np.ndarray) -> np.ndarray:
+    row_totals = np.bincount(
+        payload["keys"] >> _PAIR_SHIFT,
+        weights=payload["weights"],
+        minlength=len(payload["endpoints"]),
     )
+    w = payload["weights"][np.searchsorted(payload["keys"], keys)]
+    return w / row_totals[keys >> _PAIR_SHIFT]
+
+
+def update_transition_model(db: Session) -> List[Dict[str, Any]]:
+    """
+    Fold logs newer than the stored high-water-mark id into the persistent
+    transition model and score only those transitions: O(batch), not
+    O(window). Rare transitions (p < SEQUENCE_THRESHOLD) are saved as
+    "rare_transition" anomalies and returned.
+    """
+    state, payload = _load_markov_state(db)
+    timeout_ns = settings.SEQUENCE_SESSION_TIMEOUT_MINUTES * 60 * 10**9
+    threshold = settings.SEQUENCE_THRESHOLD
+    now = datetime.utcnow()
+    _decay(payload, now)
 
     anomalies = []
-    last = None
+    while True:
+        rows = db.execute(
+            select(Log.id, Log.ip, Log.endpoint, Log.timestamp)
+            .where(Log.id > state.last_log_id)
+            .order_by(Log.id)
+            .limit(UPDATE_CHUNK)
+        ).all()
+        if not rows:
+            break
+        state.last_log_id = rows[-1].id
 
-    for r in recent_logs:
-        if not r.endpoint:
+        rows = [r for r in rows if r.endpoint and r.timestamp is not None]
+        if not rows:
             continue
 
-        if last is not None:
-            p = probs.get(last, {}).get(r.endpoint, 0.0)
+        window = _encode_window(rows)
+        src, dst, pos = _batch_transitions(payload, window, timeout_ns)
+        if not len(pos):
+            continue
 
-            if p < threshold:
-                anomalies.append({
-                    "timestamp": r.timestamp,
-                    "from": last,
-                    "to": r.endpoint,
-                    "probability": round(p, 6),
-                    "log_id": r.id,
-                    "message": f"Rare transition detected: {last} → {r.endpoint}"
-                })
+        keys = _add_transitions(payload, src, dst)
+        p = _probabilities(payload, keys)
 
-        last = r.endpoint
+        for i in np.flatnonzero(p < threshold).tolist():
+            frm = payload["endpoints"][src[i]]
+            to = payload["endpoints"][dst[i]]
+            anomalies.append({
+                "timestamp": now,
+                "type": "rare_transition",
+                "score": round(float(p[i]), 6),
+                "severity": "high" if p[i] < threshold / 5 else "medium",
+                "message": f"Rare transition detected: {frm} → {to}",
+                "log_id": int(window.ids[pos[i]]),
+            })
 
+    state.payload = pickle.dumps(payload)
+    if anomalies:
+        save_anomalies(db, anomalies)  # commits the state update too
+    else:
+        db.commit()
     return anomalies
+
+
+def transition_model_info(db: Session) -> Dict[str, Any]:
+    state = db.get(DetectorState, MODEL_NAME)
+    if state is None or not state.payload:
+        return {"fitted": False}
+    payload = pickle.loads(state.payload)
+    return {
+        "fitted": True,
+        "last_log_id": state.last_log_id,
+        "endpoints": len(payload["endpoints"]),
+        "transitions": int(len(payload["keys"])),
+        "total_weight": round(float(payload["weights"].sum()), 3),
+        "open_sessions": len(payload["last"]),
+        "half_life_hours": settings.SEQUENCE_HALF_LIFE_HOURS,
+    }
+
+
+def recent_rare_transitions(
+    db: Session,
+    *,
+    window_hours: int = 24,
+    threshold: float = 0.05
+) -> List[Dict[str, Any]]:
+    since = datetime.utcnow() - timedelta(hours=window_hours)
+    rows = (
+        db.query(Anomaly)
+        .filter(
+            Anomaly.type == "rare_transition",
+            Anomaly.timestamp >= since,
+            Anomaly.score < threshold,
+        )
+        .order_by(Anomaly.timestamp.desc())
+        .all()
+    )
+    return [
+        {
+            "timestamp": r.timestamp,
+            "probability": r.score,
+            "log_id": r.log_id,
+            "message": r.message,
+        }
+        for r in rows
+    ]
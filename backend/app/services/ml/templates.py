@@ -0,0 +1,300 @@
+# app/services/ml/templates.py
+
+from typing import Dict, List, Set, Tuple
+from collections import Counter
+from datetime import datetime
+import hashlib
+import re
+import threading
+import time
+from sqlalchemy.orm import Session
+from sqlalchemy import update, func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.core.config import settings
+from app.models.log import Log
+from app.models.log_template import LogTemplate
+
+BACKFILL_CHUNK = 50_000
+
+
+# ---------------------------------------------------------
+# MASKING — variable parts become wildcards before mining
+# ---------------------------------------------------------
+WILDCARD = "<*>"
+
+_MASKS = [
+    re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"),  # uuid
+    re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"),   # ipv4[:port]
+    re.compile(r"\b0x[0-9a-fA-F]+\b"),                     # hex literal
+    re.compile(r"\b[0-9a-fA-F]{16,}\b"),                   # hashes / long ids
+    re.compile(r"(?<![A-Za-z_])[-+]?\d+(?:\.\d+)?(?:[a-z]{1,2}\b)?"),  # numbers, 1.5s / 200ms
+]
+
+
+def mask_message(message: str) -> str:
+    for pattern in _MASKS:
+        message = pattern.sub(WILDCARD, message)
+    return message
+
+
+# ---------------------------------------------------------
+# DRAIN — fixed-depth parse tree (length → prefix tokens → clusters)
+# ---------------------------------------------------------
+def template_hash(template: str) -> str:
+    """
+    Natural key of a template row: processes mining the same text share it.
+    """
+    return hashlib.sha1(template.encode("utf-8")).hexdigest()
+
+
+class TemplateCluster:
+    __slots__ = ("tokens",)
+
+    def __init__(self, tokens: List[str]):
+        self.tokens = tokens
+
+    @property
+    def template(self) -> str:
+        return " ".join(self.tokens)
+
+
+class TemplateMiner:
+    """
+    Online Drain-style log template miner.
+      depth: tree depth (2 levels are length + leaf → depth-2 prefix tokens)
+      sim_threshold: min share of identical tokens to join a cluster
+    The tree is in-memory only; rows in log_templates are keyed by text, so
+    it never has to agree with the DB (or with other processes' trees).
+    """
+
+    def __init__(self, depth: int = 4, sim_threshold: float = 0.4):
+        self.depth = depth
+        self.sim_threshold = sim_threshold
+        self._leaves: Dict[Tuple, List[TemplateCluster]] = {}
+        self.known: Set[str] = set()   # every text this tree has held
+        self.loaded_id = 0             # highest log_templates.id seen by refresh()
+        self.refreshed_at = 0.0
+        self.lock = threading.Lock()
+
+    def _leaf_key(self, tokens: List[str]) -> Tuple:
+        prefix = tuple(
+            WILDCARD if any(c.isdigit() for c in tok) else tok
+            for tok in tokens[:self.depth - 2]
+        )
+        return (len(tokens),) + prefix
+
+    @staticmethod
+    def _similarity(template: List[str], tokens: List[str]) -> Tuple[float, int]:
+        same = params = 0
+        for t, tok in zip(template, tokens):
+            if t == WILDCARD:
+                params += 1
+            elif t == tok:
+                same += 1
+        return same / len(tokens), params
+
+    def _match(self, leaf: List[TemplateCluster], tokens: List[str]) -> TemplateCluster | None:
+        best, best_sim, best_params = None, -1.0, -1
+        for cluster in leaf:
+            sim, params = self._similarity(cluster.tokens, tokens)
+            if sim > best_sim or (sim == best_sim and params > best_params):
+                best, best_sim, best_params = cluster, sim, params
+
+        if best is not None and best_sim >= self.sim_threshold:
+            return best
+        return None
+
+    def add(self, message: str) -> TemplateCluster | None:
+        tokens = mask_message(message).split()
+        if not tokens:
+            return None
+
+        leaf = self._leaves.setdefault(self._leaf_key(tokens), [])
+        cluster = self._match(leaf, tokens)
+
+        if cluster is None:
+            cluster = TemplateCluster(tokens)
+            leaf.append(cluster)
+            self.known.add(cluster.template)
+        else:
+            merged = [
+                t if t == tok else WILDCARD
+                for t, tok in zip(cluster.tokens, tokens)
+            ]
+            if merged != cluster.tokens:
+                cluster.tokens = merged
+                self.known.add(cluster.template)
+        return cluster
+
+    def load(self, template: str):
+        tokens = template.split()
+        if tokens and template not in self.known:
+            self._leaves.setdefault(self._leaf_key(tokens), []).append(TemplateCluster(tokens))
+            self.known.add(template)
+
+    def refresh(self, db: Session):
+        """
+        Pull in templates other processes created since the last refresh,
+        so their lines map to the same rows here too.
+        """
+        rows = (
+            db.query(LogTemplate.id, LogTemplate.template)
+            .filter(LogTemplate.id > self.loaded_id)
+            .order_by(LogTemplate.id)
+            .all()
+        )
+        with self.lock:
+            for tid, template in rows:
+                self.load(template)
+                self.loaded_id = max(self.loaded_id, tid)
+            self.refreshed_at = time.monotonic()
+
+
+_MINER: TemplateMiner | None = None
+_MINER_LOCK = threading.Lock()
+
+
+def get_template_miner(db: Session) -> TemplateMiner:
+    """
+    Process-wide miner, seeded from log_templates on first use and
+    refreshed from it every TEMPLATE_REFRESH_SECONDS.
+    """
+    global _MINER
+    with _MINER_LOCK:
+        if _MINER is None:
+            _MINER = TemplateMiner()
+        miner = _MINER
+
+    if time.monotonic() - miner.refreshed_at >= settings.TEMPLATE_REFRESH_SECONDS:
+        miner.refresh(db)
+    return miner
+
+
+def reset_template_miner():
+    global _MINER
+    with _MINER_LOCK:
+        _MINER = None
+
+
+# ---------------------------------------------------------
+# PERSISTENCE — upsert on template_hash, caller commits
+# ---------------------------------------------------------
+def _template_params(counts: Dict[str, int], now: datetime) -> List[Dict]:
+    params = [
+        {
+            "template_hash": template_hash(text),
+            "template": text,
+            "token_count": len(text.split()),
+            "count": n,
+            "first_seen": now,
+            "last_seen": now,
+        }
+        for text, n in counts.items()
+    ]
+    # same lock order in every transaction → concurrent ingests can't deadlock
+    params.sort(key=lambda p: p["template_hash"])
+    return params
+
+
+def _upsert_on_conflict(db: Session, insert_fn, greatest, params: List[Dict]) -> Dict[str, int]:
+    stmt = insert_fn(LogTemplate)
+    t, ex = LogTemplate.__table__.c, stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[t.template_hash],
+        set_={"count": t.count + ex.count, "last_seen": greatest(t.last_seen, ex.last_seen)},
+    ).returning(t.template_hash, t.id)
+    return dict(db.execute(stmt, params).all())
+
+
+def _upsert_generic(db: Session, params: List[Dict]) -> Dict[str, int]:
+    ids = {}
+    for p in params:
+        row = db.query(LogTemplate).filter(LogTemplate.template_hash == p["template_hash"]).one_or_none()
+        if row is None:
+            row = LogTemplate(**p)
+            db.add(row)
+            db.flush()
+        else:
+            row.count += p["count"]
+            row.last_seen = max(row.last_seen or p["last_seen"], p["last_seen"])
+        ids[p["template_hash"]] = row.id
+    return ids
+
+
+def upsert_templates(db: Session, counts: Dict[str, int]) -> Dict[str, int]:
+    """
+    Add occurrence counts per template text; returns {text: id}.
+    Runs in the caller's transaction (nothing is committed here).
+    """
+    params = _template_params(counts, datetime.utcnow())
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        by_hash = _upsert_on_conflict(db, postgresql.insert, func.greatest, params)
+    elif dialect == "sqlite":
+        by_hash = _upsert_on_conflict(db, sqlite.insert, func.max, params)
+    else:
+        by_hash = _upsert_generic(db, params)
+    return {p["template"]: by_hash[p["template_hash"]] for p in params}
+
+
+# ---------------------------------------------------------
+# INGEST HOOK
+# ---------------------------------------------------------
+def assign_templates(db: Session, rows: List[Dict]):
+    """
+    Set row["template_id"] for every row with a message.
+    Only the in-memory tree is locked; the template upsert runs after
+    that, in the caller's transaction, so templates and counts commit or
+    roll back together with the logs. A template generalized by this
+    batch becomes a row of its own; lines stored earlier keep pointing
+    at the narrower one.
+    """
+    miner = get_template_miner(db)
+
+    with miner.lock:
+        clusters = [
+            miner.add(r["message"]) if r.get("message") else None
+            for r in rows
+        ]
+        # text as of the end of the batch (a later line may have generalized it)
+        texts = [c.template if c is not None else None for c in clusters]
+
+    counts = Counter(t for t in texts if t is not None)
+    ids = upsert_templates(db, counts) if counts else {}
+
+    for r, text in zip(rows, texts):
+        r["template_id"] = ids[text] if text is not None else None
+
+
+def backfill_templates(db: Session) -> int:
+    """
+    Assign templates to logs ingested before template mining existed
+    (template_id NULL). Works in id-ordered chunks. Returns logs updated.
+    """
+    processed = 0
+    last_id = 0
+    while True:
+        chunk = (
+            db.query(Log.id, Log.message)
+            .filter(Log.id > last_id, Log.template_id.is_(None), Log.message.isnot(None))
+            .order_by(Log.id.asc())
+            .limit(BACKFILL_CHUNK)
+            .all()
+        )
+        if not chunk:
+            break
+
+        rows = [{"id": r.id, "message": r.message} for r in chunk]
+        assign_templates(db, rows)
+
+        params = [{"id": r["id"], "template_id": r["template_id"]} for r in rows if r["template_id"]]
+        if params:
+            db.execute(update(Log), params)
+        db.commit()
+
+        processed += len(params)
+        last_id = chunk[-1].id
+
+    return processed
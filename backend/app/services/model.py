@@ -1,11 +1,25 @@
 from sklearn.ensemble import IsolationForest
 import numpy as np
+import pickle
 from sqlalchemy.orm import Session
+from sqlalchemy import func, case
 from datetime import datetime, timedelta
 from typing import List, Dict
-from collections import Counter
 from app.models.log import Log
-from app.services.db_service import save_anomalies
+from app.models.log_rollup import LogRollup
+from app.models.detector_state import DetectorState
+from app.services.db_service import save_anomalies, upsert_anomalies
+from app.services.rollup import minute_floor, critical_level_clause
+
+
+# Incremental detection settings
+DETECTOR_NAME = "isolation_forest"
+CONTAMINATION = 0.03
+RESERVOIR_SIZE = 10000          # bounded training sample
+REFIT_INTERVAL = timedelta(hours=6)
+DRIFT_FACTOR = 3.0              # refit when batch anomaly rate > 3x contamination
+DRIFT_MIN_BATCH = 50
+DETECT_CHUNK = 50000            # rows scored per id-ordered chunk
 
 
 # ------------------------------------------------------
@@ -43,21 +57,11 @@ def detect_anomaly_type(log: Log):
     return "unusual_pattern"
 
 
-def run_detection(db: Session) -> List[Dict]:
-    X, rows = _prepare_features(db)
-    if X is None or X.size == 0:
-        return []
-
-    # Isolation Forest
-    model = IsolationForest(n_estimators=120, contamination=0.03, random_state=42)
-    model.fit(X)
-    iso_scores = model.decision_function(X)
-    iso_preds = model.predict(X)
+def _new_forest():
+    return IsolationForest(n_estimators=120, contamination=CONTAMINATION, random_state=42)
 
-    # Z-score
-    values = [float(x[0]) for x in X]
-    z_scores = z_score(values)
 
+def _build_anomalies(rows, iso_scores, iso_preds, z_scores) -> List[Dict]:
     anomalies = []
 
     for idx, log in enumerate(rows):
@@ -76,43 +80,228 @@ def run_detection(db: Session) -> List[Dict]:
                 "log_id": log.id
             })
 
+    return anomalies
+
+
+def _run_full_detection(db: Session) -> List[Dict]:
+    """
+    Original behaviour: refit on the whole table and re-score every row.
+    """
+    X, rows = _prepare_features(db)
+    if X is None or X.size == 0:
+        return []
+
+    # Isolation Forest
+    model = _new_forest()
+    model.fit(X)
+    iso_scores = model.decision_function(X)
+    iso_preds = model.predict(X)
+
+    # Z-score
+    values = [float(x[0]) for x in X]
+    z_scores = z_score(values)
+
+    anomalies = _build_anomalies(rows, iso_scores, iso_preds, z_scores)
+
     if anomalies:
         save_anomalies(db, anomalies)
 
     return anomalies
 
 
+# ------------------------------------------------------
+# INCREMENTAL STATE (model + reservoir + running stats)
+# ------------------------------------------------------
+def _load_state(db: Session):
+    state = db.get(DetectorState, DETECTOR_NAME, with_for_update=True)
+    if state is None:
+        state = DetectorState(name=DETECTOR_NAME, last_log_id=0)
+        db.add(state)
+
+    payload = pickle.loads(state.payload) if state.payload else {
+        "model": None,
+        "reservoir": np.empty(0, dtype=float),
+        "seen": 0,      # values ever offered to the reservoir
+        "mean": 0.0,    # running mean / M2 (Welford) for z-scores
+        "m2": 0.0,
+    }
+    return state, payload
+
+
+def _update_running_stats(payload: Dict, values: np.ndarray):
+    """
+    Chan et al. parallel merge of (n, mean, M2) with a new batch.
+    """
+    n_a, n_b = payload["seen"], len(values)
+    mean_b = float(values.mean())
+    m2_b = float(((values - mean_b) ** 2).sum())
+
+    n = n_a + n_b
+    delta = mean_b - payload["mean"]
+    payload["mean"] += delta * n_b / n
+    payload["m2"] += m2_b + delta ** 2 * n_a * n_b / n
+
+
+def _update_reservoir(payload: Dict, values: np.ndarray, rng: np.random.Generator):
+    """
+    Vectorised reservoir sampling (Algorithm R) over the new batch.
+    payload["seen"] must still hold the count from before this batch.
+    """
+    reservoir = payload["reservoir"]
+    seen = payload["seen"]
+
+    # fill phase
+    free = max(0, RESERVOIR_SIZE - len(reservoir))
+    if free:
+        head = values[:free]
+        reservoir = np.concatenate([reservoir, head])
+        values = values[free:]
+        seen += len(head)
+
+    # replacement phase: value at position i replaces slot j ~ U[0, i]
+
+    if len(values):
+        positions = np.arange(seen, seen + len(values))
+        slots = rng.integers(0, positions + 1)
+        keep = slots < RESERVOIR_SIZE
+        reservoir[slots[keep]] = values[keep]
+
+    payload["reservoir"] = reservoir
+
+
+def _score_chunk(state: DetectorState, payload: Dict, rows, now: datetime) -> List[Dict]:
+    """
+    Fold one id-ordered chunk into the running stats / reservoir, refit if
+    due, and score it. Advances state.last_log_id past the chunk.
+    """
+    values = np.array([float(r.response_time) for r in rows])
+    X = values.reshape(-1, 1)
+
+    # running stats + training sample include the new chunk
+    rng = np.random.default_rng(state.last_log_id)
+    _update_running_stats(payload, values)
+    _update_reservoir(payload, values, rng)
+    payload["seen"] += len(values)
+
+    model = payload["model"]
+    refitted = False
+
+    if model is None or state.fitted_at is None or now - state.fitted_at >= REFIT_INTERVAL:
+        model = _new_forest().fit(payload["reservoir"].reshape(-1, 1))
+        state.fitted_at = now
+        refitted = True
+
+    iso_preds = model.predict(X)
+
+    # drift → refit on the (already updated) reservoir and re-score
+    anomaly_rate = float((iso_preds == -1).mean())
+    if (
+        not refitted
+        and len(values) >= DRIFT_MIN_BATCH
+        and anomaly_rate > DRIFT_FACTOR * CONTAMINATION
+    ):
+        model = _new_forest().fit(payload["reservoir"].reshape(-1, 1))
+        state.fitted_at = now
+        iso_preds = model.predict(X)
+
+    iso_scores = model.decision_function(X)
+
+    std = np.sqrt(payload["m2"] / payload["seen"]) or 1
+    z_scores = (values - payload["mean"]) / std
+
+    payload["model"] = model
+    state.last_log_id = rows[-1].id
+
+    return _build_anomalies(rows, iso_scores, iso_preds, z_scores)
+
+
+def run_detection(db: Session, full: bool = False) -> List[Dict]:
+    """
+    Incremental IsolationForest + Z-score detection.
+      - only logs newer than the stored high-water-mark id are scored,
+        read in id-ordered chunks of DETECT_CHUNK rows
+      - the fitted model is persisted and reused between runs
+      - refit on a bounded reservoir sample every REFIT_INTERVAL,
+        or when a chunk's anomaly rate drifts far above CONTAMINATION
+    full=True → refit on the whole table and re-score everything (legacy mode).
+
+    The mark is a plain max id. Ids are handed out at insert time, so a
+    concurrent upload that commits after this run with ids below the mark
+    is never scored incrementally; full=True re-scores those rows.
+    """
+    if full:
+        return _run_full_detection(db)
+
+    state, payload = _load_state(db)
+    logs_q = (
+        db.query(Log.id, Log.response_time, Log.level, Log.message)
+        .filter(Log.response_time != None)
+    )
+
+    now = datetime.utcnow()
+    anomalies: List[Dict] = []
+    scored = False
+    while True:
+        rows = (
+            logs_q.filter(Log.id > state.last_log_id)
+            .order_by(Log.id.asc())
+            .limit(DETECT_CHUNK)
+            .all()
+        )
+        if not rows:
+            break
+
+        found = _score_chunk(state, payload, rows, now)
+        upsert_anomalies(db, found)
+        anomalies.extend(found)
+        scored = True
+
+    if scored:
+        state.payload = pickle.dumps(payload)
+    db.commit()  # state and anomalies land together
+
+    return anomalies
+
+
 # ------------------------------------------------------
 # MODULE 2 — ERROR SPIKE + API FAILURE DETECTION
 # ------------------------------------------------------
 def run_error_spike_detection(db: Session, window_minutes: int = 5, testing: bool = False):
     now = datetime.utcnow()
 
+    # Per-endpoint totals / errors / criticals from the per-minute rollup
+    query = db.query(
+        LogRollup.endpoint,
+        func.sum(LogRollup.count).label("total"),
+        func.sum(LogRollup.error_count).label("errors"),
+        func.sum(case((critical_level_clause(LogRollup.level), LogRollup.count), else_=0)).label("criticals"),
+        func.max(LogRollup.bucket).label("last_bucket"),
+    ).filter(LogRollup.endpoint != "")
+
     # For real detection use sliding window
-    if testing:
-        logs = db.query(Log).all()
-    else:
+    if not testing:
         window_start = now - timedelta(minutes=window_minutes)
-        logs = db.query(Log).filter(Log.timestamp >= window_start).all()
+        query = query.filter(LogRollup.bucket >= minute_floor(window_start))
 
-    if not logs:
-        return []
+    stats = query.group_by(LogRollup.endpoint).all()
 
-    # Filter error logs
-    error_logs = [l for l in logs if l.level and l.level.upper() in ["ERROR", "CRITICAL"]]
-    endpoint_errors = Counter([l.endpoint for l in error_logs if l.endpoint])
-    endpoint_totals = Counter([l.endpoint for l in logs if l.endpoint])
+    if not stats:
+        return []
 
     anomalies = []
 
-    for endpoint, err_count in endpoint_errors.items():
-        total_count = endpoint_totals.get(endpoint, 1)
+    for row in stats:
+        endpoint, err_count, total_count = row.endpoint, int(row.errors or 0), int(row.total)
+        if err_count == 0:
+            continue
+
         failure_rate = err_count / total_count
 
         # Spike detection
         if failure_rate > 0.3:
             anomalies.append({
                 "timestamp": now,
+                "event_time": row.last_bucket,
                 "type": "error_spike",
                 "severity": "high" if failure_rate > 0.5 else "medium",
                 "endpoint": endpoint,
@@ -122,14 +311,10 @@ def run_error_spike_detection(db: Session, window_minutes: int = 5, testing: boo
             })
 
         # Downtime detection (Critical)
-        critical_failures = [
-            l for l in error_logs
-            if l.endpoint == endpoint and (l.level.upper() == "CRITICAL" or str(l.level).startswith("5"))
-        ]
-
-        if len(critical_failures) >= 3:
+        if int(row.criticals or 0) >= 3:
             anomalies.append({
                 "timestamp": now,
+                "event_time": row.last_bucket,
                 "type": "api_failure",
                 "severity": "critical",
                 "endpoint": endpoint,
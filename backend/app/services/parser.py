@@ -1,6 +1,19 @@
+import os
 import re
-from datetime import datetime
-from typing import List, Dict
+import codecs
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import List, Dict, Iterable, Iterator, Tuple
+
+
+# Parallel parsing knobs (this module stays dependency-free so spawned
+# workers import it cheaply → read straight from env, like ai/rca.py)
+PARALLEL_PARSE_THRESHOLD = int(os.getenv("PARALLEL_PARSE_THRESHOLD", str(64 * 1024 * 1024)))
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "0")) or (os.cpu_count() or 1)
+PARSE_SHARD_SIZE = int(os.getenv("PARSE_SHARD_SIZE", str(4 * 1024 * 1024)))
 
 
 # FULL FORMAT (with IP + message)
@@ -22,65 +35,365 @@ SHORT_PATTERN = re.compile(
     r'(?P<response_time>[0-9.]+)$'
 )
 
+# FUSED FORMAT (FULL | SHORT in a single match)
+# groups: timestamp, level, endpoint, status, response_time, ip, message
+LOG_PATTERN = re.compile(
+    r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z)\s+'
+    r'([A-Z]+)\s+'
+    r'(\S+)\s+'
+    r'(\d{3})\s+'
+    r'([0-9.]+)'
+    r'(?:\s+(\S+)\s+-\s+(.*)|$)'
+)
 
-def parse_log_line(line: str) -> Dict | None:
-    text = line.strip()
+ParsedFields = Tuple[datetime, str, str | None, int | None, float | None, str | None, str | None]
 
-    # 1️⃣ Full structured log
-    m = FULL_PATTERN.match(text)
-    if m:
-        gd = m.groupdict()
-        return {
-            "timestamp": datetime.fromisoformat(gd["timestamp"].replace("Z", "+00:00")),
-            "level": gd["level"],
-            "endpoint": gd["endpoint"],
-            "status": int(gd["status"]),
-            "response_time": float(gd["response_time"]),
-            "ip": gd["ip"],
-            "message": gd["message"],
-        }
-
-    # 2️⃣ Short structured log
-    m2 = SHORT_PATTERN.match(text)
-    if m2:
-        gd = m2.groupdict()
-        return {
-            "timestamp": datetime.fromisoformat(gd["timestamp"].replace("Z", "+00:00")),
-            "level": gd["level"],
-            "endpoint": gd["endpoint"],
-            "status": int(gd["status"]),
-            "response_time": float(gd["response_time"]),
-            "ip": None,
-            "message": None,
-        }
-
-    # 3️⃣ Comment / ignorable line
+
+@lru_cache(maxsize=4096)
+def _decode_timestamp(ts: str) -> datetime:
+    """
+    Decode fixed-width 'YYYY-MM-DDTHH:MM:SSZ' by slicing.
+    Cached per second: consecutive log lines mostly share a timestamp.
+    """
+    return datetime(
+        int(ts[0:4]), int(ts[5:7]), int(ts[8:10]),
+        int(ts[11:13]), int(ts[14:16]), int(ts[17:19]),
+        tzinfo=timezone.utc
+    )
+
+
+def _parse_fields(text: str) -> ParsedFields | None:
+    """
+    Single-pass parse of a stripped line into a field tuple.
+    Returns None for comment lines.
+    """
+    # 1️⃣ Comment / ignorable line
     if text.startswith("#"):
         return None
 
-    # 4️⃣ Fallback garbage-safe parse
+    # 2️⃣ Full or short structured log
+    m = LOG_PATTERN.match(text)
+    if m:
+        ts, level, endpoint, status, rt, ip, message = m.groups()
+        try:
+            return (
+                _decode_timestamp(ts), level, endpoint,
+                int(status), float(rt), ip, message
+            )
+        except ValueError:
+            pass  # e.g. "1.2.3" as response time → treat as garbage
+
+    # 3️⃣ Fallback garbage-safe parse
     parts = text.split(" ", 3)
 
+    return (
+        datetime.utcnow(),
+        parts[1] if len(parts) > 1 else "INFO",
+        None, None, None, None,
+        parts[-1] if parts else text,
+    )
+
+
+def parse_log_line(line: str) -> Dict | None:
+    fields = _parse_fields(line.strip())
+    if fields is None:
+        return None
+
+    ts, level, endpoint, status, rt, ip, message = fields
     return {
-        "timestamp": datetime.utcnow(),
-        "level": parts[1] if len(parts) > 1 else "INFO",
-        "endpoint": None,
-        "status": None,
-        "response_time": None,
-        "ip": None,
-        "message": parts[-1] if parts else text,
+        "timestamp": ts,
+        "level": level,
+        "endpoint": endpoint,
+        "status": status,
+        "response_time": rt,
+        "ip": ip,
+        "message": message,
     }
 
 
-def parse_log_file(text: str) -> List[Dict]:
-    parsed = []
+class LogBatch:
+    """
+    Column-oriented batch of parsed logs (parallel lists, one per field).
+    Cheaper to build than one dict per line and maps directly onto bulk inserts.
+    """
+
+    __slots__ = (
+        "timestamps", "levels", "endpoints", "statuses",
+        "response_times", "ips", "messages",
+    )
+
+    def __init__(self):
+        self.timestamps: List[datetime] = []
+        self.levels: List[str] = []
+        self.endpoints: List[str | None] = []
+        self.statuses: List[int | None] = []
+        self.response_times: List[float | None] = []
+        self.ips: List[str | None] = []
+        self.messages: List[str | None] = []
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
 
-    for line in text.splitlines():
+    def add_line(self, line: str) -> bool:
+        """
+        Parse one line straight into the columns.
+        Returns False if the line was rejected (comment).
+        """
+        fields = _parse_fields(line.strip())
+        if fields is None:
+            return False
+
+        ts, level, endpoint, status, rt, ip, message = fields
+        self.timestamps.append(ts)
+        self.levels.append(level)
+        self.endpoints.append(endpoint)
+        self.statuses.append(status)
+        self.response_times.append(rt)
+        self.ips.append(ip)
+        self.messages.append(message)
+        return True
+
+    def extend(self, other: "LogBatch") -> None:
+        for name in self.__slots__:
+            getattr(self, name).extend(getattr(other, name))
+
+    def to_dicts(self) -> List[Dict]:
+        return [
+            {
+                "timestamp": ts,
+                "level": level,
+                "endpoint": endpoint,
+                "status": status,
+                "response_time": rt,
+                "ip": ip,
+                "message": message,
+            }
+            for ts, level, endpoint, status, rt, ip, message in zip(
+                self.timestamps, self.levels, self.endpoints, self.statuses,
+                self.response_times, self.ips, self.messages
+            )
+        ]
+
+
+def parse_log_batch(lines: Iterable[str], stats: Dict | None = None) -> LogBatch:
+    return next(iter_log_batches(lines, batch_size=0, stats=stats), LogBatch())
+
+
+def iter_text_lines(chunks: Iterable[bytes], encoding: str = "utf-8") -> Iterator[str]:
+    """
+    Split a stream of raw byte chunks into text lines incrementally.
+    Only the current partial line is held between chunks.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="ignore")
+    pending = ""
+
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.splitlines(keepends=True)
+
+        # last piece may be an unfinished line → carry it over
+        pending = ""
+        if lines and not lines[-1].endswith(("\n", "\r")):
+            pending = lines.pop()
+
+        for line in lines:
+            yield line
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def iter_parse_log_lines(lines: Iterable[str], stats: Dict | None = None) -> Iterator[Dict]:
+    """
+    Generator version of parse_log_file.
+    If a stats dict is given, lines_read / lines_parsed / lines_rejected are updated in place.
+    """
+    if stats is not None:
+        for key in ("lines_read", "lines_parsed", "lines_rejected"):
+            stats.setdefault(key, 0)
+
+    for line in lines:
         if not line.strip():
             continue
 
+        if stats is not None:
+            stats["lines_read"] += 1
+
         item = parse_log_line(line)
         if item:
-            parsed.append(item)
+            if stats is not None:
+                stats["lines_parsed"] += 1
+            yield item
+        elif stats is not None:
+            stats["lines_rejected"] += 1
+
+
+def iter_log_batches(
+    lines: Iterable[str],
+    batch_size: int = 5000,
+    stats: Dict | None = None
+) -> Iterator[LogBatch]:
+    """
+    Parse lines into LogBatch objects of at most batch_size rows
+    (batch_size <= 0 → one batch with everything).
+    Stats are tracked the same way as iter_parse_log_lines.
+    """
+    if stats is not None:
+        for key in ("lines_read", "lines_parsed", "lines_rejected"):
+            stats.setdefault(key, 0)
+
+    batch = LogBatch()
+    read = rejected = 0
+
+    for line in lines:
+        if not line.strip():
+            continue
+
+        read += 1
+        if not batch.add_line(line):
+            rejected += 1
+            continue
+
+        if batch_size > 0 and len(batch) >= batch_size:
+            if stats is not None:
+                stats["lines_read"] += read
+                stats["lines_parsed"] += read - rejected
+                stats["lines_rejected"] += rejected
+                read = rejected = 0
+            yield batch
+            batch = LogBatch()
+
+    if stats is not None:
+        stats["lines_read"] += read
+        stats["lines_parsed"] += read - rejected
+        stats["lines_rejected"] += rejected
+
+    if len(batch):
+        yield batch
+
+
+# -----------------------------
+# PARALLEL PARSING
+# -----------------------------
+_POOL: ProcessPoolExecutor | None = None
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        # spawn: never fork a process that already runs server threads
+        _POOL = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _POOL
+
+
+def _parse_shard(text: str) -> Tuple[LogBatch, Dict]:
+    stats = {}
+    batch = parse_log_batch(text.splitlines(), stats)
+    return batch, stats
+
+
+def _split_shards(text: str, shard_size: int) -> List[str]:
+    """
+    Cut text into ~shard_size pieces, always on a line boundary.
+    """
+    shards = []
+    start = 0
+    n = len(text)
+
+    while start < n:
+        end = start + shard_size
+        if end >= n:
+            shards.append(text[start:])
+            break
+
+        cut = text.find("\n", end)
+        if cut == -1:
+            shards.append(text[start:])
+            break
+
+        shards.append(text[start:cut + 1])
+        start = cut + 1
+
+    return shards
+
+
+def iter_text_shards(
+    chunks: Iterable[bytes],
+    shard_size: int = PARSE_SHARD_SIZE,
+    encoding: str = "utf-8"
+) -> Iterator[str]:
+    """
+    Like iter_text_lines, but yields ~shard_size blocks of whole lines.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="ignore")
+    pending = ""
+
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        if len(pending) < shard_size:
+            continue
+
+        cut = max(pending.rfind("\n"), pending.rfind("\r")) + 1
+        if cut > 0:
+            yield pending[:cut]
+            pending = pending[cut:]
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def iter_log_batches_parallel(
+    shards: Iterable[str],
+    workers: int = PARSE_WORKERS,
+    stats: Dict | None = None
+) -> Iterator[LogBatch]:
+    """
+    Parse text shards in a process pool, yielding one LogBatch per shard
+    in input order. At most 2 * workers shards are in flight.
+    """
+    if stats is not None:
+        for key in ("lines_read", "lines_parsed", "lines_rejected"):
+            stats.setdefault(key, 0)
+
+    pool = _get_pool(workers)
+    in_flight = deque()
+
+    def _drain_one():
+        batch, shard_stats = in_flight.popleft().result()
+        if stats is not None:
+            for key, val in shard_stats.items():
+                stats[key] += val
+        return batch
+
+    for shard in shards:
+        in_flight.append(pool.submit(_parse_shard, shard))
+        if len(in_flight) >= 2 * workers:
+            yield _drain_one()
+
+    while in_flight:
+        yield _drain_one()
+
+
+def parse_log_file(
+    text: str,
+    parallel_threshold: int = PARALLEL_PARSE_THRESHOLD,
+    workers: int = PARSE_WORKERS
+) -> List[Dict]:
+    """
+    Parse a whole file. Above parallel_threshold characters the text is
+    sharded on line boundaries and parsed across processes; row order
+    always matches file order.
+    """
+    if workers > 1 and len(text) >= parallel_threshold:
+        shard_size = max(PARSE_SHARD_SIZE, len(text) // (workers * 4) + 1)
+        merged = LogBatch()
+        for batch in iter_log_batches_parallel(_split_shards(text, shard_size), workers):
+            merged.extend(batch)
+        return merged.to_dicts()
 
-    return parsed
+    return list(iter_parse_log_lines(text.splitlines()))
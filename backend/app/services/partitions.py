@@ -0,0 +1,201 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import text, event
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List
+
+from app.core.config import settings
+
+
+# -----------------------------
+# PostgreSQL daily range partitions of `logs`
+# (SQLite / non-partitioned tables: every function is a no-op)
+# -----------------------------
+PARTITION_PREFIX = "logs_p"
+DEFAULT_PARTITION = "logs_default"
+
+_partitioned: bool | None = None
+# days with a committed partition; a session's new days join on commit
+_known_days: set = set()
+_PENDING_KEY = "partition_days_pending"
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_created_days(session: Session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        _known_days.update(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_created_days(session: Session):
+    # the CREATE TABLE was rolled back with everything else
+    session.info.pop(_PENDING_KEY, None)
+
+
+def partition_name(day: date) -> str:
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def is_partitioned(db: Session) -> bool:
+    global _partitioned
+    if _partitioned is None:
+        if db.get_bind().dialect.name != "postgresql":
+            _partitioned = False
+        else:
+            _partitioned = bool(db.execute(text(
+                "SELECT 1 FROM pg_partitioned_table pt "
+                "JOIN pg_class c ON c.oid = pt.partrelid "
+                "WHERE c.relname = 'logs'"
+            )).first())
+    return _partitioned
+
+
+def check_partitioning(db: Session):
+    """
+    Startup guard. The conversion to a partitioned table only happens when
+    migration 0003 runs, so turning LOGS_PARTITIONING on afterwards would
+    otherwise do nothing at all.
+    """
+    if not settings.LOGS_PARTITIONING or db.get_bind().dialect.name != "postgresql":
+        return
+    if not is_partitioned(db):
+        raise RuntimeError(
+            "LOGS_PARTITIONING=true but `logs` is not partitioned. The table is "
+            "only converted when migration 0003 runs, so set LOGS_PARTITIONING "
+            "before the first migration, or unset it for this database."
+        )
+
+
+def create_partition_sql(day: date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF logs "
+        f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+    )
+
+
+def _default_has_rows(db: Session, day: date) -> bool:
+    return db.execute(text(
+        f"SELECT 1 FROM {DEFAULT_PARTITION} "
+        "WHERE timestamp >= :start AND timestamp < :end LIMIT 1"
+    ), {"start": day, "end": day + timedelta(days=1)}).first() is not None
+
+
+def _create_partition_from_default(db: Session, day: date):
+    """
+    logs_default already holds rows for `day`, so a plain PARTITION OF would
+    violate its constraint: build the table, move the rows over, then attach.
+    """
+    name = partition_name(day)
+    bounds = {"start": day, "end": day + timedelta(days=1)}
+    db.execute(text(f"CREATE TABLE {name} (LIKE logs INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    db.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+        "WHERE timestamp >= :start AND timestamp < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), bounds)
+    db.execute(text(
+        f"ALTER TABLE logs ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+    ))
+
+
+def ensure_partitions(db: Session, days: Iterable[date]) -> List[str]:
+    """
+    Create any missing daily partitions, inside the caller's transaction
+    (caller commits). Days are only cached as known once that commit
+    succeeds; partitions made by other processes are found in the catalog.
+    """
+    if not is_partitioned(db):
+        return []
+
+    missing = set(days) - _known_days
+    if not missing:
+        return []
+
+    existing = set(list_partitions(db))
+    _known_days.update(existing - db.info.get(_PENDING_KEY, set()))
+    has_default = db.execute(text(f"SELECT to_regclass('{DEFAULT_PARTITION}')")).scalar() is not None
+
+    created = []
+    for day in sorted(missing - existing):
+        if has_default and _default_has_rows(db, day):
+            _create_partition_from_default(db, day)
+        else:
+            db.execute(text(create_partition_sql(day)))
+        db.info.setdefault(_PENDING_KEY, set()).add(day)
+        created.append(partition_name(day))
+
+    return created
+
+
+def ensure_partitions_for(db: Session, timestamps: Iterable[datetime]) -> List[str]:
+    """
+    Ingest hook: make sure every day touched by a batch has a partition
+    (archive replays may carry old dates). Rows outside any partition
+    would otherwise land in logs_default.
+    """
+    if not is_partitioned(db):
+        return []
+    return ensure_partitions(db, {ts.date() for ts in timestamps})
+
+
+def list_partitions(db: Session) -> Dict[date, str]:
+    rows = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'logs'"
+    )).scalars()
+
+    parts = {}
+    for name in rows:
+        if not name.startswith(PARTITION_PREFIX):
+            continue  # logs_default
+        try:
+            parts[datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date()] = name
+        except ValueError:
+            continue
+    return parts
+
+
+def apply_retention(db: Session, retention_days: int) -> List[str]:
+    """
+    Drop whole partitions older than retention_days (no row-by-row DELETE).
+    Old days that never got a partition live in logs_default; those rows
+    are deleted there.
+    """
+    if retention_days <= 0 or not is_partitioned(db):
+        return []
+
+    cutoff = datetime.utcnow().date() - timedelta(days=retention_days)
+    dropped = []
+
+    for day, name in sorted(list_partitions(db).items()):
+        if day < cutoff:
+            db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            _known_days.discard(day)
+            dropped.append(name)
+
+    db.execute(
+        text(f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp < :cutoff"),
+        {"cutoff": cutoff},
+    )
+    return dropped
+
+
+def maintain_partitions(db: Session) -> Dict:
+    """
+    Pre-create upcoming partitions and enforce retention.
+    Safe to call often (startup, after every upload).
+    """
+    if not is_partitioned(db):
+        return {"partitioned": False, "created": [], "dropped": []}
+
+    today = datetime.utcnow().date()
+    created = ensure_partitions(
+        db, (today + timedelta(days=i) for i in range(settings.PARTITION_PRECREATE_DAYS + 1))
+    )
+    dropped = apply_retention(db, settings.LOGS_RETENTION_DAYS)
+    db.commit()
+
+    return {"partitioned": True, "created": created, "dropped": dropped}
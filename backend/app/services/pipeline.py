@@ -0,0 +1,34 @@
+# app/services/pipeline.py
+
+from typing import Any, Dict
+from sqlalchemy.orm import Session
+
+from app.services.model import run_detection
+from app.services.metrics import aggregate_metrics
+from app.services.partitions import maintain_partitions
+from app.services.ml.forecast import predict_error_trend
+from app.services.ml.cluster_model import update_cluster_model
+from app.services.ml.sequences import update_transition_model
+
+
+def run_pipeline(db: Session) -> Dict[str, Any]:
+    """
+    Post-upload analysis. Runs as an "analysis" job on the job worker's
+    own session; returns a small summary stored as the job result.
+    """
+    detected = run_detection(db)
+    rare = update_transition_model(db)
+    metrics = aggregate_metrics(db)
+    forecast = predict_error_trend(db, testing=False)
+    partitions = maintain_partitions(db)
+    clusters = update_cluster_model(db)
+
+    return {
+        "anomalies": len(detected),
+        "rare_transitions": len(rare),
+        "total_logs": metrics["total_logs"],
+        "forecast_ok": forecast.get("ok", False),
+        "partitions_created": len(partitions["created"]),
+        "partitions_dropped": len(partitions["dropped"]),
+        "clusters": clusters,
+    }
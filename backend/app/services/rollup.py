@@ -0,0 +1,245 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, text, case, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from app.core.cache import bump_generation
+from app.models.log import Log
+from app.models.log_rollup import LogRollup
+
+
+ERROR_LEVELS = ["ERROR", "CRITICAL"]
+
+# count, error_count, rt_count, rt_sum, rt_m2, rt_min, rt_max
+# (rt_m2 = Σ(x - mean)², merged with Chan's formula: no sum-of-squares cancellation)
+RollupKey = Tuple[datetime, str, str]
+RollupAgg = Dict[RollupKey, List]
+
+REBUILD_CHUNK = 50000
+BACKFILL_LOCK_KEY = 7_001_001   # pg advisory lock id for the startup backfill
+
+
+def minute_floor(ts: datetime) -> datetime:
+    return ts.replace(second=0, microsecond=0)
+
+
+def is_critical_level(level) -> bool:
+    """
+    CRITICAL, or a 5xx status used as the level (the downtime rule).
+    normalize_level maps non-canonical levels to INFO at ingest, so the
+    5xx branch only matches levels that reach the rollup un-normalized.
+    """
+    return level == "CRITICAL" or str(level).startswith("5")
+
+
+def is_error_level(level) -> bool:
+    return level in ERROR_LEVELS or is_critical_level(level)
+
+
+def critical_level_clause(column):
+    """SQL form of is_critical_level."""
+    return or_(column == "CRITICAL", column.like("5%"))
+
+
+# -----------------------------
+# AGGREGATION
+# -----------------------------
+def aggregate_logs(rows: Iterable[Tuple], agg: RollupAgg | None = None) -> RollupAgg:
+    """
+    Fold (timestamp, endpoint, level, response_time) tuples into per-minute buckets.
+    """
+    if agg is None:
+        agg = {}
+
+    for ts, endpoint, level, rt in rows:
+        key = (minute_floor(ts), endpoint or "", level)
+        a = agg.get(key)
+        if a is None:
+            a = agg[key] = [0, 0, 0, 0.0, 0.0, None, None]
+
+        a[0] += 1
+        if is_error_level(level):
+            a[1] += 1
+
+        if rt is not None:
+            # Welford update of (count, sum, M2)
+            delta = rt - (a[3] / a[2] if a[2] else 0.0)
+            a[2] += 1
+            a[3] += rt
+            a[4] += delta * (rt - a[3] / a[2])
+            if a[5] is None or rt < a[5]:
+                a[5] = rt
+            if a[6] is None or rt > a[6]:
+                a[6] = rt
+
+    return agg
+
+
+def _agg_params(agg: RollupAgg) -> List[Dict]:
+    return [
+        {
+            "bucket": bucket,
+            "endpoint": endpoint,
+            "level": level,
+            "count": a[0],
+            "error_count": a[1],
+            "rt_count": a[2],
+            "rt_sum": a[3],
+            "rt_m2": a[4],
+            "rt_min": a[5],
+            "rt_max": a[6],
+        }
+        for (bucket, endpoint, level), a in agg.items()
+    ]
+
+
+# -----------------------------
+# PERSISTENCE (upsert)
+# -----------------------------
+def _merged_m2(n_a, sum_a, m2_a, n_b, sum_b, m2_b):
+    """
+    Chan et al. pairwise merge of M2; works on numbers and on SQL
+    expressions (upsert SET clause, where the t.* side is the stored row).
+    """
+    if isinstance(n_a, (int, float)) and isinstance(n_b, (int, float)):
+        if n_a == 0 or n_b == 0:
+            return m2_a + m2_b
+        delta = sum_b / n_b - sum_a / n_a
+        return m2_a + m2_b + delta * delta * n_a * n_b / (n_a + n_b)
+
+    delta = sum_b / n_b - sum_a / n_a
+    return m2_a + m2_b + case(
+        ((n_a > 0) & (n_b > 0), delta * delta * n_a * n_b / (n_a + n_b)),
+        else_=0.0,
+    )
+
+
+def _upsert_on_conflict(db: Session, insert_fn, least, greatest, params: List[Dict]):
+    stmt = insert_fn(LogRollup)
+    t, ex = LogRollup.__table__.c, stmt.excluded
+
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[t.bucket, t.endpoint, t.level],
+        set_={
+            "count": t.count + ex.count,
+            "error_count": t.error_count + ex.error_count,
+            "rt_count": t.rt_count + ex.rt_count,
+            "rt_sum": t.rt_sum + ex.rt_sum,
+            "rt_m2": _merged_m2(t.rt_count, t.rt_sum, t.rt_m2, ex.rt_count, ex.rt_sum, ex.rt_m2),
+            # coalesce both sides: min/max must ignore a missing value
+            "rt_min": least(func.coalesce(t.rt_min, ex.rt_min), func.coalesce(ex.rt_min, t.rt_min)),
+            "rt_max": greatest(func.coalesce(t.rt_max, ex.rt_max), func.coalesce(ex.rt_max, t.rt_max)),
+        }
+    )
+    db.execute(stmt, params)
+
+
+def _upsert_generic(db: Session, params: List[Dict]):
+    for p in params:
+        row = db.get(LogRollup, (p["bucket"], p["endpoint"], p["level"]))
+        if row is None:
+            db.add(LogRollup(**p))
+            continue
+
+        row.rt_m2 = _merged_m2(row.rt_count, row.rt_sum, row.rt_m2, p["rt_count"], p["rt_sum"], p["rt_m2"])
+        row.count += p["count"]
+        row.error_count += p["error_count"]
+        row.rt_count += p["rt_count"]
+        row.rt_sum += p["rt_sum"]
+        if p["rt_min"] is not None:
+            row.rt_min = p["rt_min"] if row.rt_min is None else min(row.rt_min, p["rt_min"])
+        if p["rt_max"] is not None:
+            row.rt_max = p["rt_max"] if row.rt_max is None else max(row.rt_max, p["rt_max"])
+
+
+def upsert_rollups(db: Session, agg: RollupAgg):
+    """
+    Merge aggregated buckets into log_rollups. Caller commits.
+    """
+    if not agg:
+        return
+
+    params = _agg_params(agg)
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        _upsert_on_conflict(db, postgresql.insert, func.least, func.greatest, params)
+    elif dialect == "sqlite":
+        _upsert_on_conflict(db, sqlite.insert, func.min, func.max, params)
+    else:
+        _upsert_generic(db, params)
+
+
+def update_rollups(db: Session, rows: List[Dict]):
+    """
+    Ingest hook: fold a batch of normalized log rows into the rollup.
+    Runs inside the caller's transaction.
+    """
+    agg = aggregate_logs(
+        (r["timestamp"], r["endpoint"], r["level"], r["response_time"])
+        for r in rows
+    )
+    upsert_rollups(db, agg)
+
+
+# -----------------------------
+# REBUILD / BACKFILL
+# -----------------------------
+def rebuild_rollups(db: Session, since: datetime | None = None) -> int:
+    """
+    Recompute rollup buckets from raw logs (all of them, or from `since` on).
+    Logs are read in id-ordered chunks and merged chunk by chunk,
+    so memory stays bounded. Returns the number of logs folded in.
+    """
+    delete_q = db.query(LogRollup)
+    logs_q = db.query(Log.id, Log.timestamp, Log.endpoint, Log.level, Log.response_time) \
+        .filter(Log.timestamp.isnot(None))
+
+    if since is not None:
+        since = minute_floor(since)
+        delete_q = delete_q.filter(LogRollup.bucket >= since)
+        logs_q = logs_q.filter(Log.timestamp >= since)
+
+    delete_q.delete(synchronize_session=False)
+
+    processed = 0
+    last_id = 0
+    while True:
+        chunk = (
+            logs_q.filter(Log.id > last_id)
+            .order_by(Log.id.asc())
+            .limit(REBUILD_CHUNK)
+            .all()
+        )
+        if not chunk:
+            break
+
+        upsert_rollups(db, aggregate_logs(
+            (r.timestamp, r.endpoint, r.level, r.response_time) for r in chunk
+        ))
+        processed += len(chunk)
+        last_id = chunk[-1].id
+
+    db.commit()
+    bump_generation()
+    return processed
+
+
+def backfill_rollups_if_empty(db: Session) -> int:
+    """
+    Deployments that had logs before the rollup existed start with an empty
+    log_rollups table, and every dashboard would read zeros. Rebuild once
+    in that case. Returns the number of logs folded in (0 = nothing to do).
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        # app processes starting together: one rebuilds, the rest then see rows
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": BACKFILL_LOCK_KEY})
+
+    if db.query(LogRollup.bucket).first() is not None:
+        db.commit()
+        return 0
+    if db.query(Log.id).filter(Log.timestamp.isnot(None)).first() is None:
+        db.commit()
+        return 0
+    return rebuild_rollups(db)
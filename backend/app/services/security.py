@@ -1,143 +1,252 @@
+from typing import Dict, List
 from sqlalchemy.orm import Session
+from sqlalchemy import select, case
 from datetime import datetime, timedelta
-from collections import Counter
+import numpy as np
+import pandas as pd
 from app.models.log import Log
+from app.models.log_template import LogTemplate
 from app.services.db_service import save_anomalies
 
 
+# window per detector (minutes); the combined pass fetches the widest once
+LOGIN_WINDOW_MINUTES = 10
+IP_WINDOW_MINUTES = 10
+REPEAT_WINDOW_MINUTES = 60
+SEQUENCE_WINDOW_MINUTES = 30
+
+FRAME_COLUMNS = ["id", "timestamp", "level", "endpoint", "ip", "template_id", "message"]
+
+
 # -------------------------------------------------------------------
-# MODULE 3.1 — FAILED LOGIN SPIKE (Brute-force detection)
+# SHARED WINDOW — one column fetch, every detector reads from it
 # -------------------------------------------------------------------
-def detect_login_spike(db: Session, *, window_minutes=10, testing=False):
-    now = datetime.utcnow()
-    logs = db.query(Log).all() if testing else \
-        db.query(Log).filter(Log.timestamp >= now - timedelta(minutes=window_minutes)).all()
-
-    failed = [
-        l for l in logs
-        if l.endpoint == "/api/login"
-        and l.level
-        and l.level.upper() in ["ERROR", "CRITICAL"]
-    ]
+def fetch_security_frame(db: Session, *, window_minutes: int, now: datetime, testing=False) -> pd.DataFrame:
+    """
+    Columns the security detectors need, as a DataFrame.
+    message is only fetched for lines without a template (the repeat
+    detector groups everything else by template_id).
+    """
+    stmt = select(
+        Log.id, Log.timestamp, Log.level, Log.endpoint, Log.ip, Log.template_id,
+        case((Log.template_id.is_(None), Log.message), else_=None),
+    )
+    if not testing:
+        stmt = stmt.where(Log.timestamp >= now - timedelta(minutes=window_minutes))
 
-    if not failed:
-        return []
+    frame = pd.DataFrame(db.execute(stmt).all(), columns=FRAME_COLUMNS)
+    frame["timestamp"] = pd.to_datetime(frame["timestamp"])
+    return frame
 
-    count = len(failed)
-    severity = "medium" if count < 5 else "critical"
 
-    anomaly = {
+def _in_window(frame: pd.DataFrame, now: datetime, window_minutes: int, testing: bool) -> np.ndarray:
+    if testing:
+        return np.ones(len(frame), dtype=bool)
+    return (frame["timestamp"] >= now - timedelta(minutes=window_minutes)).to_numpy()
+
+
+def _event_time(ts):
+    """Latest matched log time as a plain datetime (None when untimed)."""
+    return None if pd.isna(ts) else ts.to_pydatetime()
+
+
+# -------------------------------------------------------------------
+# MODULE 3.1 — FAILED LOGIN SPIKE (Brute-force detection)
+# -------------------------------------------------------------------
+def login_spike_in(frame: pd.DataFrame, now: datetime, *, window_minutes=LOGIN_WINDOW_MINUTES,
+                   testing=False) -> List[Dict]:
+    failed = (
+        _in_window(frame, now, window_minutes, testing)
+        & (frame["endpoint"] == "/api/login").to_numpy()
+        & frame["level"].str.upper().isin(["ERROR", "CRITICAL"]).to_numpy()
+    )
+    count = int(failed.sum())
+    if not count:
+        return []
+
+    return [{
         "timestamp": now,
+        "event_time": _event_time(frame["timestamp"][failed].max()),
         "type": "login_bruteforce",
-        "severity": severity,
+        "severity": "medium" if count < 5 else "critical",
         "endpoint": "/api/login",
         "failed_attempts": count,
         "message": "Suspicious number of failed login attempts detected"
-    }
+    }]
 
-    save_anomalies(db, [anomaly])
-    return [anomaly]
+
+def detect_login_spike(db: Session, *, window_minutes=LOGIN_WINDOW_MINUTES, testing=False):
+    now = datetime.utcnow()
+    frame = fetch_security_frame(db, window_minutes=window_minutes, now=now, testing=testing)
+    anomalies = login_spike_in(frame, now, window_minutes=window_minutes, testing=testing)
+    if anomalies:
+        save_anomalies(db, anomalies)
+    return anomalies
 
 
 # -------------------------------------------------------------------
 # MODULE 3.2 — SUSPICIOUS IP FLOOD (High request volume)
 # -------------------------------------------------------------------
-def detect_suspicious_ip(db: Session, *, threshold=30, window_minutes=10, testing=False):
-    now = datetime.utcnow()
-    logs = db.query(Log).all() if testing else \
-        db.query(Log).filter(Log.timestamp >= now - timedelta(minutes=window_minutes)).all()
-
-    ip_counts = Counter([l.ip for l in logs if l.ip])
-    anomalies = []
-
-    for ip, count in ip_counts.items():
-        if count >= threshold:
-            anomalies.append({
-                "timestamp": now,
-                "type": "ip_flood",
-                "severity": "high" if count < 60 else "critical",
-                "ip": ip,
-                "hit_count": count,
-                "message": f"IP {ip} is generating unusually high traffic"
-            })
+def suspicious_ip_in(frame: pd.DataFrame, now: datetime, *, threshold=30,
+                     window_minutes=IP_WINDOW_MINUTES, testing=False) -> List[Dict]:
+    window = frame[_in_window(frame, now, window_minutes, testing)]
+    window = window[window["ip"].notna() & (window["ip"] != "")]
+    ip_counts = window["ip"].value_counts(sort=False)
+    last_seen = window.groupby("ip")["timestamp"].max()
+
+    return [
+        {
+            "timestamp": now,
+            "event_time": _event_time(last_seen[ip]),
+            "type": "ip_flood",
+            "severity": "high" if count < 60 else "critical",
+            "ip": ip,
+            "hit_count": int(count),
+            "message": f"IP {ip} is generating unusually high traffic"
+        }
+        for ip, count in ip_counts[ip_counts >= threshold].items()
+    ]
+
 
+def detect_suspicious_ip(db: Session, *, threshold=30, window_minutes=IP_WINDOW_MINUTES, testing=False):
+    now = datetime.utcnow()
+    frame = fetch_security_frame(db, window_minutes=window_minutes, now=now, testing=testing)
+    anomalies = suspicious_ip_in(frame, now, threshold=threshold, window_minutes=window_minutes, testing=testing)
     if anomalies:
         save_anomalies(db, anomalies)
-
     return anomalies
 
 
 # -------------------------------------------------------------------
 # MODULE 3.3 — ROOT CAUSE REPEATED ERRORS
 # -------------------------------------------------------------------
-def detect_root_cause_repeats(db: Session, *, testing=False):
-    now = datetime.utcnow()
+def root_cause_repeats_in(frame: pd.DataFrame, now: datetime, *, min_count=5,
+                          window_minutes=REPEAT_WINDOW_MINUTES, testing=False) -> List[Dict]:
+    """
+    Repeats are counted per mined template, so "user 123 failed" and
+    "user 456 failed" add up. Lines ingested before template mining
+    (template_id NULL) are still counted by exact message.
+    Template rows come back with message=None; attach_template_messages
+    fills in the template text.
+    """
+    window = frame[_in_window(frame, now, window_minutes, testing)]
+
+    templated = window[window["template_id"].notna()]
+    by_template = templated["template_id"].astype("int64").value_counts(sort=False)
+    template_seen = templated.groupby(templated["template_id"].astype("int64"))["timestamp"].max()
+
+    untemplated = window[window["template_id"].isna()]
+    untemplated = untemplated[untemplated["message"].notna() & (untemplated["message"] != "")]
+    by_message = untemplated["message"].value_counts(sort=False)
+    message_seen = untemplated.groupby("message")["timestamp"].max()
+
+    repeats = [(int(tid), None, int(c), template_seen[tid])
+               for tid, c in by_template[by_template >= min_count].items()]
+    repeats += [(None, msg, int(c), message_seen[msg])
+                for msg, c in by_message[by_message >= min_count].items()]
+
+    return [
+        {
+            "timestamp": now,
+            "event_time": _event_time(seen),
+            "type": "repeated_root_cause",
+            "message": msg,
+            "template_id": tid,
+            "occurrences": count,
+            "severity": "medium" if count < 10 else "high"
+        }
+        for tid, msg, count, seen in repeats
+    ]
 
-    logs = db.query(Log).all() if testing else \
-        db.query(Log).filter(Log.timestamp >= now - timedelta(hours=1)).all()
 
-    messages = [l.message for l in logs if l.message]
-    counts = Counter(messages)
-    anomalies = []
+def attach_template_messages(db: Session, anomalies: List[Dict]) -> List[Dict]:
+    """
+    Fill message from log_templates for template-based repeats
+    (one lookup for the few templates that crossed the threshold).
+    Repeats whose template row no longer exists are dropped.
+    """
+    ids = [a["template_id"] for a in anomalies if a.get("template_id") is not None]
+    if not ids:
+        return anomalies
 
-    for msg, count in counts.items():
-        if count >= 5:
-            anomalies.append({
-                "timestamp": now,
-                "type": "repeated_root_cause",
-                "message": msg,
-                "occurrences": count,
-                "severity": "medium" if count < 10 else "high"
-            })
+    texts = dict(db.execute(
+        select(LogTemplate.id, LogTemplate.template).where(LogTemplate.id.in_(ids))
+    ).all())
 
+    kept = []
+    for a in anomalies:
+        tid = a.get("template_id")
+        if tid is not None:
+            if tid not in texts:
+                continue
+            a["message"] = texts[tid]
+        kept.append(a)
+    return kept
+
+
+def detect_root_cause_repeats(db: Session, *, testing=False):
+    now = datetime.utcnow()
+    frame = fetch_security_frame(db, window_minutes=REPEAT_WINDOW_MINUTES, now=now, testing=testing)
+    anomalies = attach_template_messages(db, root_cause_repeats_in(frame, now, testing=testing))
     if anomalies:
         save_anomalies(db, anomalies)
-
     return anomalies
 
 
 # -------------------------------------------------------------------
 # MODULE 3.4 — SEQUENCE ANOMALY (Suspicious event order)
 # -------------------------------------------------------------------
-def detect_sequence_anomaly(db: Session, *, testing=False):
-    now = datetime.utcnow()
-
-    logs = db.query(Log).all() if testing else \
-        db.query(Log).filter(Log.timestamp >= now - timedelta(minutes=30)).all()
-
-    logs = sorted(logs, key=lambda l: l.timestamp)
-
-    anomalies = []
-    last_event = None
-
-    for log in logs:
+def sequence_anomaly_in(frame: pd.DataFrame, now: datetime, *, window_minutes=SEQUENCE_WINDOW_MINUTES,
+                        testing=False) -> List[Dict]:
+    """
+    First delete-account that comes after a login in time order.
+    """
+    window = frame[_in_window(frame, now, window_minutes, testing)]
+    order = np.lexsort((window["id"].to_numpy(), window["timestamp"].to_numpy()))
+    endpoints = window["endpoint"].to_numpy()[order]
+
+    logins = np.flatnonzero(endpoints == "/api/login")
+    if not len(logins):
+        return []
+    deletes = np.flatnonzero(endpoints[logins[0] + 1:] == "/api/delete-account")
+    if not len(deletes):
+        return []
 
-        if last_event == "login" and log.endpoint == "/api/delete-account":
-            anomalies.append({
-                "timestamp": now,
-                "type": "sequence_anomaly",
-                "severity": "high",
-                "message": "Delete account triggered immediately after login. Suspicious sequence.",
-                "log_id": log.id,
-            })
-            break
+    row = order[logins[0] + 1 + deletes[0]]
+    return [{
+        "timestamp": now,
+        "type": "sequence_anomaly",
+        "severity": "high",
+        "message": "Delete account triggered immediately after login. Suspicious sequence.",
+        "log_id": int(window["id"].iat[row]),
+    }]
 
-        if log.endpoint == "/api/login":
-            last_event = "login"
 
+def detect_sequence_anomaly(db: Session, *, testing=False):
+    now = datetime.utcnow()
+    frame = fetch_security_frame(db, window_minutes=SEQUENCE_WINDOW_MINUTES, now=now, testing=testing)
+    anomalies = sequence_anomaly_in(frame, now, testing=testing)
     if anomalies:
         save_anomalies(db, anomalies)
-
     return anomalies
 
 
 # -------------------------------------------------------------------
-# COMBINED SECURITY PIPELINE
+# COMBINED SECURITY PIPELINE — one scan, one commit
 # -------------------------------------------------------------------
 def run_all_security_checks(db: Session, testing=False):
-    return {
-        "login_bruteforce": detect_login_spike(db, testing=testing),
-        "suspicious_ip": detect_suspicious_ip(db, testing=testing),
-        "root_cause_repeats": detect_root_cause_repeats(db, testing=testing),
-        "sequence_anomaly": detect_sequence_anomaly(db, testing=testing),
+    now = datetime.utcnow()
+    widest = max(LOGIN_WINDOW_MINUTES, IP_WINDOW_MINUTES, REPEAT_WINDOW_MINUTES, SEQUENCE_WINDOW_MINUTES)
+    frame = fetch_security_frame(db, window_minutes=widest, now=now, testing=testing)
+
+    res = {
+        "login_bruteforce": login_spike_in(frame, now, testing=testing),
+        "suspicious_ip": suspicious_ip_in(frame, now, testing=testing),
+        "root_cause_repeats": attach_template_messages(db, root_cause_repeats_in(frame, now, testing=testing)),
+        "sequence_anomaly": sequence_anomaly_in(frame, now, testing=testing),
     }
+
+    anomalies = [a for found in res.values() for a in found]
+    if anomalies:
+        save_anomalies(db, anomalies)
+    return res
@@ -0,0 +1,329 @@
+# app/services/streaming.py
+
+from typing import Callable, Dict, List, Tuple
+from collections import deque
+from datetime import datetime, timedelta
+import threading
+
+from app.core.config import settings
+from app.services.rollup import is_critical_level, is_error_level
+
+BUCKET_SECONDS = 10
+SWEEP_EVERY = 10_000          # events per shard between idle-key sweeps
+RECENT_FIRED = 200
+
+_EPOCH = datetime(1970, 1, 1)
+_BUCKET = timedelta(seconds=BUCKET_SECONDS)
+
+
+# ---------------------------------------------------------
+# SLIDING WINDOW — ring of fixed-width time buckets per key
+# ---------------------------------------------------------
+class SlidingWindow:
+    """
+    Running totals of `width` counters over the last `n` buckets (event time).
+    Buckets that slide out are subtracted as the window advances, so a
+    total is always O(1) to read.
+    """
+    __slots__ = ("n", "width", "counts", "totals", "latest", "level")
+
+    def __init__(self, n: int, width: int):
+        self.n = n
+        self.width = width
+        self.counts = [0] * (n * width)
+        self.totals = [0] * width
+        self.latest = -1
+        self.level = 0        # highest alert level fired since the key was last quiet
+
+    def add(self, bucket: int, values: Tuple[int, ...]) -> bool:
+        if bucket <= self.latest - self.n:
+            return False      # older than the window: already slid out
+
+        if bucket > self.latest:
+            if bucket - self.latest >= self.n:
+                # whole window slid out (nothing to clear on the first event)
+                if self.latest >= 0:
+                    self.counts = [0] * (self.n * self.width)
+                    self.totals = [0] * self.width
+            else:
+                for b in range(self.latest + 1, bucket + 1):
+                    slot = (b % self.n) * self.width
+                    for j in range(self.width):
+                        self.totals[j] -= self.counts[slot + j]
+                        self.counts[slot + j] = 0
+            self.latest = bucket
+
+        slot = (bucket % self.n) * self.width
+        for j, v in enumerate(values):
+            self.counts[slot + j] += v
+            self.totals[j] += v
+        return True
+
+
+# ---------------------------------------------------------
+# RULES — what to count, per which key, and when to fire
+# ---------------------------------------------------------
+class StreamRule:
+    """
+      key(row) → key to count under, or None to skip the row
+      values(row) → increments, one per counter
+      check(totals) → (level, severity, extra fields); level 0 = quiet
+    A rule fires when a key reaches a higher level than it already fired
+    at, and re-arms once the key is quiet again.
+    """
+
+    def __init__(self, name: str, window_minutes: int, width: int,
+                 key: Callable, values: Callable, check: Callable):
+        self.name = name
+        self.n = max(1, window_minutes * 60 // BUCKET_SECONDS)
+        self.width = width
+        self.key = key
+        self.values = values
+        self.check = check
+
+
+def _ip(row: Dict):
+    return row.get("ip") or None
+
+
+def _endpoint(row: Dict):
+    return row.get("endpoint") or None
+
+
+def _failed_login_ip(row: Dict):
+    if row.get("endpoint") == "/api/login" and is_error_level(row.get("level")):
+        return row.get("ip") or "unknown"
+    return None
+
+
+def _critical_endpoint(row: Dict):
+    return (row.get("endpoint") or None) if is_critical_level(row.get("level")) else None
+
+
+def _one(row: Dict):
+    return (1,)
+
+
+def _check_login(totals):
+    count = totals[0]
+    if count >= settings.STREAM_LOGIN_FAILURES:
+        return 1, "critical", {"failed_attempts": count}
+    return 0, None, None
+
+
+def _check_ip_flood(totals):
+    count = totals[0]
+    if count >= settings.STREAM_IP_FLOOD_CRITICAL:
+        return 2, "critical", {"hit_count": count}
+    if count >= settings.STREAM_IP_FLOOD_HITS:
+        return 1, "high", {"hit_count": count}
+    return 0, None, None
+
+
+def _check_error_spike(totals):
+    total, errors = totals
+    if total < settings.STREAM_ERROR_MIN_REQUESTS:
+        return 0, None, None
+    rate = errors / total
+    extra = {"error_count": errors, "total_count": total, "failure_rate": round(rate, 3)}
+    if rate > 0.5:
+        return 2, "high", extra
+    if rate > 0.3:
+        return 1, "medium", extra
+    return 0, None, None
+
+
+def _check_api_failure(totals):
+    if totals[0] >= 3:
+        return 1, "critical", {"critical_count": totals[0]}
+    return 0, None, None
+
+
+def default_rules() -> List[StreamRule]:
+    """
+    Streaming counterparts of the login brute-force, IP flood, error
+    spike and downtime detectors (same thresholds, event-time windows).
+    """
+    return [
+        StreamRule("login_bruteforce", 10, 1, _failed_login_ip, _one, _check_login),
+        StreamRule("ip_flood", 10, 1, _ip, _one, _check_ip_flood),
+        StreamRule("error_spike", 5, 2, _endpoint,
+                   lambda r: (1, 1 if is_error_level(r.get("level")) else 0), _check_error_spike),
+        StreamRule("api_failure", 5, 1, _critical_endpoint, _one, _check_api_failure),
+    ]
+
+
+_MESSAGES = {
+    "login_bruteforce": lambda key: f"Failed login burst from {key}",
+    "ip_flood": lambda key: f"IP {key} is generating unusually high traffic",
+    "error_spike": lambda key: f"Error rate spike on {key}",
+    "api_failure": lambda key: f"Multiple server failures on {key} (possible downtime)",
+}
+
+
+# ---------------------------------------------------------
+# SHARDED DETECTOR
+# ---------------------------------------------------------
+class _Shard:
+    __slots__ = ("lock", "windows", "events", "latest")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.windows: Dict[Tuple[str, str], SlidingWindow] = {}
+        self.events = 0
+        self.latest = -1
+
+    def sweep(self, rules: Dict[str, StreamRule]):
+        """
+        Drop keys with no events inside their window (bounds memory for
+        one-off IPs).
+        """
+        stale = [
+            k for k, w in self.windows.items()
+            if w.latest <= self.latest - rules[k[0]].n
+        ]
+        for k in stale:
+            del self.windows[k]
+
+
+class StreamDetector:
+    """
+    In-process detectors updated from ingest. Keys are spread over
+    `shards` lock-protected dicts, so concurrent uploads rarely contend;
+    each batch takes every shard lock at most once.
+
+    Windows live in this process only: with several app workers each one
+    counts just the uploads it handled, so a burst split across workers
+    can stay under every threshold. Run ingest in one process (or rely on
+    the periodic DB detectors, which see all rows) when that matters.
+    """
+
+    def __init__(self, rules: List[StreamRule] | None = None, shards: int = 16):
+        self.rules = {r.name: r for r in (rules or default_rules())}
+        self.shards = [_Shard() for _ in range(max(1, shards))]
+        self.fired = 0
+        self.recent: deque = deque(maxlen=RECENT_FIRED)
+        self._lock = threading.Lock()
+
+    def _shard_of(self, rule: str, key: str) -> int:
+        # in-process only, so the per-process str hash is fine
+        return hash((rule, key)) % len(self.shards)
+
+    def observe(self, rows: List[Dict], ids: List[int] | None = None,
+                now: datetime | None = None, replay: bool = False) -> List[Dict]:
+        """
+        Count a batch of ingested rows; returns anomalies for every key
+        that crossed a threshold in this batch (no DB access).
+        Events older than a rule's window relative to `now` (wall clock,
+        UTC) are ignored, so uploading an old log file does not raise
+        alerts for incidents long past; replay=True counts them anyway.
+        """
+        now_bucket = ((now or datetime.utcnow()) - _EPOCH) // _BUCKET
+
+        # route (rule, key, bucket, values, row index) to shards first
+        routed: List[List[Tuple]] = [[] for _ in self.shards]
+        for i, row in enumerate(rows):
+            ts = row.get("timestamp")
+            if ts is None:
+                continue
+            bucket = (ts - _EPOCH) // _BUCKET
+            for rule in self.rules.values():
+                if not replay and bucket <= now_bucket - rule.n:
+                    continue
+                key = rule.key(row)
+                if key is not None:
+                    routed[self._shard_of(rule.name, key)].append(
+                        (rule, key, bucket, rule.values(row), i)
+                    )
+
+        anomalies = []
+        for shard, events in zip(self.shards, routed):
+            if not events:
+                continue
+            with shard.lock:
+                for rule, key, bucket, values, i in events:
+                    window = shard.windows.get((rule.name, key))
+                    if window is None:
+                        window = shard.windows[(rule.name, key)] = SlidingWindow(rule.n, rule.width)
+                    if not window.add(bucket, values):
+                        continue
+                    if bucket > shard.latest:
+                        shard.latest = bucket
+
+                    level, severity, extra = rule.check(window.totals)
+                    if level == 0:
+                        window.level = 0
+                    elif level > window.level:
+                        window.level = level
+                        anomalies.append(self._anomaly(rule, key, severity, extra, rows[i], ids, i))
+
+                shard.events += len(events)
+                if shard.events >= SWEEP_EVERY:
+                    shard.events = 0
+                    shard.sweep(self.rules)
+
+        if anomalies:
+            with self._lock:
+                self.fired += len(anomalies)
+                self.recent.extend(anomalies)
+        return anomalies
+
+    @staticmethod
+    def _anomaly(rule: StreamRule, key: str, severity: str, extra: Dict,
+                 row: Dict, ids: List[int] | None, i: int) -> Dict:
+        anomaly = {
+            "timestamp": row["timestamp"],
+            "type": rule.name,
+            "severity": severity,
+            "message": _MESSAGES[rule.name](key),
+            "log_id": ids[i] if ids else None,
+            "source": "stream",
+            **extra,
+        }
+        if rule.name in ("login_bruteforce", "ip_flood"):
+            anomaly["ip"] = key
+        else:
+            anomaly["endpoint"] = key
+        return anomaly
+
+    def stats(self) -> Dict:
+        keys = 0
+        for shard in self.shards:
+            with shard.lock:
+                keys += len(shard.windows)
+        with self._lock:
+            recent = list(self.recent)
+        return {
+            "enabled": settings.STREAM_DETECTION,
+            "shards": len(self.shards),
+            "tracked_keys": keys,
+            "fired": self.fired,
+            "recent": recent[::-1],
+        }
+
+
+_DETECTOR: StreamDetector | None = None
+_DETECTOR_LOCK = threading.Lock()
+
+
+def get_stream_detector() -> StreamDetector:
+    global _DETECTOR
+    with _DETECTOR_LOCK:
+        if _DETECTOR is None:
+            _DETECTOR = StreamDetector(shards=settings.STREAM_SHARDS)
+    return _DETECTOR
+
+
+def reset_stream_detector():
+    global _DETECTOR
+    with _DETECTOR_LOCK:
+        _DETECTOR = None
+
+
+# ---------------------------------------------------------
+# INGEST HOOK
+# ---------------------------------------------------------
+def observe_logs(rows: List[Dict], ids: List[int] | None = None) -> List[Dict]:
+    if not settings.STREAM_DETECTION:
+        return []
+    return get_stream_detector().observe(rows, ids, replay=settings.STREAM_REPLAY)
@@ -0,0 +1,96 @@
+"""
+Benchmark: legacy per-object save_parsed_logs vs bulk insert engine.
+
+Run from the backend folder (uses DATABASE_URL from .env):
+
+    python -m benchmarks.bench_bulk_insert
+    python -m benchmarks.bench_bulk_insert --sizes 10000 100000 --skip-legacy
+
+Rows written by the benchmark are deleted again afterwards.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from app.core.database import SessionLocal
+from app.core.migrations import run_migrations
+from app.models.log import Log
+from app.services.db_service import save_parsed_logs, normalize_level
+
+LEVELS = ["INFO", "INFO", "INFO", "WARN", "ERROR", "CRITICAL"]
+ENDPOINTS = ["/api/login", "/api/orders", "/api/profile", "/api/search", "/api/pay"]
+
+
+def make_rows(n: int):
+    start = datetime.utcnow() - timedelta(hours=1)
+    return [
+        {
+            "timestamp": start + timedelta(milliseconds=i),
+            "level": random.choice(LEVELS),
+            "endpoint": random.choice(ENDPOINTS),
+            "status": 200,
+            "response_time": round(random.random() * 2, 3),
+            "ip": f"10.0.{random.randint(0, 255)}.{random.randint(0, 255)}",
+            "message": f"request {i} handled",
+        }
+        for i in range(n)
+    ]
+
+
+def legacy_save(db, parsed):
+    """Original implementation: db.add per row + id re-query."""
+    for p in parsed:
+        db.add(Log(
+            timestamp=p.get("timestamp") or datetime.utcnow(),
+            level=normalize_level(p.get("level")),
+            message=p.get("message"),
+            endpoint=p.get("endpoint"),
+            response_time=p.get("response_time"),
+            ip=p.get("ip")
+        ))
+    db.commit()
+    rows = db.query(Log).order_by(Log.id.desc()).limit(len(parsed)).all()
+    return [r.id for r in rows[::-1]]
+
+
+def timed(fn, db, rows):
+    t0 = time.perf_counter()
+    ids = fn(db, rows)
+    elapsed = time.perf_counter() - t0
+
+    # cleanup so repeated runs start from the same table size
+    db.query(Log).filter(Log.id >= min(ids), Log.id <= max(ids)) \
+        .delete(synchronize_session=False)
+    db.commit()
+    return elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--skip-legacy", action="store_true")
+    args = ap.parse_args()
+
+    run_migrations()
+    db = SessionLocal()
+
+    print(f"{'rows':>10} {'legacy rows/s':>15} {'bulk rows/s':>15} {'speedup':>8}")
+    try:
+        for n in args.sizes:
+            rows = make_rows(n)
+
+            legacy = None
+            if not args.skip_legacy:
+                legacy = n / timed(legacy_save, db, rows)
+            bulk = n / timed(save_parsed_logs, db, rows)
+
+            speedup = f"{bulk / legacy:.1f}x" if legacy else "-"
+            legacy_s = f"{legacy:,.0f}" if legacy else "-"
+            print(f"{n:>10,} {legacy_s:>15} {bulk:>15,.0f} {speedup:>8}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark: exact vs scalable semantic clustering, wall time and peak memory vs n.
+
+Run from the backend folder (app settings still need DATABASE_URL to import):
+
+    python -m benchmarks.bench_clustering
+    python -m benchmarks.bench_clustering --sizes 2000 20000 200000 --max-exact 20000
+
+Uses synthetic 384-d embeddings (topic centers + per-message noise + a few
+random outliers), so no model or database access is needed. Peak memory is the
+tracemalloc peak of the clustering call (numpy buffers included).
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from sklearn.metrics import adjusted_rand_score
+
+from app.services.ml.clustering import _apply_dbscan, _apply_scalable
+from app.services.ml.embeddings import EMBEDDING_DIM
+
+
+def make_embeddings(n: int, topics: int = 40, outlier_share: float = 0.01, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(topics, EMBEDDING_DIM))
+    truth = rng.integers(0, topics, size=n)
+    X = centers[truth] + rng.normal(scale=0.25, size=(n, EMBEDDING_DIM))
+
+    n_out = int(n * outlier_share)
+    X[:n_out] = rng.normal(scale=1.5, size=(n_out, EMBEDDING_DIM))
+    truth[:n_out] = -1
+    return X.astype(np.float32), truth
+
+
+def measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    labels = fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return labels, elapsed, peak / 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 2_000, 5_000, 20_000, 100_000])
+    ap.add_argument("--max-exact", type=int, default=20_000,
+                    help="skip exact DBSCAN above this n (quadratic)")
+    args = ap.parse_args()
+
+    print(f"{'n':>9} {'exact s':>9} {'exact MB':>9} {'exact ARI':>9} "
+          f"{'scal s':>9} {'scal MB':>9} {'scal ARI':>9}")
+    for n in args.sizes:
+        X, truth = make_embeddings(n)
+
+        exact = ["-"] * 3
+        if n <= args.max_exact:
+            labels, sec, mb = measure(lambda: _apply_dbscan(X, eps=18.0, min_samples=4))
+            exact = [f"{sec:.2f}", f"{mb:.0f}", f"{adjusted_rand_score(truth, labels):.3f}"]
+
+        (labels, _), sec, mb = measure(lambda: _apply_scalable(X, cosine_eps=0.15, min_samples=4))
+        scal = [f"{sec:.2f}", f"{mb:.0f}", f"{adjusted_rand_score(truth, labels):.3f}"]
+
+        print(f"{n:>9,} " + " ".join(f"{v:>9}" for v in exact + scal))
+
+
+if __name__ == "__main__":
+    main()
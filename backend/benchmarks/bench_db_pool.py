@@ -0,0 +1,147 @@
+"""
+Load test: read-endpoint latency with the old engine settings (SQL echo on,
+SQLAlchemy default pool) vs the configured ones (app/core/db_settings.py).
+
+Run from the backend folder (uses DATABASE_URL from .env):
+
+    python -m benchmarks.bench_db_pool
+    python -m benchmarks.bench_db_pool --requests 2000 --concurrency 64 --seed 50000
+
+Each profile starts its own uvicorn on --port with the profile's environment,
+fires the same request mix at it from `concurrency` threads and reports
+p50 / p95 / p99. --seed inserts synthetic logs first (they are kept).
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+READ_ENDPOINTS = [
+    "/anomalies/",
+    "/metrics/summary",
+    "/metrics/slowest",
+    "/metrics/top-errors",
+    "/metrics/top-anomalies",
+    "/metrics/downtime",
+]
+
+PROFILES = {
+    # what app/core/database.py did before: echo=True, QueuePool(5, 10), no pre-ping / recycle
+    "old": {
+        "SQL_ECHO": "true",
+        "DB_POOL_SIZE": "5",
+        "DB_MAX_OVERFLOW": "10",
+        "DB_POOL_RECYCLE": "-1",
+        "DB_POOL_PRE_PING": "false",
+    },
+    # db_settings defaults (anything already set in the environment wins)
+    "new": {},
+}
+
+
+def seed_logs(n: int):
+    from app.core.database import SessionLocal
+    from app.core.migrations import run_migrations
+    from app.services.db_service import save_parsed_logs
+    from benchmarks.bench_bulk_insert import make_rows
+
+    run_migrations()
+    with SessionLocal() as db:
+        save_parsed_logs(db, make_rows(n))
+
+
+def start_server(port: int, env: dict) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, "JOB_WORKER": "false", **env},
+        stdout=subprocess.DEVNULL,   # echo output is still produced, just not shown
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(120):
+        try:
+            requests.get(base + "/", timeout=1)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError("server did not start")
+
+
+def run_load(base: str, total: int, concurrency: int):
+    plan = [random.choice(READ_ENDPOINTS) for _ in range(total)]
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    cursor = iter(range(total))
+
+    def worker():
+        nonlocal errors
+        session = requests.Session()
+        while True:
+            with lock:
+                i = next(cursor, None)
+            if i is None:
+                return
+            t0 = time.perf_counter()
+            try:
+                ok = session.get(base + plan[i], timeout=120).status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - t0
+            with lock:
+                latencies.append(elapsed)
+                errors += not ok
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    ms = np.array(latencies) * 1000
+    return {
+        "rps": total / wall,
+        "p50": np.percentile(ms, 50),
+        "p95": np.percentile(ms, 95),
+        "p99": np.percentile(ms, 99),
+        "errors": errors,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=1000)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--port", type=int, default=8799)
+    ap.add_argument("--seed", type=int, default=0, help="insert this many synthetic logs first")
+    ap.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    args = ap.parse_args()
+
+    if args.seed:
+        seed_logs(args.seed)
+
+    print(f"{'profile':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name in args.profiles:
+        proc = start_server(args.port, PROFILES[name])
+        try:
+            base = f"http://127.0.0.1:{args.port}"
+            run_load(base, min(50, args.requests), args.concurrency)   # warm-up
+            r = run_load(base, args.requests, args.concurrency)
+        finally:
+            proc.terminate()
+            proc.wait()
+        print(f"{name:>8} {r['rps']:>8.1f} {r['p50']:>9.1f} {r['p95']:>9.1f} {r['p99']:>9.1f} {r['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark: embedding throughput (messages/sec) per backend and batch size.
+
+Run from the backend folder (needs sentence-transformers; onnx needs
+sentence-transformers[onnx]):
+
+    python -m benchmarks.bench_embeddings
+    python -m benchmarks.bench_embeddings --backends torch int8 onnx --batch-sizes 32 64 128 --threads 4
+
+Messages mix short and long templates, like real log lines.
+"""
+import argparse
+import random
+import time
+
+import app.services.ml.embeddings as emb
+from app.core.config import settings
+
+WORDS = "user request failed timeout connection database payment order retry cache".split()
+
+
+def make_messages(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(WORDS) for _ in range(rng.choice([4, 8, 16, 48])))
+        + f" id={rng.randint(0, 10**6)}"
+        for _ in range(n)
+    ]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=5000)
+    ap.add_argument("--backends", nargs="+", default=["torch", "int8"])
+    ap.add_argument("--batch-sizes", type=int, nargs="+", default=[16, 64, 128])
+    ap.add_argument("--threads", type=int, default=0)
+    args = ap.parse_args()
+
+    messages = make_messages(args.messages)
+    settings.EMBED_TORCH_THREADS = args.threads
+
+    print(f"{'backend':>8} {'load s':>8} " + " ".join(f"{'bs=' + str(b) + ' msg/s':>14}" for b in args.batch_sizes))
+    for backend in args.backends:
+        settings.EMBED_BACKEND = backend
+        emb._MODEL = None
+
+        t0 = time.perf_counter()
+        emb.warm_up()
+        load = time.perf_counter() - t0
+
+        rates = []
+        for bs in args.batch_sizes:
+            settings.EMBED_BATCH_SIZE = bs
+            t0 = time.perf_counter()
+            emb.embed_messages(messages)
+            rates.append(len(messages) / (time.perf_counter() - t0))
+
+        print(f"{backend:>8} {load:>8.1f} " + " ".join(f"{r:>14,.0f}" for r in rates))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Micro-benchmark: parser throughput (lines/sec) per log format.
+
+    python -m benchmarks.bench_parser
+    python -m benchmarks.bench_parser --lines 500000
+
+Compares the original two-regex parse_log_line against the fused
+parser (dict output) and the column-oriented LogBatch path.
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+
+from app.services.parser import (
+    FULL_PATTERN,
+    SHORT_PATTERN,
+    parse_log_line,
+    parse_log_batch,
+)
+
+LEVELS = ["INFO", "WARN", "ERROR", "DEBUG", "CRITICAL"]
+ENDPOINTS = ["/api/login", "/api/orders", "/api/profile", "/api/search"]
+
+
+def _ts(i: int) -> str:
+    # ~20 lines per second, like a busy service
+    sec = i // 20
+    return f"2024-05-01T{(sec // 3600) % 24:02d}:{(sec // 60) % 60:02d}:{sec % 60:02d}Z"
+
+
+def make_lines(fmt: str, n: int):
+    out = []
+    for i in range(n):
+        lvl = random.choice(LEVELS)
+        ep = random.choice(ENDPOINTS)
+        rt = round(random.random() * 2, 3)
+        if fmt == "full":
+            out.append(f"{_ts(i)} {lvl} {ep} 200 {rt} 10.0.0.{i % 255} - request {i} handled")
+        elif fmt == "short":
+            out.append(f"{_ts(i)} {lvl} {ep} 200 {rt}")
+        elif fmt == "fallback":
+            out.append(f"garbage {lvl} line {i} without structure")
+        elif fmt == "comment":
+            out.append(f"# comment {i}")
+    return out
+
+
+def legacy_parse_log_line(line: str):
+    """Original implementation: FULL then SHORT regex, fromisoformat per line."""
+    text = line.strip()
+
+    m = FULL_PATTERN.match(text)
+    if m:
+        gd = m.groupdict()
+        return {
+            "timestamp": datetime.fromisoformat(gd["timestamp"].replace("Z", "+00:00")),
+            "level": gd["level"],
+            "endpoint": gd["endpoint"],
+            "status": int(gd["status"]),
+            "response_time": float(gd["response_time"]),
+            "ip": gd["ip"],
+            "message": gd["message"],
+        }
+
+    m2 = SHORT_PATTERN.match(text)
+    if m2:
+        gd = m2.groupdict()
+        return {
+            "timestamp": datetime.fromisoformat(gd["timestamp"].replace("Z", "+00:00")),
+            "level": gd["level"],
+            "endpoint": gd["endpoint"],
+            "status": int(gd["status"]),
+            "response_time": float(gd["response_time"]),
+            "ip": None,
+            "message": None,
+        }
+
+    if text.startswith("#"):
+        return None
+
+    parts = text.split(" ", 3)
+    return {
+        "timestamp": datetime.utcnow(),
+        "level": parts[1] if len(parts) > 1 else "INFO",
+        "endpoint": None,
+        "status": None,
+        "response_time": None,
+        "ip": None,
+        "message": parts[-1] if parts else text,
+    }
+
+
+def _rate(fn, lines, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(lines)
+        best = min(best, time.perf_counter() - t0)
+    return len(lines) / best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=200_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    runners = {
+        "legacy": lambda ls: [legacy_parse_log_line(l) for l in ls],
+        "fused": lambda ls: [parse_log_line(l) for l in ls],
+        "batch": lambda ls: parse_log_batch(ls),
+    }
+
+    print(f"{'format':>10} " + " ".join(f"{name + ' l/s':>14}" for name in runners))
+    for fmt in ("full", "short", "fallback", "comment"):
+        lines = make_lines(fmt, args.lines)
+        rates = [_rate(fn, lines, args.repeat) for fn in runners.values()]
+        print(f"{fmt:>10} " + " ".join(f"{r:>14,.0f}" for r in rates))
+
+
+if __name__ == "__main__":
+    main()
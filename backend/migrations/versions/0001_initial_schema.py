@@ -0,0 +1,99 @@
+"""initial schema
+
+Baseline of the tables previously created by Base.metadata.create_all.
+Tables that already exist are left alone, so databases bootstrapped
+by create_all can simply run `alembic upgrade head`.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _missing(table: str) -> bool:
+    return not sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade():
+    if _missing("logs"):
+        op.create_table(
+            "logs",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("timestamp", sa.DateTime()),
+            sa.Column("level", sa.String()),
+            sa.Column("message", sa.String()),
+            sa.Column("endpoint", sa.String(), nullable=True),
+            sa.Column("response_time", sa.Float(), nullable=True),
+            sa.Column("ip", sa.String(), nullable=True),
+        )
+        op.create_index("ix_logs_id", "logs", ["id"])
+
+    if _missing("anomalies"):
+        op.create_table(
+            "anomalies",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("timestamp", sa.DateTime()),
+            sa.Column("type", sa.String()),
+            sa.Column("score", sa.Float()),
+            sa.Column("severity", sa.String()),
+            sa.Column("message", sa.String()),
+            sa.Column("log_id", sa.Integer(), nullable=True),
+        )
+        op.create_index("ix_anomalies_id", "anomalies", ["id"])
+
+    if _missing("metrics"):
+        op.create_table(
+            "metrics",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("timestamp", sa.DateTime()),
+            sa.Column("total_logs", sa.Integer()),
+            sa.Column("error_count", sa.Integer()),
+            sa.Column("avg_response_time", sa.Float()),
+            sa.Column("low", sa.Integer()),
+            sa.Column("medium", sa.Integer()),
+            sa.Column("high", sa.Integer()),
+            sa.Column("critical", sa.Integer()),
+        )
+
+    if _missing("detector_state"):
+        op.create_table(
+            "detector_state",
+            sa.Column("name", sa.String(), primary_key=True),
+            sa.Column("last_log_id", sa.Integer(), nullable=False),
+            sa.Column("fitted_at", sa.DateTime(), nullable=True),
+            sa.Column("updated_at", sa.DateTime()),
+            sa.Column("payload", sa.LargeBinary(), nullable=True),
+        )
+
+    if _missing("log_rollups"):
+        op.create_table(
+            "log_rollups",
+            sa.Column("bucket", sa.DateTime(), primary_key=True),
+            sa.Column("endpoint", sa.String(), primary_key=True),
+            sa.Column("level", sa.String(), primary_key=True),
+            sa.Column("count", sa.Integer(), nullable=False),
+            sa.Column("error_count", sa.Integer(), nullable=False),
+            sa.Column("rt_count", sa.Integer(), nullable=False),
+            sa.Column("rt_sum", sa.Float(), nullable=False),
+            sa.Column("rt_sumsq", sa.Float(), nullable=False),
+            sa.Column("rt_min", sa.Float(), nullable=True),
+            sa.Column("rt_max", sa.Float(), nullable=True),
+        )
+
+
+def downgrade():
+    op.drop_table("log_rollups")
+    op.drop_table("detector_state")
+    op.drop_table("metrics")
+    op.drop_index("ix_anomalies_id", table_name="anomalies")
+    op.drop_table("anomalies")
+    op.drop_index("ix_logs_id", table_name="logs")
+    op.drop_table("logs")
@@ -0,0 +1,44 @@
+"""indexes for hot query paths
+
+Every service filters logs on a time window, often narrowed by
+level / endpoint / ip (sequences order by timestamp per ip).
+Anomalies and metric snapshots are filtered and sorted by timestamp.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ("ix_logs_timestamp", "logs", ["timestamp"]),
+    ("ix_logs_level_timestamp", "logs", ["level", "timestamp"]),
+    ("ix_logs_endpoint_timestamp", "logs", ["endpoint", "timestamp"]),
+    ("ix_logs_ip_timestamp", "logs", ["ip", "timestamp"]),
+    ("ix_anomalies_timestamp", "anomalies", ["timestamp"]),
+    ("ix_metrics_timestamp", "metrics", ["timestamp"]),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        # build without blocking writes on big tables
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, postgresql_concurrently=True)
+        return
+
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
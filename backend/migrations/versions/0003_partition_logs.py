@@ -0,0 +1,133 @@
+"""optional daily range partitioning of logs (PostgreSQL)
+
+Only applied when LOGS_PARTITIONING=true and the database is PostgreSQL;
+everywhere else this revision is a no-op and logs stays a single table.
+
+The existing table is copied into a `PARTITION BY RANGE (timestamp)` parent
+with one partition per day inside the retention window (LOGS_RETENTION_DAYS,
+or HISTORY_DAYS when retention is off), plus logs_default as a catch-all
+for everything older. The app refuses to start if LOGS_PARTITIONING is set
+later on an unpartitioned table (see partitions.check_partitioning).
+The primary key becomes (id, timestamp), as PostgreSQL requires the
+partition key in every unique constraint; ids keep coming from logs_id_seq.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+import os
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+LOG_INDEXES = [
+    ("ix_logs_id", ["id"]),
+    ("ix_logs_timestamp", ["timestamp"]),
+    ("ix_logs_level_timestamp", ["level", "timestamp"]),
+    ("ix_logs_endpoint_timestamp", ["endpoint", "timestamp"]),
+    ("ix_logs_ip_timestamp", ["ip", "timestamp"]),
+]
+
+COLUMNS = "id, timestamp, level, message, endpoint, response_time, ip"
+
+# with retention off, older days stay in logs_default (no table per day)
+HISTORY_DAYS = 30
+
+
+def _enabled() -> bool:
+    return (
+        op.get_bind().dialect.name == "postgresql"
+        and os.getenv("LOGS_PARTITIONING", "false").lower() in ("1", "true", "yes")
+    )
+
+
+def upgrade():
+    if not _enabled():
+        return
+
+    bind = op.get_bind()
+
+    # keep the id sequence alive when the old table is dropped
+    op.execute("ALTER SEQUENCE logs_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE logs RENAME TO logs_unpartitioned")
+    for name, _ in LOG_INDEXES:
+        op.execute(f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_old")
+
+    op.execute("""
+        CREATE TABLE logs (
+            id INTEGER NOT NULL DEFAULT nextval('logs_id_seq'),
+            timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            level VARCHAR,
+            message VARCHAR,
+            endpoint VARCHAR,
+            response_time DOUBLE PRECISION,
+            ip VARCHAR,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    op.execute("CREATE TABLE logs_default PARTITION OF logs DEFAULT")
+
+    # one partition per day within the window, up to a week ahead
+    bounds = bind.execute(sa.text(
+        "SELECT min(timestamp)::date, max(timestamp)::date FROM logs_unpartitioned"
+    )).first()
+    today = datetime.utcnow().date()
+    window = int(os.getenv("LOGS_RETENTION_DAYS", "0")) or HISTORY_DAYS
+    start = max(bounds[0] or today, today - timedelta(days=window))
+    end = max(bounds[1] or today, today) + timedelta(days=7)
+
+    day = start
+    while day <= end:
+        op.execute(
+            f"CREATE TABLE logs_p{day:%Y%m%d} PARTITION OF logs "
+            f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+        )
+        day += timedelta(days=1)
+
+    op.execute(f"""
+        INSERT INTO logs ({COLUMNS})
+        SELECT id, COALESCE(timestamp, now() AT TIME ZONE 'utc'), level, message,
+               endpoint, response_time, ip
+        FROM logs_unpartitioned
+    """)
+    op.execute("ALTER SEQUENCE logs_id_seq OWNED BY logs.id")
+    op.execute("DROP TABLE logs_unpartitioned")
+
+    for name, columns in LOG_INDEXES:
+        op.create_index(name, "logs", columns)
+
+
+def downgrade():
+    if not _enabled():
+        return
+
+    op.execute("ALTER SEQUENCE logs_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE logs RENAME TO logs_partitioned")
+    for name, _ in LOG_INDEXES:
+        op.execute(f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_old")
+
+    op.execute("""
+        CREATE TABLE logs (
+            id INTEGER NOT NULL DEFAULT nextval('logs_id_seq') PRIMARY KEY,
+            timestamp TIMESTAMP WITHOUT TIME ZONE,
+            level VARCHAR,
+            message VARCHAR,
+            endpoint VARCHAR,
+            response_time DOUBLE PRECISION,
+            ip VARCHAR
+        )
+    """)
+    op.execute(f"INSERT INTO logs ({COLUMNS}) SELECT {COLUMNS} FROM logs_partitioned")
+    op.execute("ALTER SEQUENCE logs_id_seq OWNED BY logs.id")
+    op.execute("DROP TABLE logs_partitioned CASCADE")
+
+    for name, columns in LOG_INDEXES:
+        op.create_index(name, "logs", columns)
@@ -0,0 +1,31 @@
+"""embedding cache
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "embedding_cache",
+        sa.Column("key", sa.String(40), primary_key=True),
+        sa.Column("dim", sa.Integer(), nullable=False),
+        sa.Column("dtype", sa.String(8), nullable=False),
+        sa.Column("vector", sa.LargeBinary(), nullable=False),
+        sa.Column("last_used", sa.DateTime()),
+    )
+    op.create_index("ix_embedding_cache_last_used", "embedding_cache", ["last_used"])
+
+
+def downgrade():
+    op.drop_index("ix_embedding_cache_last_used", table_name="embedding_cache")
+    op.drop_table("embedding_cache")
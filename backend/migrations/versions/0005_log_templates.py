@@ -0,0 +1,54 @@
+"""log templates
+
+Templates mined from log messages at ingest, referenced by logs.template_id.
+Rows written before this revision keep template_id NULL.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def _partitioned(bind) -> bool:
+    return bind.execute(sa.text(
+        "SELECT relkind = 'p' FROM pg_class WHERE relname = 'logs'"
+    )).scalar() or False
+
+
+def upgrade():
+    op.create_table(
+        "log_templates",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("template", sa.String(), nullable=False),
+        sa.Column("token_count", sa.Integer(), nullable=False),
+        sa.Column("count", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("first_seen", sa.DateTime()),
+        sa.Column("last_seen", sa.DateTime()),
+    )
+    op.add_column("logs", sa.Column("template_id", sa.Integer(), nullable=True))
+
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql" and not _partitioned(bind):
+        # CONCURRENTLY is not supported on a partitioned parent
+        with op.get_context().autocommit_block():
+            op.create_index(
+                "ix_logs_template_timestamp", "logs", ["template_id", "timestamp"],
+                postgresql_concurrently=True,
+            )
+        return
+
+    op.create_index("ix_logs_template_timestamp", "logs", ["template_id", "timestamp"])
+
+
+def downgrade():
+    op.drop_index("ix_logs_template_timestamp", table_name="logs")
+    op.drop_column("logs", "template_id")
+    op.drop_table("log_templates")
@@ -0,0 +1,53 @@
+"""persistent semantic cluster model
+
+Centroids live in semantic_clusters; each template records its cluster
+(or outlier flag) so outlier listings are an index lookup.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "semantic_clusters",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("centroid", sa.LargeBinary(), nullable=False),
+        sa.Column("dim", sa.Integer(), nullable=False),
+        sa.Column("radius", sa.Float(), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("n_templates", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("sample_message", sa.String()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+
+    op.add_column("log_templates", sa.Column("cluster_id", sa.Integer(), nullable=True))
+    op.add_column("log_templates", sa.Column(
+        "is_outlier", sa.Boolean(), nullable=False, server_default=sa.false()
+    ))
+    op.add_column("log_templates", sa.Column("outlier_distance", sa.Float(), nullable=True))
+    op.add_column("log_templates", sa.Column("assigned_at", sa.DateTime(), nullable=True))
+
+    op.create_index("ix_log_templates_outlier_last_seen", "log_templates", ["is_outlier", "last_seen"])
+    op.create_index("ix_log_templates_cluster_id", "log_templates", ["cluster_id"])
+
+
+def downgrade():
+    op.drop_index("ix_log_templates_cluster_id", table_name="log_templates")
+    op.drop_index("ix_log_templates_outlier_last_seen", table_name="log_templates")
+    with op.batch_alter_table("log_templates") as batch:
+        batch.drop_column("assigned_at")
+        batch.drop_column("outlier_distance")
+        batch.drop_column("is_outlier")
+        batch.drop_column("cluster_id")
+    op.drop_table("semantic_clusters")
@@ -0,0 +1,49 @@
+"""anomaly deduplication
+
+Anomalies are upserted on dedup_key (type + log / endpoint / ip + window)
+instead of inserted on every detection run; repeats bump occurrences and
+last_seen. Existing rows keep dedup_key NULL and are never merged.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("anomalies", sa.Column("dedup_key", sa.String(), nullable=True))
+    op.add_column("anomalies", sa.Column("occurrences", sa.Integer(), nullable=False, server_default="1"))
+    op.add_column("anomalies", sa.Column("last_seen", sa.DateTime(), nullable=True))
+    op.add_column("anomalies", sa.Column("endpoint", sa.String(), nullable=True))
+    op.add_column("anomalies", sa.Column("ip", sa.String(), nullable=True))
+
+    op.execute("UPDATE anomalies SET last_seen = timestamp")
+
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.create_index(
+                "ix_anomalies_dedup_key", "anomalies", ["dedup_key"],
+                unique=True, postgresql_concurrently=True,
+            )
+        return
+
+    op.create_index("ix_anomalies_dedup_key", "anomalies", ["dedup_key"], unique=True)
+
+
+def downgrade():
+    op.drop_index("ix_anomalies_dedup_key", table_name="anomalies")
+    with op.batch_alter_table("anomalies") as batch:
+        batch.drop_column("ip")
+        batch.drop_column("endpoint")
+        batch.drop_column("last_seen")
+        batch.drop_column("occurrences")
+        batch.drop_column("dedup_key")
@@ -0,0 +1,47 @@
+"""background jobs
+
+DB-backed work queue for the post-upload analysis pipeline. The partial
+unique index allows a single queued job per kind, which is what new
+requests coalesce into.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("requests", sa.Integer(), nullable=False, server_default="1"),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("run_after", sa.DateTime()),
+        sa.Column("started_at", sa.DateTime()),
+        sa.Column("finished_at", sa.DateTime()),
+        sa.Column("worker", sa.String()),
+        sa.Column("result", sa.JSON()),
+        sa.Column("error", sa.Text()),
+    )
+    op.create_index("ix_jobs_status_run_after", "jobs", ["status", "run_after"])
+    op.create_index(
+        "uq_jobs_queued_kind", "jobs", ["kind"], unique=True,
+        postgresql_where=sa.text("status = 'queued'"),
+        sqlite_where=sa.text("status = 'queued'"),
+    )
+
+
+def downgrade():
+    op.drop_index("uq_jobs_queued_kind", table_name="jobs")
+    op.drop_index("ix_jobs_status_run_after", table_name="jobs")
+    op.drop_table("jobs")
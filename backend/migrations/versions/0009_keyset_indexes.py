@@ -0,0 +1,45 @@
+"""keyset pagination indexes
+
+/anomalies/ and /logs/ page newest-first on (timestamp, id); the composite
+index serves both the order and the row-value cursor comparison.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ("ix_anomalies_timestamp_id", "anomalies", ["timestamp", "id"]),
+    ("ix_logs_timestamp_id", "logs", ["timestamp", "id"]),
+]
+
+
+def _partitioned(bind, table: str) -> bool:
+    return bind.execute(sa.text(
+        "SELECT relkind = 'p' FROM pg_class WHERE relname = :table"
+    ), {"table": table}).scalar() or False
+
+
+def upgrade():
+    bind = op.get_bind()
+    for name, table, columns in INDEXES:
+        if bind.dialect.name == "postgresql" and not _partitioned(bind, table):
+            # CONCURRENTLY is not supported on a partitioned parent
+            with op.get_context().autocommit_block():
+                op.create_index(name, table, columns, postgresql_concurrently=True)
+        else:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,58 @@
+"""log template natural key
+
+Templates are upserted on sha1(template) so several ingest processes share
+one row per text. Existing duplicates (same text mined by two processes) are
+merged into the lowest id first, and logs pointing at them are re-pointed.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("log_templates", sa.Column("template_hash", sa.String(40), nullable=True))
+
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT id, template, count, first_seen, last_seen FROM log_templates ORDER BY id"
+    )).all()
+
+    keep = {}
+    for tid, template, count, first_seen, last_seen in rows:
+        h = hashlib.sha1(template.encode("utf-8")).hexdigest()
+        if h not in keep:
+            keep[h] = tid
+            bind.execute(sa.text("UPDATE log_templates SET template_hash = :h WHERE id = :id"),
+                         {"h": h, "id": tid})
+            continue
+
+        target = keep[h]
+        bind.execute(sa.text("UPDATE logs SET template_id = :target WHERE template_id = :id"),
+                     {"target": target, "id": tid})
+        bind.execute(sa.text("""
+            UPDATE log_templates SET
+                count = count + :count,
+                first_seen = CASE WHEN first_seen IS NULL OR first_seen > :first_seen THEN :first_seen ELSE first_seen END,
+                last_seen = CASE WHEN last_seen IS NULL OR last_seen < :last_seen THEN :last_seen ELSE last_seen END,
+                assigned_at = NULL
+            WHERE id = :target
+        """), {"count": count, "first_seen": first_seen, "last_seen": last_seen, "target": target})
+        bind.execute(sa.text("DELETE FROM log_templates WHERE id = :id"), {"id": tid})
+
+    op.create_index("uq_log_templates_template_hash", "log_templates", ["template_hash"], unique=True)
+
+
+def downgrade():
+    op.drop_index("uq_log_templates_template_hash", table_name="log_templates")
+    op.drop_column("log_templates", "template_hash")
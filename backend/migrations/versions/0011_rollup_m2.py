@@ -0,0 +1,42 @@
+"""rollup response-time M2
+
+log_rollups kept Σrt² per bucket and the stdev was derived as E[x²] - E[x]²,
+which cancels catastrophically for large, tightly clustered response times.
+Buckets now keep M2 = Σ(rt - mean)² (mergeable with Chan's formula); existing
+rows are converted from their sum of squares.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("log_rollups", sa.Column("rt_m2", sa.Float(), nullable=False, server_default="0"))
+    op.execute("""
+        UPDATE log_rollups
+        SET rt_m2 = CASE WHEN rt_sumsq - rt_sum * rt_sum / rt_count > 0
+                         THEN rt_sumsq - rt_sum * rt_sum / rt_count ELSE 0 END
+        WHERE rt_count > 0
+    """)
+    with op.batch_alter_table("log_rollups") as batch:
+        batch.drop_column("rt_sumsq")
+
+
+def downgrade():
+    op.add_column("log_rollups", sa.Column("rt_sumsq", sa.Float(), nullable=False, server_default="0"))
+    op.execute("""
+        UPDATE log_rollups
+        SET rt_sumsq = rt_m2 + rt_sum * rt_sum / rt_count
+        WHERE rt_count > 0
+    """)
+    with op.batch_alter_table("log_rollups") as batch:
+        batch.drop_column("rt_m2")
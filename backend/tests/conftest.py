@@ -0,0 +1,34 @@
+"""
+Test setup: the app reads DATABASE_URL at import time, so point it at a
+throwaway SQLite file (or TEST_DATABASE_URL) before anything imports app.*.
+"""
+import os
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="log-analyzer-tests-")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite:///{_TMP}/test.db")
+os.environ["JOB_WORKER"] = "false"
+os.environ["RESULT_CACHE"] = "false"
+
+import pytest
+
+from app.core.database import Base, SessionLocal
+from app.core.migrations import run_migrations
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    run_migrations()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        for table in reversed(Base.metadata.sorted_tables):
+            session.execute(table.delete())
+        session.commit()
+        session.close()
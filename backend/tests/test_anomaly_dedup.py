@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+from app.models.anomaly import Anomaly
+from app.services.db_service import _anomaly_params, anomaly_dedup_key, save_anomalies
+
+T0 = datetime(2026, 3, 1, 10, 0, 0)
+
+
+def test_key_windows_on_event_time_not_detection_time():
+    a = {"type": "error_spike", "endpoint": "/api/pay", "event_time": T0 + timedelta(minutes=1),
+         "timestamp": datetime(2026, 3, 2)}
+    b = {**a, "timestamp": datetime(2026, 3, 5)}                           # later run, same events
+    c = {**a, "event_time": T0 + timedelta(minutes=6)}                     # next 5-minute window
+
+    assert anomaly_dedup_key(a) == anomaly_dedup_key(b)
+    assert anomaly_dedup_key(a) != anomaly_dedup_key(c)
+
+
+def test_key_subjects():
+    ip = {"type": "ip_flood", "ip": "10.0.0.1", "endpoint": "/x", "timestamp": T0}
+    log = {"type": "rare_transition", "log_id": 7}
+    message = {"type": "repeated_root_cause", "message": "disk full", "timestamp": T0}
+    template = {"type": "repeated_root_cause", "template_id": 3, "message": "disk full", "timestamp": T0}
+
+    assert anomaly_dedup_key(ip).startswith("ip_flood|ip|10.0.0.1|")
+    assert anomaly_dedup_key(log) == "rare_transition|log|7"
+    assert anomaly_dedup_key(message).startswith("repeated_root_cause|message|")
+    assert anomaly_dedup_key(template).startswith("repeated_root_cause|template|3|")
+
+
+def test_batch_repeats_fold_into_one_row():
+    base = {"type": "error_spike", "endpoint": "/api/pay", "event_time": T0}
+    params = _anomaly_params([
+        {**base, "timestamp": T0, "severity": "medium", "message": "first"},
+        {**base, "timestamp": T0 + timedelta(minutes=2), "severity": "high", "message": "second"},
+    ])
+
+    assert len(params) == 1
+    row = params[0]
+    assert row["occurrences"] == 2
+    assert row["last_seen"] == T0 + timedelta(minutes=2)
+    assert (row["severity"], row["message"]) == ("high", "second")
+
+
+def test_upsert_folds_into_existing_row(db):
+    base = {"type": "error_spike", "endpoint": "/api/pay", "event_time": T0}
+    save_anomalies(db, [{**base, "timestamp": T0, "severity": "medium", "message": "first"}])
+    save_anomalies(db, [{**base, "timestamp": T0 + timedelta(minutes=3), "severity": "high", "message": "again"}])
+
+    row = db.query(Anomaly).one()
+    assert row.occurrences == 2
+    assert row.timestamp == T0
+    assert row.last_seen == T0 + timedelta(minutes=3)
+    assert (row.severity, row.message) == ("high", "again")
+
+
+def test_probability_anomalies_keep_the_lowest_score(db):
+    base = {"type": "rare_transition", "log_id": 42, "timestamp": T0}
+    save_anomalies(db, [{**base, "score": 0.004, "severity": "high", "message": "rarest"},
+                        {**base, "score": 0.009, "severity": "medium", "message": "later"}])
+    save_anomalies(db, [{**base, "score": 0.008, "severity": "medium", "message": "rerun"}])
+
+    row = db.query(Anomaly).one()
+    assert row.occurrences == 3
+    assert (row.score, row.severity, row.message) == (0.004, "high", "rarest")
+
+
+def test_batch_with_several_keys_upserts_in_one_call(db):
+    # several distinct dedup keys → executemany on the upsert statement
+    batch = [
+        {"type": "ip_flood", "ip": "10.0.0.1", "timestamp": T0, "severity": "high"},
+        {"type": "ip_flood", "ip": "10.0.0.2", "timestamp": T0, "severity": "high"},
+        {"type": "rare_transition", "log_id": 1, "timestamp": T0, "score": 0.005},
+        {"type": "rare_transition", "log_id": 2, "timestamp": T0, "score": 0.002},
+    ]
+    save_anomalies(db, batch)
+    save_anomalies(db, [{**a, "score": 0.001 if "score" in a else None} for a in batch])
+
+    rows = {r.dedup_key: r for r in db.query(Anomaly)}
+    assert len(rows) == 4
+    assert all(r.occurrences == 2 for r in rows.values())
+    assert rows["rare_transition|log|1"].score == 0.001
+    assert rows["rare_transition|log|2"].score == 0.001
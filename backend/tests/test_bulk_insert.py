@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.models.log import Log
+from app.services import db_service
+from app.services.db_service import save_parsed_logs
+from app.services.parser import LogBatch
+
+T0 = datetime(2025, 1, 1, 0, 0, 0)
+
+
+def _rows(n):
+    # out-of-order timestamps: ids must follow input order, not time order
+    return [
+        {"timestamp": T0 + timedelta(seconds=(i * 7) % n), "level": "INFO",
+         "message": f"row {i}", "endpoint": f"/e{i % 3}", "response_time": i / 10}
+        for i in range(n)
+    ]
+
+
+def _assert_ids_match(db, ids, rows):
+    assert len(ids) == len(rows)
+    stored = dict(db.query(Log.id, Log.message).filter(Log.id.in_(ids)))
+    assert [stored[i] for i in ids] == [r["message"] for r in rows]
+
+
+def test_returned_ids_follow_input_order(db):
+    rows = _rows(50)
+    _assert_ids_match(db, save_parsed_logs(db, rows), rows)
+
+
+def test_single_row_fallback_returns_ids_in_order(db, monkeypatch):
+    # backends without executemany RETURNING insert row by row
+    monkeypatch.setattr(db_service, "_executemany_returning", lambda dialect: False)
+
+    rows = _rows(12)
+    _assert_ids_match(db, save_parsed_logs(db, rows), rows)
+
+
+def test_log_batch_input_returns_ids_in_order(db):
+    batch = LogBatch()
+    for i in range(20):
+        batch.add_line(f"2025-01-01T00:00:{(i * 7) % 20:02d}Z INFO /e 200 0.1 10.0.0.1 - row {i}")
+
+    _assert_ids_match(db, save_parsed_logs(db, batch), [{"message": f"row {i}"} for i in range(20)])
+
+
+def test_copy_path_returns_ids_in_order(db, monkeypatch):
+    if db.get_bind().dialect.name != "postgresql":
+        pytest.skip("COPY FROM STDIN is PostgreSQL only")
+    monkeypatch.setattr(settings, "BULK_COPY_THRESHOLD", 1)
+
+    rows = _rows(40)
+    _assert_ids_match(db, save_parsed_logs(db, rows), rows)
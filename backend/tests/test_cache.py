@@ -0,0 +1,81 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core import cache
+from app.core.cache import MemoryCacheBackend, bump_generation, cached, set_cache_backend
+from app.core.config import settings
+from app.models.log import Log
+from app.services.db_service import save_parsed_logs
+
+
+class BlockingBackend(MemoryCacheBackend):
+    """Memory backend that records which thread each call ran on."""
+    blocking = True
+
+    def __init__(self):
+        super().__init__(max_items=100)
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return super().get(key)
+
+    def set(self, key, value, ttl):
+        self.threads.append(threading.get_ident())
+        super().set(key, value, ttl)
+
+    def counter(self, key):
+        self.threads.append(threading.get_ident())
+        return super().counter(key)
+
+
+class DownBackend(MemoryCacheBackend):
+    def incr(self, key):
+        raise ConnectionError("cache unreachable")
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setattr(settings, "RESULT_CACHE", True)
+    yield
+    set_cache_backend(None)
+
+
+def test_blocking_backend_runs_off_the_event_loop(backend):
+    blocking = BlockingBackend()
+    set_cache_backend(blocking)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"value": 42}
+
+    async def main():
+        loop_thread = threading.get_ident()
+        first = await cached("metrics", {"h": 1}, compute)
+        second = await cached("metrics", {"h": 1}, compute)
+        return loop_thread, first, second
+
+    loop_thread, first, second = asyncio.run(main())
+
+    assert first == second == {"value": 42}
+    assert calls == [1]
+    assert blocking.threads and loop_thread not in blocking.threads
+
+
+def test_bump_generation_survives_a_cache_outage(backend):
+    set_cache_backend(DownBackend(max_items=10))
+    assert bump_generation() is None
+
+    set_cache_backend(MemoryCacheBackend(max_items=10))
+    assert bump_generation() == 1
+    assert cache.current_generation() == 1
+
+
+def test_upload_commits_when_the_cache_is_down(db, backend):
+    set_cache_backend(DownBackend(max_items=10))
+    ids = save_parsed_logs(db, [{"level": "INFO", "message": "ok", "endpoint": "/health"}])
+
+    assert db.query(Log.id).filter(Log.id.in_(ids)).count() == 1
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.models.anomaly import Anomaly
+from app.models.log import Log
+from app.services import model
+from app.services.model import DETECTOR_NAME, _load_state, run_detection
+
+T0 = datetime(2026, 3, 1, 10, 0, 0)
+
+
+def _seed(db, n=200):
+    rng = np.random.default_rng(0)
+    times = rng.normal(0.2, 0.02, n)
+    times[[50, 120, 190]] = [5.0, 6.0, 7.0]
+    db.add_all([
+        Log(timestamp=T0 + timedelta(seconds=i), level="INFO", endpoint="/api",
+            message=f"req {i}", response_time=float(t))
+        for i, t in enumerate(times)
+    ])
+    db.commit()
+    return times
+
+
+def test_incremental_run_scores_every_row_in_bounded_chunks(db, monkeypatch):
+    times = _seed(db)
+    chunks = []
+    score_chunk = model._score_chunk
+
+    def recording(state, payload, rows, now):
+        chunks.append(len(rows))
+        return score_chunk(state, payload, rows, now)
+
+    monkeypatch.setattr(model, "DETECT_CHUNK", 64)
+    monkeypatch.setattr(model, "_score_chunk", recording)
+
+    found = run_detection(db)
+
+    assert chunks == [64, 64, 64, 8]
+    flagged = {a["message"] for a in found}
+    assert {"req 50", "req 120", "req 190"} <= flagged
+    assert db.query(Anomaly).count() == len({a["log_id"] for a in found})
+
+    state, payload = _load_state(db)
+    assert state.last_log_id == db.query(Log.id).order_by(Log.id.desc()).first().id
+    assert payload["seen"] == len(times)
+    assert payload["mean"] == pytest.approx(times.mean())
+    assert payload["m2"] == pytest.approx(((times - times.mean()) ** 2).sum())
+    db.rollback()
+
+    # nothing new above the mark → nothing scored
+    assert run_detection(db) == []
+    assert db.get(model.DetectorState, DETECTOR_NAME).last_log_id == state.last_log_id
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.models.job import Job
+from app.services.jobs import claim_next_job, enqueue_job
+
+
+@pytest.fixture
+def debounce(monkeypatch):
+    monkeypatch.setattr(settings, "JOB_DEBOUNCE_SECONDS", 5)
+    monkeypatch.setattr(settings, "JOB_MAX_DELAY_SECONDS", 60)
+
+
+def _make_due(db, job_id):
+    db.get(Job, job_id).run_after = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+
+
+def test_requests_coalesce_into_the_queued_job(db, debounce):
+    first = enqueue_job(db, "analysis")
+    second = enqueue_job(db, "analysis")
+
+    assert first == second
+    job = db.get(Job, first)
+    assert job.requests == 2
+    assert job.run_after <= job.created_at + timedelta(seconds=60)
+    assert db.query(Job).count() == 1
+
+
+def test_debounce_never_exceeds_max_delay(db, debounce):
+    job_id = enqueue_job(db, "analysis")
+    job = db.get(Job, job_id)
+    job.created_at = datetime.utcnow() - timedelta(seconds=58)
+    db.commit()
+
+    enqueue_job(db, "analysis")
+
+    db.refresh(job)
+    assert job.run_after == job.created_at + timedelta(seconds=60)
+
+
+def test_claim_waits_for_run_after(db, debounce):
+    enqueue_job(db, "analysis")
+
+    assert claim_next_job(db, "w1") is None
+
+
+def test_claim_runs_one_job_per_kind(db, debounce):
+    first = enqueue_job(db, "analysis")
+    _make_due(db, first)
+
+    job = claim_next_job(db, "w1")
+    assert job.id == first
+    assert (job.status, job.worker) == ("running", "w1")
+
+    # a new request while the first runs gets its own queued job...
+    second = enqueue_job(db, "analysis")
+    assert second != first
+    _make_due(db, second)
+
+    # ...which is not claimed until the running one finishes
+    assert claim_next_job(db, "w2") is None
+
+    db.get(Job, first).status = "done"
+    db.commit()
+    assert claim_next_job(db, "w2").id == second
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from app.core.pagination import decode_cursor, encode_cursor, next_cursor, row_cursor
+from app.models.log import Log
+from app.services.db_service import get_parsed_logs
+
+T0 = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def _walk(db, page_size):
+    pages, before = [], None
+    while True:
+        rows = get_parsed_logs(db, limit=page_size, before=before)
+        pages.append(rows)
+        cursor = next_cursor(rows, page_size)
+        if cursor is None:
+            return pages
+        before = decode_cursor(cursor)
+
+
+def _add_logs(db, timestamps):
+    db.add_all([Log(timestamp=ts, level="INFO", message=f"m{i}") for i, ts in enumerate(timestamps)])
+    db.flush()
+    # the column default replaces None on insert; clear those afterwards
+    untimed = [f"m{i}" for i, ts in enumerate(timestamps) if ts is None]
+    if untimed:
+        db.execute(update(Log).where(Log.message.in_(untimed)).values(timestamp=None))
+    db.commit()
+
+
+def test_cursor_round_trip():
+    ts = datetime(2026, 1, 1, 12, 0, 0, 123456)
+    assert decode_cursor(encode_cursor(ts, 42)) == (ts, 42)
+    assert decode_cursor(encode_cursor(ts.isoformat(), 42)) == (ts, 42)
+    assert decode_cursor(encode_cursor(None, 7)) == (None, 7)
+    assert row_cursor({"timestamp": ts.isoformat(), "id": 3}) == (ts, 3)
+
+
+def test_pages_over_tied_timestamps_visit_every_row_once(db):
+    # three groups of seven rows sharing a timestamp: page boundaries fall inside ties
+    _add_logs(db, [T0 + timedelta(seconds=s) for s in (0, 1, 2) for _ in range(7)])
+
+    for page_size in (1, 2, 5, 7, 20):
+        pages = _walk(db, page_size)
+        rows = [r for page in pages for r in page]
+        keys = [(r["timestamp"], r["id"]) for r in rows]
+
+        assert len(rows) == 21
+        assert len(set(keys)) == 21
+        assert keys == sorted(keys, reverse=True)
+        assert all(len(p) == page_size for p in pages[:-1])
+
+
+def test_rows_without_timestamp_come_last(db):
+    _add_logs(db, [T0, None, T0 + timedelta(seconds=1), None, T0])
+
+    rows = [r for page in _walk(db, 2) for r in page]
+
+    assert [r["timestamp"] for r in rows] == [
+        (T0 + timedelta(seconds=1)).isoformat(), T0.isoformat(), T0.isoformat(), None, None,
+    ]
+    untimed = [r["id"] for r in rows if r["timestamp"] is None]
+    assert untimed == sorted(untimed, reverse=True)
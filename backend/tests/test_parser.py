@@ -0,0 +1,92 @@
+from datetime import datetime, timezone
+
+from app.services.parser import (
+    FULL_PATTERN, SHORT_PATTERN, LogBatch, iter_log_batches, iter_text_lines, parse_log_line,
+)
+
+LINES = [
+    "2026-03-01T10:00:00Z INFO /api/login 200 0.123 10.0.0.1 - user logged in",
+    "2026-03-01T10:00:01Z ERROR /api/pay 500 2.5 10.0.0.2 - payment failed - retry 3",
+    "2026-03-01T10:00:02Z WARN /api/items 404 0.01",
+    "  2026-03-01T10:00:03Z DEBUG /health 200 0.001   ",
+    "2026-03-01T10:00:04Z INFO /api/login 200 0.5 10.0.0.1",      # ip but no message → fallback
+    "# comment line",
+    "random garbage without structure",
+    "ERROR",
+    "2026-03-01 10:00:05 INFO something in another format",
+]
+
+
+def _legacy_parse(line):
+    """parse_log_line as it was before the fused pattern (FULL, then SHORT, then fallback)."""
+    text = line.strip()
+    for pattern, has_tail in ((FULL_PATTERN, True), (SHORT_PATTERN, False)):
+        m = pattern.match(text)
+        if m:
+            gd = m.groupdict()
+            return {
+                "timestamp": datetime.fromisoformat(gd["timestamp"].replace("Z", "+00:00")),
+                "level": gd["level"],
+                "endpoint": gd["endpoint"],
+                "status": int(gd["status"]),
+                "response_time": float(gd["response_time"]),
+                "ip": gd["ip"] if has_tail else None,
+                "message": gd["message"] if has_tail else None,
+            }
+    if text.startswith("#"):
+        return None
+    parts = text.split(" ", 3)
+    return {
+        "timestamp": None,          # wall clock in both versions
+        "level": parts[1] if len(parts) > 1 else "INFO",
+        "endpoint": None,
+        "status": None,
+        "response_time": None,
+        "ip": None,
+        "message": parts[-1] if parts else text,
+    }
+
+
+def _comparable(row):
+    if row is not None and row["endpoint"] is None:
+        row = {**row, "timestamp": None}
+    return row
+
+
+def test_batches_match_legacy_regexes():
+    expected = [r for r in (_legacy_parse(line) for line in LINES) if r is not None]
+
+    stats = {}
+    batches = list(iter_log_batches(LINES, batch_size=3, stats=stats))
+    rows = [r for batch in batches for r in batch.to_dicts()]
+
+    assert [_comparable(r) for r in rows] == expected
+    assert [len(b) for b in batches] == [3, 3, 2]
+    assert stats == {"lines_read": 9, "lines_parsed": 8, "lines_rejected": 1}
+
+
+def test_single_line_parse_matches_batch():
+    batch = LogBatch()
+    for line in LINES:
+        batch.add_line(line)
+    singles = [parse_log_line(line) for line in LINES]
+
+    assert [_comparable(r) for r in batch.to_dicts()] == [_comparable(r) for r in singles if r is not None]
+
+
+def test_timestamps_are_utc():
+    row = parse_log_line(LINES[0])
+    assert row["timestamp"] == datetime(2026, 3, 1, 10, 0, 0, tzinfo=timezone.utc)
+
+
+def test_unparseable_response_time_falls_back():
+    # the legacy parser raised on float("1.2.3"); the line is kept as garbage instead
+    row = parse_log_line("2026-03-01T10:00:00Z INFO /a 200 1.2.3 10.0.0.1 - msg")
+    assert row["endpoint"] is None and row["response_time"] is None
+
+
+def test_text_lines_split_across_chunks():
+    data = "first line\nsecond ünïcode line\r\nthird".encode("utf-8")
+    chunks = [data[i:i + 5] for i in range(0, len(data), 5)]
+
+    assert list(iter_text_lines(chunks)) == ["first line\n", "second ünïcode line\r\n", "third"]
@@ -0,0 +1,20 @@
+import pytest
+
+from app.core.config import settings
+from app.services.partitions import check_partitioning, is_partitioned
+
+
+def test_partitioning_flag_on_unpartitioned_logs_fails_startup(db, monkeypatch):
+    monkeypatch.setattr(settings, "LOGS_PARTITIONING", True)
+    if db.get_bind().dialect.name != "postgresql":
+        check_partitioning(db)  # nothing to partition on other backends
+        return
+
+    assert not is_partitioned(db)
+    with pytest.raises(RuntimeError, match="migration 0003"):
+        check_partitioning(db)
+
+
+def test_partitioning_flag_off_is_not_checked(db, monkeypatch):
+    monkeypatch.setattr(settings, "LOGS_PARTITIONING", False)
+    check_partitioning(db)
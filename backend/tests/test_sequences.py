@@ -0,0 +1,57 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.services.ml.sequences import _encode_window, _ngram_probabilities
+
+T0 = datetime(2026, 3, 1, 10, 0, 0)
+
+SESSIONS = {
+    "10.0.0.1": ["/login", "/profile", "/orders", "/logout"],
+    "10.0.0.2": ["/login", "/profile", "/profile", "/delete-account"],
+    "10.0.0.3": ["/login", "/orders", "/orders", "/pay", "/logout"],
+    None: ["/health", "/health", "/login"],
+}
+
+
+def _window():
+    rows, i = [], 0
+    for ip, endpoints in SESSIONS.items():
+        for k, endpoint in enumerate(endpoints):
+            i += 1
+            rows.append((i, ip, endpoint, T0 + timedelta(seconds=k)))
+    return _encode_window(rows)
+
+
+def test_unigram_probabilities_sum_to_one():
+    window = _window()
+    p, _ = _ngram_probabilities(window, 1)
+
+    per_endpoint = {int(c): float(v) for c, v in zip(window.endpoints, p)}
+    assert set(per_endpoint) == set(range(len(window.endpoint_names)))
+    assert sum(per_endpoint.values()) == pytest.approx(1.0)
+
+
+def test_witten_bell_conditional_probabilities_sum_to_one():
+    window = _window()
+    p1, _ = _ngram_probabilities(window, 1)
+    p2, used = _ngram_probabilities(window, 2)
+    unigram = {int(c): float(v) for c, v in zip(window.endpoints, p1)}
+
+    # P(w | h) for the continuations seen after each context h
+    seen = defaultdict(dict)
+    contexts = defaultdict(int)
+    for i in np.flatnonzero(used == 2):
+        h, w = int(window.endpoints[i - 1]), int(window.endpoints[i])
+        seen[h][w] = float(p2[i])
+        contexts[h] += 1
+
+    assert seen
+    for h, continuations in seen.items():
+        # unseen continuations get the backoff mass T(h) / (c(h) + T(h)) spread by P1
+        t, c = len(continuations), contexts[h]
+        unseen = sum(unigram[w] for w in unigram if w not in continuations)
+        total = sum(continuations.values()) + t / (c + t) * unseen
+        assert total == pytest.approx(1.0)
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.models.anomaly import Anomaly
+from app.models.log import Log
+from app.services import db_service
+from app.services.db_service import save_parsed_logs
+from app.services.streaming import get_stream_detector, reset_stream_detector
+
+
+@pytest.fixture
+def detector(monkeypatch):
+    monkeypatch.setattr(settings, "STREAM_DETECTION", True)
+    reset_stream_detector()
+    yield get_stream_detector()
+    reset_stream_detector()
+
+
+def _failed_logins(n):
+    now = datetime.utcnow()
+    return [
+        {"timestamp": now - timedelta(seconds=n - i), "level": "ERROR",
+         "message": "bad password", "endpoint": "/api/login", "ip": "10.0.0.9"}
+        for i in range(n)
+    ]
+
+
+def test_failed_insert_leaves_no_stream_counts(db, detector, monkeypatch):
+    def broken(db, rows):
+        raise RuntimeError("rollup write failed")
+
+    monkeypatch.setattr(db_service, "update_rollups", broken)
+    with pytest.raises(RuntimeError):
+        save_parsed_logs(db, _failed_logins(settings.STREAM_LOGIN_FAILURES))
+    db.rollback()
+
+    assert db.query(Log).count() == 0
+    assert detector.stats()["tracked_keys"] == 0
+    assert detector.fired == 0
+
+
+def test_committed_batch_fires_and_saves_alerts(db, detector):
+    ids = save_parsed_logs(db, _failed_logins(settings.STREAM_LOGIN_FAILURES))
+
+    assert db.query(Log).count() == len(ids)
+    assert detector.fired == 1
+    alert = db.query(Anomaly).filter(Anomaly.type == "login_bruteforce").one()
+    assert alert.ip == "10.0.0.9"
+
+
+def test_alert_save_failure_keeps_the_upload(db, detector, monkeypatch):
+    def broken(db, anomalies):
+        raise RuntimeError("anomalies table locked")
+
+    monkeypatch.setattr(db_service, "save_anomalies", broken)
+    ids = save_parsed_logs(db, _failed_logins(settings.STREAM_LOGIN_FAILURES))
+
+    assert len(ids) == settings.STREAM_LOGIN_FAILURES
+    assert db.query(Log).count() == len(ids)
+    assert db.query(Anomaly).count() == 0
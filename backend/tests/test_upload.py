@@ -0,0 +1,63 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+from app.models.log import Log
+from app.services import db_service
+
+
+def _log_file(n):
+    lines = ["# exported access log"]
+    lines += [f"2025-01-01T00:{i // 60:02d}:{i % 60:02d}Z INFO /api/items 200 0.{i % 10} 10.0.0.{i % 5} - item {i}"
+              for i in range(n)]
+    lines += ["", "# end"]
+    return "\n".join(lines).encode()
+
+
+@pytest.fixture
+def client():
+    # no `with`: the lifespan (migrations, worker) is not needed, the schema fixture ran them
+    return TestClient(app)
+
+
+@pytest.fixture
+def flushed(monkeypatch):
+    """Sizes of the batches handed to save_parsed_logs."""
+    sizes = []
+    save = db_service.save_parsed_logs
+
+    def recording(db, parsed, testing=False):
+        sizes.append(len(parsed))
+        return save(db, parsed, testing=testing)
+
+    monkeypatch.setattr(db_service, "save_parsed_logs", recording)
+    return sizes
+
+
+def test_upload_reports_line_stats(db, client, flushed):
+    r = client.post("/logs/upload", files={"file": ("access.log", _log_file(25))})
+
+    assert r.status_code == 200
+    body = r.json()
+    assert (body["saved"], body["lines_read"], body["lines_parsed"], body["lines_rejected"]) == (25, 27, 25, 2)
+    assert body["job_id"] is not None
+    assert db.query(Log).count() == 25
+
+
+def test_upload_flushes_bounded_batches(db, client, flushed, monkeypatch):
+    # tiny chunks split lines mid-way; batches must still hold whole lines, at most INGEST_BATCH_SIZE
+    monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 7)
+    monkeypatch.setattr(settings, "INGEST_BATCH_SIZE", 4)
+
+    r = client.post("/logs/upload", files={"file": ("access.log", _log_file(18))})
+
+    assert r.status_code == 200
+    assert flushed == [4, 4, 4, 4, 2]
+    messages = sorted(m for (m,) in db.query(Log.message))
+    assert messages == sorted(f"item {i}" for i in range(18))
+
+
+def test_upload_rejects_empty_and_comment_only_files(db, client):
+    assert client.post("/logs/upload", files={"file": ("empty.log", b"")}).status_code == 400
+    assert client.post("/logs/upload", files={"file": ("c.log", b"# a\n# b\n")}).status_code == 400